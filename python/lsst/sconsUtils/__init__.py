@@ -28,6 +28,25 @@ from .builders import ProductDir
 from . import installation
 from . import builders
 
+# These hook into SCons task execution, once BasicSConstruct installs
+# them (see scripts._installHooks)
+from . import interactive
+from . import scheduling
+from . import history
+from . import estimate
+from . import profiling
+from . import includes
+from . import explain
+from . import abi
+from . import hashcache
+from . import signatures
+from . import artifacts
+from . import reproducible
+from . import variants
+from . import fastload
+from . import pgo
+from . import benchmarks
+
 # These should remain in their own namespaces
 from . import scripts
 from . import tests
@@ -0,0 +1,221 @@
+"""Relinking only when a shared library's interface changes.
+
+With ``abiDecider=1``, a link step (a shared library, loadable module or
+program) is not redone just because a shared library it links against
+was rebuilt: the library's ABI signature, a digest of its ``SONAME`` (or
+install name) and the symbols it exports, with the sizes of exported
+data, is compared with the signature of the copy it was last linked
+against, and only a change in the signature counts.  Every other
+dependency, and every dependency of targets that aren't links, is
+decided as ``MD5-timestamp`` decides it (or ``MD5``, in interactive mode;
+see `lsst.sconsUtils.interactive`).
+
+The signatures of the versions of each library seen are kept in
+``abiSignatures.json`` in the SCons configuration directory, indexed by
+their content signature.  As running a test does depend on the
+library's implementation, the package's tests are made to depend on its
+libraries directly.
+
+Changes to inline functions, templates and class layouts in headers
+aren't visible in the symbol table, but these recompile (and so relink)
+the dependents that include the headers anyway.
+"""
+
+__all__ = ("abiSignature", "decide", "track")
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import SCons.Script
+
+from . import history
+from . import interactive
+from . import state
+
+# Number of versions of each library whose signature is remembered
+_MAX_VERSIONS = 20
+
+# nm symbol types of code, whose size is not part of the interface
+_CODE_TYPES = "TtWwIi"
+
+_signatures = {}                        # library -> {content signature: ABI signature}
+_lock = threading.Lock()
+_filename = None
+
+
+def _exportedSymbols(path):
+    """Return the symbols a shared library defines and exports."""
+    if sys.platform == "darwin":
+        command = ["nm", "-gU", path]
+    else:
+        command = ["nm", "-D", "--defined-only", "-S", path]
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True, check=True).stdout
+    return _parseSymbols(output)
+
+
+def _parseSymbols(output):
+    """Parse what ``nm`` lists as ``[value [size]] type name``, keeping the
+    size of data but not of code."""
+    symbols = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        name, kind = fields[-1], fields[-2]
+        size = fields[1] if len(fields) == 4 and kind not in _CODE_TYPES else ""
+        symbols.append("%s %s %s" % (name, kind, size))
+    return sorted(symbols)
+
+
+def _soname(path):
+    """Return a shared library's SONAME (install name on macOS), if any."""
+    if sys.platform == "darwin":
+        command = ["otool", "-D", path]
+    else:
+        command = ["readelf", "-d", path]
+    try:
+        output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout
+    except OSError:
+        return ""
+    if sys.platform == "darwin":
+        return output.splitlines()[-1].strip() if output.strip() else ""
+    for line in output.splitlines():
+        if "(SONAME)" in line:
+            return line.split("[", 1)[-1].rstrip("]")
+    return ""
+
+
+def abiSignature(path):
+    """Compute the ABI signature of a shared library.
+
+    Parameters
+    ----------
+    path : `str`
+        The library.
+
+    Returns
+    -------
+    signature : `str` or `None`
+        A digest of the library's ``SONAME`` and exported symbols, or
+        `None` if ``nm`` can't read it.
+    """
+    try:
+        symbols = _exportedSymbols(path)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    digest = hashlib.sha1(_soname(path).encode())
+    for symbol in symbols:
+        digest.update(b"\n" + symbol.encode())
+    return digest.hexdigest()
+
+
+def _remember(path, csig, signature):
+    with _lock:
+        versions = _signatures.setdefault(path, {})
+        versions.pop(csig, None)
+        versions[csig] = signature
+        while len(versions) > _MAX_VERSIONS:
+            del versions[next(iter(versions))]
+
+
+def _signatureOf(node, csig):
+    """Return the ABI signature of a library with the given contents,
+    computing it if the library on disk has those contents."""
+    path = node.get_abspath()
+    with _lock:
+        signature = _signatures.get(path, {}).get(csig)
+    if signature is None and csig == node.get_csig():
+        signature = abiSignature(path)
+        if signature is not None:
+            _remember(path, csig, signature)
+    return signature
+
+
+def _isSharedLibrary(node):
+    suffix = state.env.subst("$SHLIBSUFFIX")
+    return node.name.endswith(suffix) or (suffix + ".") in node.name
+
+
+def decide(dependency, target, prev_ni, repo_node=None):
+    """Decide whether a dependency has changed since a target was built.
+
+    This is a decider for ``env.Decider``; see the module documentation.
+
+    Parameters
+    ----------
+    dependency : `SCons.Node.FS.File`
+        The dependency.
+    target : `SCons.Node.Node`
+        The target that depends on it.
+    prev_ni : `SCons.Node.NodeInfoBase`
+        What was recorded about the dependency when the target was last
+        built.
+    repo_node : `SCons.Node.Node`, optional
+        Node to check for existence and timestamp instead of
+        ``dependency``.
+
+    Returns
+    -------
+    changed : `bool`
+        `True` if the target must be rebuilt.
+    """
+    if SCons.Script.GetOption("interactive"):
+        changed = dependency.changed_content(target, prev_ni, repo_node)
+    else:
+        changed = dependency.changed_timestamp_then_content(target, prev_ni, repo_node)
+    if not changed or not _isSharedLibrary(dependency) or history.targetKind(target) != "link":
+        return changed
+    oldCsig = getattr(prev_ni, "csig", None)
+    if oldCsig is None:
+        return True
+    old = _signatureOf(dependency, oldCsig)
+    new = _signatureOf(dependency, dependency.get_csig())
+    return old is None or new is None or old != new
+
+
+def _record(target, source, env):
+    """Post-action that remembers the signature of a library just built."""
+    for node in target:
+        signature = abiSignature(node.get_abspath())
+        if signature is not None:
+            _remember(node.get_abspath(), node.get_content_hash(), signature)
+
+
+def _save():
+    try:
+        with open(_filename, "w") as fd:
+            json.dump(_signatures, fd, indent=1, sort_keys=True)
+    except OSError as e:
+        state.log.warn("Unable to save ABI signatures to %s: %s" % (_filename, e))
+
+
+def track(libraries):
+    """Remember the ABI signature of libraries each time they're built.
+
+    Parameters
+    ----------
+    libraries : `list` of `SCons.Node.Node`
+        Shared libraries built by the package.
+    """
+    if _filename is not None:
+        state.env.AddPostAction(libraries, state.env.Action(_record, None))
+
+
+def _install():
+    global _filename
+    env = state.env
+    if not env["abiDecider"] or env.GetOption("clean") or env.GetOption("help"):
+        return
+    _filename = os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "abiSignatures.json")
+    try:
+        with open(_filename) as fd:
+            _signatures.update(json.load(fd))
+    except (OSError, ValueError):
+        pass
+    interactive.atBuildEnd(_save)
@@ -0,0 +1,242 @@
+"""A cache of built products shared between builds.
+
+With ``cacheDir=<directory>`` (or ``$SCONSUTILS_CACHE_DIR``) the package's
+libraries, Python extension modules and test results, and the object
+files and executables they are built from, are copied into the directory
+when they are built, and copied out of it instead of being rebuilt when
+a build needs a file with the same inputs; the directory can be on NFS
+and shared by any number of machines.  With
+``cacheDir=http://host:port/path`` the files are kept in a server that
+answers ``GET`` and ``PUT`` of ``/path/<prefix>/<signature>``
+(``sconsCacheServer --base-path /path`` is one), with a local copy of what
+was fetched or stored in ``sconsUtils/artifacts`` in the user's cache
+directory.  Should the server fail, or refuse a file, a warning is
+printed and the build carries on without it.
+
+Each file is keyed by its SCons build signature (the signatures of its
+sources, of the headers and libraries it depends on, and of its
+command), together with a fingerprint of the upstream products it was
+built with: their names, EUPS versions and locations, and for products
+set up from a local directory the modification times of their headers
+and libraries, which SCons doesn't otherwise follow.  Without
+``reproducible=1`` (see `lsst.sconsUtils.reproducible`) the package's
+directory is part of the key too: the commands are relative to it, but
+the object files record it, so they are only shared between builds in
+the same directory.
+
+As a file's signature depends on those of the files it is built from,
+these are cached too, so that a package that hasn't changed is fetched
+without compiling anything.  ``version.py`` (which is always rewritten)
+and Doxygen output (which is a directory) aren't cached.
+``--cache-disable``, ``--cache-readonly`` and ``--cache-debug=-`` work as
+they do with SCons' own ``CacheDir``.
+"""
+
+__all__ = ("ArtifactCache", "upstreamFingerprint", "track")
+
+import hashlib
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import SCons.CacheDir
+import SCons.Node.FS
+import SCons.Util
+
+from . import interactive
+from . import state
+
+# Seconds to wait for the cache server
+_TIMEOUT = 10
+
+_products = set()                       # nodes that may be cached
+_remote = None                          # URL of the cache server, if there is one
+_fingerprint = None
+_lock = threading.Lock()
+_counts = dict(fetched=0, retrieved=0, stored=0)
+
+
+def _newest(directory):
+    """Return the latest modification time of the files in a directory."""
+    newest = 0
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            try:
+                newest = max(newest, os.lstat(os.path.join(root, name)).st_mtime_ns)
+            except OSError:
+                pass
+    return newest
+
+
+def upstreamFingerprint():
+    """Return a digest of the upstream products the package is built with.
+
+    Returns
+    -------
+    fingerprint : `str`
+        A digest of the name, EUPS version and directory of each product
+        the package depends on.
+    """
+    digest = hashlib.sha1()
+    dependencies = getattr(state.env, "dependencies", None)
+    packages = dependencies.packages if dependencies is not None else {}
+    for name, module in packages.items():
+        if module is None:
+            digest.update(("%s: missing\n" % name).encode())
+            continue
+        version = getattr(module.config, "version", None)
+        root = getattr(module.config, "root", None)
+        digest.update(("%s: %s %s\n" % (name, version, root)).encode())
+        if root and (version is None or version.startswith("LOCAL:")):
+            for subdir in ("include", "lib"):
+                digest.update(b" %d" % _newest(os.path.join(root, subdir)))
+    return digest.hexdigest()
+
+
+def _warnRemote(what, error):
+    global _remote
+    with _lock:
+        if _remote is not None:
+            state.log.warn("%s the cache server at %s failed (%s); not using it" % (what, _remote, error))
+        _remote = None
+
+
+class ArtifactCache(SCons.CacheDir.CacheDir):
+    """A `SCons.CacheDir.CacheDir` for the package's products, optionally
+    backed by a cache server.
+
+    Parameters
+    ----------
+    path : `str`
+        The cache directory (the local copy if there's a server).
+    """
+
+    def cachepath(self, node):
+        global _fingerprint
+        if not self.is_enabled():
+            return None, None
+        if _fingerprint is None:
+            _fingerprint = upstreamFingerprint()
+            if not state.env['reproducible']:
+                _fingerprint += state.env.Dir("#").abspath
+        sig = hashlib.sha1((node.get_cachedir_bsig() + _fingerprint).encode()).hexdigest()
+        subdir = sig[:self.config['prefix_len']].upper()
+        return os.path.join(self.path, subdir), os.path.join(self.path, subdir, sig)
+
+    def _url(self, cachefile):
+        prefix, sig = os.path.split(cachefile)
+        return "%s/%s/%s" % (_remote, os.path.basename(prefix), sig)
+
+    def _fetch(self, cachefile):
+        """Copy a file from the server to the local cache."""
+        try:
+            with urllib.request.urlopen(self._url(cachefile), timeout=_TIMEOUT) as response:
+                data = response.read()
+                mode = int(response.headers.get("X-Mode", "644"), 8)
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                _warnRemote("Fetching from", e)
+            return
+        except (OSError, ValueError) as e:
+            _warnRemote("Fetching from", e)
+            return
+        os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+        temp = "%s.%d.%d" % (cachefile, os.getpid(), threading.get_ident())
+        with open(temp, "wb") as fd:
+            fd.write(data)
+        os.chmod(temp, mode)
+        os.replace(temp, cachefile)
+        with _lock:
+            _counts["fetched"] += 1
+
+    def _store(self, cachefile):
+        """Copy a file from the local cache to the server."""
+        with open(cachefile, "rb") as fd:
+            data = fd.read()
+        request = urllib.request.Request(self._url(cachefile), data=data, method="PUT",
+                                         headers={"X-Mode": "%o" % (os.stat(cachefile).st_mode & 0o777)})
+        try:
+            with urllib.request.urlopen(request, timeout=_TIMEOUT) as response:
+                status = response.status
+        except (OSError, ValueError) as e:
+            _warnRemote("Storing on", e)
+            return
+        if not 200 <= status < 300:
+            _warnRemote("Storing on", "HTTP status %d" % status)
+
+    def retrieve(self, node):
+        if node not in _products:
+            return False
+        if _remote is not None:
+            cachedir, cachefile = self.cachepath(node)
+            if cachefile is not None and not os.path.exists(cachefile):
+                self._fetch(cachefile)
+        if not super().retrieve(node):
+            return False
+        with _lock:
+            _counts["retrieved"] += 1
+        return True
+
+    def push(self, node):
+        if node not in _products or not node.exists():
+            return None
+        result = super().push(node)
+        cachedir, cachefile = self.cachepath(node)
+        if cachefile is not None and os.path.isfile(cachefile) and not os.path.islink(cachefile) and \
+                not self.is_readonly():
+            with _lock:
+                _counts["stored"] += 1
+            if _remote is not None:
+                self._store(cachefile)
+        return result
+
+
+def track(nodes):
+    """Allow targets, and the files they are built from, to be taken from
+    and stored in the cache.
+
+    Parameters
+    ----------
+    nodes : `list` of `SCons.Node.Node`
+        The targets; directories and targets that are always rebuilt are
+        ignored.
+    """
+    pending = list(SCons.Util.flatten(nodes))
+    while pending:
+        node = pending.pop()
+        if isinstance(node, SCons.Node.FS.Entry):
+            node = node.disambiguate()
+        if node in _products or not isinstance(node, SCons.Node.FS.File) or not node.has_builder() or \
+                node.always_build:
+            continue
+        _products.add(node)
+        pending.extend(node.sources)
+
+
+def _reset():
+    for key in _counts:
+        _counts[key] = 0
+
+
+def _report():
+    if any(_counts.values()):
+        state.log.info("Artifact cache: %(retrieved)d retrieved (%(fetched)d from the server), "
+                       "%(stored)d stored" % _counts)
+
+
+def _install():
+    global _remote
+    env = state.env
+    location = env.get("cacheDir") or os.environ.get("SCONSUTILS_CACHE_DIR")
+    if not location or env.GetOption("clean") or env.GetOption("help"):
+        return
+    if location.startswith(("http://", "https://")):
+        _remote = location.rstrip("/")
+        cacheHome = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        location = os.path.join(cacheHome, "sconsUtils", "artifacts",
+                                hashlib.sha1(_remote.encode()).hexdigest()[:12])
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+    env.CacheDir(os.path.abspath(os.path.expanduser(location)), ArtifactCache)
+    interactive.atBuildStart(_reset)
+    interactive.atBuildEnd(_report)
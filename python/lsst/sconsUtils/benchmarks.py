@@ -0,0 +1,218 @@
+"""Benchmarks of build options.
+
+Each of these targets copies the package's sources to a temporary
+directory per setting, builds ``lib`` and ``python`` there with
+`lsst.sconsUtils.reproducible.buildCopy` (with the other variables given to
+scons), prints what it measured and removes the copies:
+
+``scons benchmarkDebugInfo``
+    builds with each ``debuginfo`` setting and reports the time spent
+    linking the shared libraries and Python modules (and packaging their
+    ``.dwp`` files), as recorded in the copy's ``targets.json``, the size
+    of those files, which are what is installed, and the size of
+    everything the build wrote.
+``scons benchmarkModules``
+    times declaring `MODULES` pybind11 modules (without building them) in
+    this scons process, as `lsst.sconsUtils.scripts.BasicSConscript.python`
+    does, with ``Pybind11LoadableModule``'s builder overrides and with the
+    cloned environment per module that it used to make, taking the best of
+    `REPEATS`.
+``scons benchmarkPartialLink``
+    builds with ``partialLink=0`` and ``partialLink=1``, then repeatedly
+    changes one of the library's source files and times the rebuild (one
+    compile and the links that depend on it), taking the best of
+    `REPEATS`.
+"""
+
+__all__ = ("REPEATS", "MODULES", "linkTime", "librarySource", "changeSource")
+
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from . import fastload
+from . import reproducible
+from . import scheduling
+from . import state
+
+# Number of times each measurement is made, to take the best of
+REPEATS = 3
+
+# Number of modules declared by benchmarkModules
+MODULES = 50
+
+
+def _debugFiles(top):
+    """Return the shared objects built in a package and their ``.dwp``
+    files."""
+    paths = fastload.sharedObjects(top)
+    return paths + [path + ".dwp" for path in paths if os.path.exists(path + ".dwp")]
+
+
+def linkTime(top):
+    """Return the time spent linking a package's shared libraries and
+    Python modules by its last build.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+
+    Returns
+    -------
+    seconds : `float`
+        The sum of the durations recorded (see
+        `lsst.sconsUtils.scheduling.TargetRecords`) for the shared objects
+        and their ``.dwp`` files.
+    """
+    records = scheduling.TargetRecords(os.path.join(top, ".sconf_temp", "targets.json"))
+    return sum(records.get(os.path.relpath(path, top), "duration", 0.0) for path in _debugFiles(top))
+
+
+def _treeSize(top, ignore):
+    """Return the size of the files in a directory but not in ``ignore``."""
+    size = 0
+    for root, dirs, names in os.walk(top):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.relpath(path, top) not in ignore and not os.path.islink(path):
+                size += os.path.getsize(path)
+    return size
+
+
+def _benchmarkDebugInfo(target, source, env):
+    """Build the package with each form of debugging information and
+    compare the links and sizes."""
+    top = env.Dir("#").abspath
+    files = reproducible.sourceFiles(top)
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    modes = ("full", "split", "compressed", "none")
+    try:
+        results = []
+        for mode in modes:
+            copy = os.path.join(directory, "debuginfo-%s" % mode)
+            settings = (("debug", "True"), ("debuginfo", mode), ("cacheDir", ""))
+            if reproducible.buildCopy(top, files, copy, settings) != 0:
+                state.log.warn("Building in %s failed" % copy)
+                return 1
+            paths = _debugFiles(copy)
+            if not paths:
+                state.log.warn("The package has no shared libraries or Python modules")
+                return 1
+            results.append((linkTime(copy), sum(os.path.getsize(path) for path in paths),
+                            _treeSize(copy, set(files))))
+    finally:
+        shutil.rmtree(directory)
+    print("Linking and size of the package's libraries and Python modules:")
+    print("%-10s  %9s  %14s  %10s" % ("debuginfo", "links (s)", "installed (MB)", "build (MB)"))
+    for mode, (seconds, installed, built) in zip(modes, results):
+        print("%-10s  %9.2f  %14.2f  %10.2f" % (mode, seconds, installed/1024**2, built/1024**2))
+    return 0
+
+
+def _benchmarkModules(target, source, env):
+    """Time declaring Python modules with and without cloning the
+    environment."""
+    directory = env.Dir("#.sconf_temp/benchmarkModules")
+    times = {"cloned": [], "overrides": []}
+    for n in range(REPEATS):
+        for name in times:
+            start = time.perf_counter()
+            for i in range(MODULES):
+                path = directory.File("%s%d-%d" % (name, n, i)).abspath
+                if name == "cloned":
+                    clone = env.Clone()
+                    clone.Append(CCFLAGS=["-fvisibility=hidden"])
+                    clone.LoadableModule(path, path + ".cc")
+                else:
+                    env.Pybind11LoadableModule(path, path + ".cc")
+            times[name].append(time.perf_counter() - start)
+    results = [min(times["cloned"]), min(times["overrides"])]
+    print("Declaring %d Python modules (best of %d):" % (MODULES, REPEATS))
+    print("%-10s  %9s" % ("", "time (ms)"))
+    for name, seconds in zip(("cloned", "overrides"), results):
+        print("%-10s  %9.1f" % (name, 1e3*seconds))
+    before, after = results
+    print("Overrides are %.1fx as fast" % (before/after if after > 0 else 0))
+    return 0
+
+
+def librarySource(files):
+    """Return one of the source files of the package's libraries.
+
+    Parameters
+    ----------
+    files : `list` of `str`
+        The package's files, relative to its top directory (see
+        `lsst.sconsUtils.reproducible.sourceFiles`).
+
+    Returns
+    -------
+    path : `str` or `None`
+        The first C or C++ file in ``src``, or `None` if there isn't one.
+    """
+    for path in files:
+        if re.search(r"^src/.*\.(c|cc|cpp|cxx)$", path):
+            return path
+    return None
+
+
+def changeSource(path, n):
+    """Change a source file so that its object file changes too.
+
+    Parameters
+    ----------
+    path : `str`
+        The file.
+    n : `int`
+        Number of the change, which makes each one different.
+    """
+    with open(path, "a") as fd:
+        fd.write("\nint sconsUtilsBenchmark%d = %d;\n" % (n, n))
+
+
+def _benchmarkPartialLink(target, source, env):
+    """Time rebuilding the package after a change with and without
+    partialLink."""
+    top = env.Dir("#").abspath
+    files = reproducible.sourceFiles(top)
+    changed = librarySource(files)
+    if changed is None:
+        state.log.warn("The package has no C or C++ files in src to change")
+        return 1
+    directory = tempfile.mkdtemp(prefix="benchmarks-")
+    try:
+        results = []
+        for setting in ("0", "1"):
+            copy = os.path.join(directory, "partialLink%s" % setting)
+            settings = (("partialLink", setting), ("cacheDir", ""))
+            if reproducible.buildCopy(top, files, copy, settings) != 0:
+                state.log.warn("Building in %s failed" % copy)
+                return 1
+            times = []
+            for n in range(REPEATS):
+                changeSource(os.path.join(copy, changed), n)
+                start = time.perf_counter()
+                if reproducible.buildCopy(top, [], copy, settings) != 0:
+                    state.log.warn("Rebuilding in %s failed" % copy)
+                    return 1
+                times.append(time.perf_counter() - start)
+            results.append(min(times))
+    finally:
+        shutil.rmtree(directory)
+    print("Rebuilding after changing %s (best of %d, including starting scons):" % (changed, REPEATS))
+    print("%-12s  %8s" % ("partialLink", "time (s)"))
+    for setting, seconds in zip(("0", "1"), results):
+        print("%-12s  %8.2f" % (setting, seconds))
+    before, after = results
+    print("partialLink=1 rebuilds %.2fx as fast" % (before/after if after > 0 else 0))
+    return 0
+
+
+def _install():
+    env = state.env
+    env.AlwaysBuild(env.Alias("benchmarkDebugInfo", [], env.Action(_benchmarkDebugInfo, None)))
+    env.AlwaysBuild(env.Alias("benchmarkModules", [], env.Action(_benchmarkModules, None)))
+    env.AlwaysBuild(env.Alias("benchmarkPartialLink", [], env.Action(_benchmarkPartialLink, None)))
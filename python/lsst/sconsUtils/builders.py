@@ -7,8 +7,11 @@ import os
 import re
 import fnmatch
 import pipes
+import subprocess
+from distutils.spawn import find_executable
 
 import SCons.Script
+import SCons.Util
 from SCons.Script.SConscript import SConsEnvironment
 
 from .utils import memberOf
@@ -16,14 +19,43 @@ from .installation import determineVersion, getFingerprint
 from . import state
 
 
+def _appendOverrides(env, keywords, **flags):
+    """Add flags to builder keyword overrides rather than to a cloned
+    Environment.
+
+    Parameters
+    ----------
+    env : `SCons.Environment`
+        Environment the builder is called on.
+    keywords : `dict`
+        Builder keyword arguments; updated in place.
+    **flags
+        Lists of flags to append, keyed by construction variable name.
+
+    Returns
+    -------
+    keywords : `dict`
+        The updated keyword arguments.
+
+    Notes
+    -----
+    Overrides are applied through a lightweight OverrideEnvironment, which
+    is much cheaper than ``env.Clone()`` when a package builds many targets
+    (``scons benchmarkModules`` measures the difference).
+    """
+    for var, values in flags.items():
+        keywords[var] = SCons.Util.CLVar(keywords.get(var, env.get(var, []))) + values
+    return keywords
+
+
 @memberOf(SConsEnvironment)
 def SharedLibraryIncomplete(self, target, source, **keywords):
     """Like SharedLibrary, but don't insist that all symbols are resolved.
     """
-    myenv = self.Clone()
-    if myenv['PLATFORM'] == 'darwin':
-        myenv['SHLINKFLAGS'] += ["-undefined", "suppress", "-flat_namespace", "-headerpad_max_install_names"]
-    return myenv.SharedLibrary(target, source, **keywords)
+    if self['PLATFORM'] == 'darwin':
+        _appendOverrides(self, keywords, SHLINKFLAGS=["-undefined", "suppress", "-flat_namespace",
+                                                      "-headerpad_max_install_names"])
+    return self.SharedLibrary(target, source, **keywords)
 
 
 @memberOf(SConsEnvironment)
@@ -31,12 +63,11 @@ def Pybind11LoadableModule(self, target, source, **keywords):
     """Like LoadableModule, but don't insist that all symbols are resolved, and
     set some pybind11-specific flags.
     """
-    myenv = self.Clone()
-    myenv.Append(CCFLAGS=["-fvisibility=hidden"])
-    if myenv['PLATFORM'] == 'darwin':
-        myenv.Append(LDMODULEFLAGS=["-undefined", "suppress",
-                                    "-flat_namespace", "-headerpad_max_install_names"])
-    return myenv.LoadableModule(target, source, **keywords)
+    _appendOverrides(self, keywords, CCFLAGS=["-fvisibility=hidden"])
+    if self['PLATFORM'] == 'darwin':
+        _appendOverrides(self, keywords, LDMODULEFLAGS=["-undefined", "suppress",
+                                                        "-flat_namespace", "-headerpad_max_install_names"])
+    return self.LoadableModule(target, source, **keywords)
 
 
 @memberOf(SConsEnvironment)
@@ -116,6 +147,127 @@ def SourcesForSharedLibrary(self, files):
     return objs
 
 
+def _splitDwarfObjects(node):
+    """Return the objects compiled for a linked target (looking through
+    partial links), which write their debugging information to ``.dwo``
+    files if ``debuginfo=split``."""
+    objects = []
+    suffixes = (state.env.subst("$SHOBJSUFFIX"), state.env.subst("$OBJSUFFIX"))
+    for source in node.sources:
+        if not source.has_builder():
+            continue
+        if source.sources and os.path.splitext(str(source.sources[0]))[1] in suffixes:
+            objects.extend(_splitDwarfObjects(source))
+        else:
+            objects.append(source)
+    return objects
+
+
+def _packageSplitDwarf(target, source, env):
+    """Run ``dwp``, only warning if it can't package the debugging
+    information."""
+    result = subprocess.run([env["DWP"], "-e", source[0].abspath, "-o", target[0].abspath],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if result.returncode != 0:
+        state.log.warn("Unable to package the debugging information of %s (it remains in the .dwo files): "
+                       "%s" % (source[0], result.stdout.strip() or "%s failed" % env["DWP"]))
+        if os.path.exists(target[0].abspath):
+            os.remove(target[0].abspath)
+    return 0
+
+
+@memberOf(SConsEnvironment)
+def PackageSplitDwarf(self, targets):
+    """Collect the split debugging information of linked targets into
+    ``.dwp`` files.
+
+    Parameters
+    ----------
+    targets : `list`
+        Shared libraries or loadable modules, as returned by their builders.
+
+    Returns
+    -------
+    packages : `list`
+        The ``.dwp`` targets, to build with the targets.
+
+    Notes
+    -----
+    Only does anything when building with ``debuginfo=split`` and
+    ``llvm-dwp`` or ``dwp`` is available.  Each ``<target>.dwp`` is written
+    next to its target, where debuggers look for it, so it is installed along
+    with it, and is shared through ``cacheDir`` with it.  The ``.dwo``
+    files left next to the objects are declared as side effects of the
+    objects, which aren't shared through ``cacheDir`` as the ``.dwo`` files
+    can't be.  Packaging failures (binutils ``dwp`` does not understand
+    DWARF 5) are reported but not fatal, as the ``.dwo`` files remain usable
+    in the build tree; the package is attempted again by the next build.
+    """
+    if getattr(self, "whichDebugInfo", None) != "split":
+        return []
+    dwp = find_executable("llvm-dwp") or find_executable("dwp")
+    if not dwp:
+        return []
+    packages = []
+    for target in self.Flatten(targets):
+        for obj in _splitDwarfObjects(target):
+            dwo = os.path.splitext(obj.abspath)[0] + ".dwo"
+            self.SideEffect(dwo, obj)
+            self.Clean(obj, dwo)
+            self.NoCache(obj)
+        packages.extend(self.Command("%s.dwp" % target, target,
+                                     SCons.Script.Action(_packageSplitDwarf, "$DWP -e $SOURCE -o $TARGET"),
+                                     DWP=dwp))
+    return packages
+
+
+@memberOf(SConsEnvironment)
+def PartialLinkObjects(self, objs, name):
+    """Combine the objects from each source directory into a single
+    relocatable object.
+
+    Parameters
+    ----------
+    objs : `list`
+        Shared objects, as returned by
+        `lsst.sconsUtils.env.SourcesForSharedLibrary`.
+    name : `str`
+        Name of the library the objects are destined for; used to name the
+        partially-linked objects.
+
+    Returns
+    -------
+    objs : `list`
+        Objects to pass to ``SharedLibrary`` in place of ``objs``.
+
+    Notes
+    -----
+    Each directory holding more than one object gets a
+    ``<name>-partial.os`` made with ``$PARTIALLINKCOM`` (``-r``).  When a
+    single source file changes only its directory's partial link and the
+    final link are redone, and the final link reads a handful of inputs
+    rather than every object in the package.  ``scons benchmarkPartialLink``
+    (see `lsst.sconsUtils.benchmarks`) measures the difference.  If all
+    the objects are in one directory, they are returned unchanged, as a
+    partial link of them all would only add a step to every rebuild.
+    """
+    groups = {}
+    for obj in sorted(self.Flatten(objs), key=str):
+        groups.setdefault(os.path.dirname(obj.abspath), []).append(obj)
+    if len(groups) < 2:
+        return objs
+    result = []
+    for dirName, group in groups.items():
+        if len(group) == 1:
+            result.extend(group)
+            continue
+        partial = self.Command(os.path.join(dirName, "%s-partial.os" % name), group, "$PARTIALLINKCOM")
+        for node in partial:
+            node.attributes.shared = 1  # suitable for a SharedLibrary
+        result.extend(partial)
+    return result
+
+
 def filesToTag(root=None, fileRegex=None, ignoreDirs=None):
     """Return a list of files that need to be scanned for tags, starting at
     directory root.
@@ -347,6 +499,8 @@ class DoxygenBuilder:
         for path in self.inputs:
             if os.path.isdir(path):
                 for root, dirs, files in os.walk(path):
+                    dirs.sort()  # so that the order of the sources doesn't depend on the filesystem
+                    files.sort()
                     if os.path.abspath(root) in self.excludes:
                         dirs[:] = []
                         continue
@@ -433,7 +587,7 @@ class DoxygenBuilder:
                 state.log.finish()
             outConfigFile.write("GENERATE_%s = YES\n" % output.upper())
             outConfigFile.write("%s_OUTPUT = %s\n" % (output.upper(), _quote_path(path.abspath)))
-        for output in allOutputs:
+        for output in sorted(allOutputs):
             outConfigFile.write("GENERATE_%s = NO\n" % output.upper())
         if self.makeTag is not None:
             outConfigFile.write("GENERATE_TAGFILE = %s\n" % _quote_path(self.makeTag))
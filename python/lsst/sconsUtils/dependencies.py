@@ -12,6 +12,8 @@ from . import eupsForScons
 from SCons.Script.SConscript import SConsEnvironment
 
 from . import installation
+from . import isa
+from . import lto
 from . import state
 from .utils import get_conda_prefix
 
@@ -115,6 +117,12 @@ def configure(packageName, versionString=None, eupsProduct=None, eupsProductPath
 
     if not state.env.GetOption("clean") and not state.env.GetOption("help"):
         packages.configure(state.env, check=state.env.GetOption("checkDependencies"))
+        roots = {module.config.name: module.config.root for module in packages.packages.values()
+                 if module is not None and module.config.root}
+        for name in sorted(roots, key=lambda name: len(roots[name])):
+            state._appendPrefixMap(roots[name], name)
+        isa.checkUpstream(roots)
+        lto.checkUpstream(roots)
         for target in state.env.libs:
             state.log.info("Libraries in target '%s': %s" % (target, state.env.libs[target]))
     state.env.dependencies = packages
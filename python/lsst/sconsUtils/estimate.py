@@ -0,0 +1,327 @@
+"""Predictions of how long a build will take.
+
+With ``--estimate``, SCons decides what is out of date as it would with
+``-n``, but instead of listing the commands sconsUtils prices each task
+from the durations recorded by previous builds (see
+`lsst.sconsUtils.scheduling`), or from the size of its sources when there
+is no record, simulates running them on the requested number of jobs, and
+prints the expected wall-clock time and the most expensive tasks.
+
+With ``--timeRemaining``, the same prices are used to print an estimate
+of the time remaining every so often during a real build.  The tasks it
+will run are guessed before it starts from the files' modification
+times, as SCons' own decision takes the whole build to make; so a source
+that was touched without being changed counts as work to do, and one
+that changed without its modification time moving past its targets'
+doesn't.
+"""
+
+__all__ = ("cost", "simulate", "formatTime")
+
+import heapq
+import os
+import threading
+import time
+
+import SCons.Action
+import SCons.Node
+import SCons.Node.Alias
+import SCons.Node.FS
+import SCons.Script
+import SCons.Script.Main
+import SCons.Taskmaster
+
+from . import interactive
+from . import scheduling
+from . import state
+
+# Seconds per byte of source assumed when no target has been timed
+_SECONDS_PER_BYTE = 5e-5
+
+# Minimum interval (s) between reports of the time remaining
+_ETA_INTERVAL = 15
+
+# Number of tasks listed by --estimate
+_TOP_TASKS = 10
+
+_rate = None                            # seconds per byte of source, once calibrated
+_planned = []                           # targets of the tasks --estimate found out of date
+_topTargets = []                        # the targets SCons was asked to build
+_pending = {}                           # estimated cost of the tasks a real build still has to run
+_lock = threading.Lock()
+_progress = dict(total=0.0, done=0.0, start=None, reported=None)
+
+
+def _sourceSize(node):
+    size = 0
+    for source in node.sources:
+        try:
+            size += os.path.getsize(source.srcnode().abspath)
+        except (AttributeError, OSError):  # e.g. a Value
+            pass
+    return size
+
+
+def _calibrate(nodes):
+    """Work out the cost of a byte of source from the nodes that have both
+    a recorded duration and sources on disk."""
+    global _rate
+    seconds, size = 0.0, 0
+    for node in nodes:
+        duration = scheduling.records.get(node, "duration")
+        if duration is not None:
+            nodeSize = _sourceSize(node)
+            if nodeSize:
+                seconds += duration
+                size += nodeSize
+    _rate = seconds/size if seconds and size else _SECONDS_PER_BYTE
+
+
+def cost(node):
+    """Return the estimated time to build a target.
+
+    Parameters
+    ----------
+    node : `SCons.Node.Node`
+        The target.
+
+    Returns
+    -------
+    seconds : `float`
+        Its duration in the last build that made it; failing that, the
+        size of its sources times a rate fitted to the targets that do
+        have durations.
+    guessed : `bool`
+        `True` if there was no recorded duration.
+    """
+    duration = scheduling.records.get(node, "duration")
+    if duration is not None:
+        return duration, False
+    if not node.has_builder() or isinstance(node, SCons.Node.Alias.Alias):
+        return 0.0, False
+    return _sourceSize(node)*(_rate if _rate is not None else _SECONDS_PER_BYTE), True
+
+
+def simulate(costs, dependencies, jobs):
+    """Simulate a build with a list scheduler.
+
+    Parameters
+    ----------
+    costs : `dict`
+        Duration (s) of each task.
+    dependencies : `dict`
+        The tasks each task must wait for.
+    jobs : `int`
+        Number of tasks that can run at once.
+
+    Returns
+    -------
+    makespan : `float`
+        Time at which the last task finishes.  Ready tasks are started
+        longest-path first (the path through the tasks waiting for them),
+        which is what `lsst.sconsUtils.scheduling` arranges.
+    """
+    waiting = {task: set(deps) for task, deps in dependencies.items()}
+    dependents = {task: [] for task in costs}
+    for task, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(task)
+    lengths = {}
+
+    def length(task):
+        if task not in lengths:
+            lengths[task] = 0.0  # in case of a cycle
+            lengths[task] = costs[task] + max((length(d) for d in dependents[task]), default=0.0)
+        return lengths[task]
+
+    ready = [(-length(task), i, task) for i, task in enumerate(costs) if not waiting[task]]
+    heapq.heapify(ready)
+    running = []
+    now = 0.0
+    order = len(ready)
+    while ready or running:
+        while ready and len(running) < jobs:
+            _, _, task = heapq.heappop(ready)
+            heapq.heappush(running, (now + costs[task], order, task))
+            order += 1
+        now, _, task = heapq.heappop(running)
+        for parent in dependents[task]:
+            waiting[parent].discard(task)
+            if not waiting[parent]:
+                heapq.heappush(ready, (-length(parent), order, parent))
+                order += 1
+    return now
+
+
+def formatTime(seconds):
+    """Format a duration as e.g. ``1h02m``, ``3m05s`` or ``12.3s``."""
+    if seconds >= 3600:
+        return "%dh%02dm" % (seconds//3600, seconds % 3600//60)
+    if seconds >= 60:
+        return "%dm%02ds" % (seconds//60, seconds % 60)
+    return "%.1fs" % seconds
+
+
+def _report():
+    """Print the estimate of the tasks found out of date."""
+    if not _planned:
+        print("Estimate: nothing to build")
+        return
+    taskOf = {}
+    for targets in _planned:
+        for node in targets:
+            taskOf[node] = targets[0]
+
+    # -n can't know that a rebuilt object will change a library and so
+    # relink everything that uses it; assume that it will.
+    def addDependents(node, memo):
+        if node not in memo:
+            memo[node] = node in taskOf
+            for child in node.children(scan=False):
+                memo[node] |= addDependents(child, memo)
+            if memo[node] and node not in taskOf and node.has_builder() \
+                    and not isinstance(node, SCons.Node.Alias.Alias):
+                _planned.append([node])
+                taskOf[node] = node
+        return memo[node]
+    memo = {}
+    for target in _topTargets:
+        addDependents(target, memo)
+
+    _calibrate(node for targets in _planned for node in targets)
+    costs, dependencies, guessed = {}, {}, 0
+    for targets in _planned:
+        prices = [cost(node) for node in targets]
+        costs[targets[0]] = max(seconds for seconds, _ in prices)
+        guessed += any(guess for _, guess in prices)
+        dependencies[targets[0]] = {taskOf[child] for node in targets for child in node.children(scan=False)
+                                    if child in taskOf and taskOf[child] is not targets[0]}
+    jobs = SCons.Script.GetOption("num_jobs")
+    work = sum(costs.values())
+    print("Estimated build time: %s with %d job%s (%d tasks, %s of work; %d priced from their sources)"
+          % (formatTime(simulate(costs, dependencies, jobs)), jobs, "" if jobs == 1 else "s",
+             len(costs), formatTime(work), guessed))
+    for task in sorted(costs, key=costs.get, reverse=True)[:_TOP_TASKS]:
+        if costs[task]:
+            print("    %8s %s" % (formatTime(costs[task]), task))
+
+
+_buildTaskExecute = None                # the BuildTask.execute that _execute replaced
+
+
+def _plan(task):
+    """Replacement for ``BuildTask.execute`` used by ``--estimate``."""
+    _planned.append(list(task.targets))
+    scheduling._buildTaskExecute(task)  # runs nothing; see _dryRun
+
+
+def _isPending(node, memo):
+    """Guess, from timestamps alone, whether a node will be rebuilt.
+
+    This isn't what the decider (of content signatures, or of
+    `lsst.sconsUtils.abi`) will decide, but asking it (``node.changed()``)
+    would compute and keep the signatures of targets before they are
+    rebuilt.
+    """
+    if node in memo:
+        return memo[node]
+    memo[node] = False  # in case of a cycle
+    pending = False
+    children = node.children(scan=False)
+    for child in children:
+        pending |= _isPending(child, memo)
+    if node.has_builder() and not pending and isinstance(node, SCons.Node.FS.Base):
+        try:
+            mtime = os.path.getmtime(node.abspath)
+        except OSError:
+            pending = True
+        else:
+            for child in children:
+                try:
+                    pending |= os.path.getmtime(child.abspath) > mtime
+                except OSError:
+                    pass
+    memo[node] = pending
+    return pending
+
+
+def _startProgress(targets):
+    """Price the tasks that timestamps suggest a build will run."""
+    memo = {}
+    for target in targets:
+        _isPending(target, memo)
+    nodes = [node for node, pending in memo.items() if pending and node.has_builder()]
+    _calibrate(nodes)
+    _pending.clear()  # from a previous build in interactive mode
+    for node in nodes:
+        _pending[node] = cost(node)[0]
+    _progress["total"] = sum(_pending.values())
+    _progress["done"] = 0.0
+    _progress["start"] = _progress["reported"] = time.time()
+
+
+def _execute(task):
+    """Replacement for ``BuildTask.execute`` that reports the time
+    remaining."""
+    _buildTaskExecute(task)
+    if _progress["start"] is None:
+        return
+    with _lock:
+        for node in task.targets:
+            _progress["done"] += _pending.pop(node, 0.0)
+        now = time.time()
+        if now - _progress["reported"] < _ETA_INTERVAL or not _progress["total"]:
+            return
+        _progress["reported"] = now
+        fraction = min(1.0, _progress["done"]/_progress["total"])
+    if fraction > 0:
+        remaining = (now - _progress["start"])*(1 - fraction)/fraction
+        SCons.Script.Main.progress_display("scons: %.0f%% done, about %s remaining"
+                                           % (100*fraction, formatTime(remaining)))
+
+
+def _pricingTaskmaster(base):
+    """Return a Taskmaster, derived from ``base`` (whichever Taskmaster
+    `lsst.sconsUtils.scheduling` left in place), that prices the tasks the
+    build is expected to run."""
+
+    class Taskmaster(base):
+        def __init__(self, targets=[], tasker=None, *args, **kwargs):
+            super().__init__(targets, tasker, *args, **kwargs)
+            if not (isinstance(tasker, type) and issubclass(tasker, SCons.Script.Main.BuildTask)):
+                pass  # e.g. a configuration test
+            elif SCons.Script.GetOption("estimate"):
+                _topTargets.extend(targets)
+                _dryRun()
+            else:
+                _startProgress(targets)
+
+    return Taskmaster
+
+
+def _dryRun():
+    """Make the rest of the run behave as ``-n -s`` does.
+
+    This can't be requested until the SConscript files have been read,
+    as configuration tests need to run for real.
+    """
+    SCons.Script.SetOption("no_exec", True)  # so the .sconsign file isn't written
+    SCons.Action.execute_actions = False
+    SCons.Action.print_actions = False
+    SCons.Node.do_store_info = False
+
+
+def _install():
+    global _buildTaskExecute
+    env = state.env
+    if env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec"):
+        return
+    if env.GetOption("estimate"):
+        SCons.Script.Main.BuildTask.execute = _plan
+        interactive.atBuildEnd(_report)
+    elif env.GetOption("timeRemaining"):
+        _buildTaskExecute = SCons.Script.Main.BuildTask.execute
+        SCons.Script.Main.BuildTask.execute = _execute
+    else:
+        return
+    SCons.Taskmaster.Taskmaster = _pricingTaskmaster(SCons.Taskmaster.Taskmaster)
@@ -0,0 +1,240 @@
+"""Structured explanations of why targets were rebuilt.
+
+With ``--explainRebuilds=FILE``, each task SCons finds out of date is
+explained, as ``--debug=explain`` does, but the reasons are recorded as
+data: the target did not exist, ``AlwaysBuild`` was specified, a
+source, explicit or implicit dependency changed, was added or was
+removed, or the command line changed (with the flags added or removed,
+or a note that they were only reordered).  The ``ENV`` each target is
+built with is also remembered (in ``buildEnv.json`` in the SCons
+configuration directory), so that a change in the environment is
+reported even though SCons does not rebuild because of it.
+
+At the end of the build the explanations are written to ``FILE`` as JSON
+together with a summary that follows each changed dependency that was
+itself rebuilt back to its own cause, and groups the rebuilt targets by
+those root causes.
+"""
+
+__all__ = ("explainRebuild", "rootCauses")
+
+import hashlib
+import json
+import os
+import threading
+
+import SCons.Node
+import SCons.Script
+import SCons.Script.Main
+
+from . import interactive
+from . import state
+
+_explanations = {}                      # target -> explanation
+_lock = threading.Lock()
+_environments = None                    # see _loadEnvironments
+
+
+def _envDigest(env):
+    return hashlib.sha1(json.dumps(env, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _loadEnvironments(filename):
+    try:
+        with open(filename) as fd:
+            environments = json.load(fd)
+    except (OSError, ValueError):
+        environments = {}
+    environments.setdefault("targets", {})
+    environments.setdefault("environments", {})
+    return environments
+
+
+def _commandChange(old, new):
+    """Describe how a command line changed."""
+    oldWords, newWords = old.split(), new.split()
+    change = dict(cause="command", old=old, new=new)
+    if sorted(oldWords) == sorted(newWords):
+        change["reordered"] = True
+    else:
+        change["added"] = [w for w in newWords if w not in oldWords]
+        change["removed"] = [w for w in oldWords if w not in newWords]
+    return change
+
+
+def _changed(kid, node, oldSig):
+    """Has a dependency changed since the target was last built?
+
+    Content signatures are compared directly where there are any; with
+    the ``MD5-timestamp`` decider, SCons' own explanation reports every
+    dependency whose timestamp it has not checked as changed.
+    """
+    oldCsig = getattr(oldSig, "csig", None)
+    if oldCsig is not None:
+        try:
+            return kid.get_csig() != oldCsig
+        except Exception:
+            pass
+    return SCons.Node._decider_map[kid.changed_since_last_build](kid, node, oldSig)
+
+
+def explainRebuild(node):
+    """Return why a target is about to be rebuilt.
+
+    Parameters
+    ----------
+    node : `SCons.Node.Node`
+        A target SCons has decided is out of date.
+
+    Returns
+    -------
+    causes : `list` of `dict`
+        Each has a ``cause`` (``"missing"``, ``"always"``, ``"noinfo"``,
+        ``"changed"``, ``"added"``, ``"removed"``, ``"order"``,
+        ``"command"``, ``"actionContents"`` or ``"unknown"``) and, for
+        dependencies, the ``node`` and its ``kind`` (``"source"``,
+        ``"depends"`` or ``"implicit"``).
+
+    Notes
+    -----
+    This follows the logic of ``SCons.Node.Node.explain``, except that
+    dependencies are compared by content where possible.
+    """
+    if not node.exists():
+        return [dict(cause="missing")]
+    if node.always_build:
+        return [dict(cause="always")]
+    old = node.get_stored_info()
+    try:
+        old = old.binfo
+        old.prepare_dependencies()
+        oldKids = dict(source=old.bsources, depends=old.bdepends, implicit=old.bimplicit)
+        oldSigs = dict(zip(old.bsources + old.bdepends + old.bimplicit,
+                           old.bsourcesigs + old.bdependsigs + old.bimplicitsigs))
+    except AttributeError:
+        return [dict(cause="noinfo")]
+    new = node.get_binfo()
+    newKids = dict(source=new.bsources, depends=new.bdepends, implicit=new.bimplicit)
+
+    def name(kid):
+        return str(node.dir.Entry(kid)) if hasattr(kid, "dir") else str(kid)
+
+    causes = []
+    allOld = sum(oldKids.values(), [])
+    allNew = sum(newKids.values(), [])
+    for kind, kids in oldKids.items():
+        causes.extend(dict(cause="removed", kind=kind, node=name(kid)) for kid in kids if kid not in allNew)
+    for kind, kids in newKids.items():
+        for kid in kids:
+            if kid not in allOld:
+                causes.append(dict(cause="added", kind=kind, node=name(kid)))
+            elif _changed(kid, node, oldSigs[kid]):
+                causes.append(dict(cause="changed", kind=kind, node=name(kid)))
+    if not causes and allOld != allNew:
+        causes.append(dict(cause="order"))
+    if not causes and old.bactsig != new.bactsig:
+        if old.bact == new.bact:
+            causes.append(dict(cause="actionContents", action=new.bact))
+        else:
+            causes.append(_commandChange(old.bact, new.bact))
+    return causes or [dict(cause="unknown")]
+
+
+def rootCauses(explanations):
+    """Group rebuilt targets by what ultimately caused them to rebuild.
+
+    Parameters
+    ----------
+    explanations : `dict`
+        The causes of each target's rebuild, from `explainRebuild`.
+
+    Returns
+    -------
+    summary : `list` of `dict`
+        Each root cause (a ``cause`` and, where relevant, the ``node``
+        or changed ``variables``) with the ``targets`` it rebuilt, most
+        targets first.  A dependency that changed because it was itself
+        rebuilt is replaced by the causes of its rebuild.
+    """
+    memo = {}
+
+    def roots(target, visiting):
+        if target in memo:
+            return memo[target]
+        found = []
+        for cause in explanations[target]:
+            dependency = cause.get("node")
+            if cause["cause"] == "changed" and dependency in explanations and dependency not in visiting:
+                found.extend(roots(dependency, visiting | {target}))
+            else:
+                key = {k: v for k, v in cause.items() if k in ("cause", "kind", "node", "variables")}
+                if cause["cause"] == "command":
+                    key["reordered"] = cause.get("reordered", False)
+                found.append(json.dumps(key, sort_keys=True))
+        memo[target] = sorted(set(found))
+        return memo[target]
+
+    groups = {}
+    for target in explanations:
+        for root in roots(target, frozenset()):
+            groups.setdefault(root, []).append(target)
+    return [dict(json.loads(root), targets=sorted(targets))
+            for root, targets in sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))]
+
+
+_makeReady = None                       # the BuildTask.make_ready that _explainingMakeReady replaced
+
+
+def _explainingMakeReady(task):
+    """Replacement for ``BuildTask.make_ready`` that records why the
+    task's targets are out of date."""
+    _makeReady(task)
+    if not task.out_of_date:
+        return
+    target = task.out_of_date[0]
+    causes = explainRebuild(target)
+    env = dict(target.get_build_env().get("ENV", {}))
+    digest = _envDigest(env)
+    with _lock:
+        oldDigest = _environments["targets"].get(str(target))
+        if oldDigest is not None and oldDigest != digest:
+            oldEnv = _environments["environments"].get(oldDigest, {})
+            changed = sorted(k for k in set(oldEnv) | set(env) if oldEnv.get(k) != env.get(k))
+            causes.append(dict(cause="environment", variables=changed))
+        for node in task.out_of_date:
+            _environments["targets"][str(node)] = digest
+        _environments["environments"][digest] = env
+        _explanations[str(target)] = causes
+
+
+def _write(filename, envFile):
+    summary = rootCauses(_explanations)
+    try:
+        with open(filename, "w") as fd:
+            json.dump(dict(rebuilds=_explanations, summary=summary), fd, indent=1, sort_keys=True)
+        used = set(_environments["targets"].values())
+        _environments["environments"] = {k: v for k, v in _environments["environments"].items() if k in used}
+        with open(envFile, "w") as fd:
+            json.dump(_environments, fd, sort_keys=True)
+    except OSError as e:
+        state.log.warn("Unable to write rebuild explanations: %s" % e)
+        return
+    if _explanations:
+        print("Explained %d rebuilds in %s; most common causes:" % (len(_explanations), filename))
+        for group in summary[:5]:
+            detail = group.get("node", " ".join(group.get("variables", [])))
+            print("    %4d %s %s" % (len(group["targets"]), group["cause"], detail))
+
+
+def _install():
+    global _environments, _makeReady
+    env = state.env
+    filename = env.GetOption("explainRebuilds")
+    if not filename or env.GetOption("clean") or env.GetOption("help"):
+        return
+    envFile = os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "buildEnv.json")
+    _environments = _loadEnvironments(envFile)
+    _makeReady = SCons.Script.Main.BuildTask.make_ready
+    SCons.Script.Main.BuildTask.make_ready = _explainingMakeReady
+    interactive.atBuildStart(_explanations.clear)
+    interactive.atBuildEnd(_write, os.path.abspath(filename), envFile)
@@ -0,0 +1,186 @@
+"""Shared libraries and Python modules that load quickly.
+
+Importing a package dlopens its libraries and Python extension modules,
+and the dynamic loader resolves their symbols and relocations.
+``fastload=1`` builds those of `lsst.sconsUtils.scripts.BasicSConscript.lib`
+and ``python`` so that this is less work:
+
+- ``-Wl,--as-needed`` leaves out of each library's ``DT_NEEDED`` the
+  libraries on its link line (which `~lsst.sconsUtils.env.getLibs` makes
+  long) that it doesn't use, so they aren't loaded or searched;
+- ``-Wl,-O1`` and ``-Wl,--hash-style=gnu`` give the symbol tables a GNU
+  hash table, which makes looking symbols up quicker;
+- ``-fvisibility-inlines-hidden`` stops inline C++ functions (template
+  code, mostly) being exported, which makes the symbol tables much
+  smaller;
+- ``-fno-semantic-interposition`` lets a library's calls to its own
+  functions bind directly rather than through the PLT;
+- ``-Wl,-Bsymbolic-functions``, for Python modules only, does the same at
+  link time.  Libraries don't get it: it can make the address of one of
+  their functions differ between the library and programs linked with it.
+
+Each flag is used if the compiler and linker accept it, which the GNU,
+LLVM and mold linkers do and the macOS linker doesn't.  The code that
+``-fno-semantic-interposition`` and ``-Bsymbolic-functions`` bind can't be
+replaced with ``LD_PRELOAD``, and ``--as-needed`` drops a library that is
+only linked for its static initializers; a package that relies on either
+shouldn't use ``fastload``.  Binding stays lazy, as binding every symbol
+when a library is loaded would make importing slower.
+
+``scons benchmarkImport`` copies the package's sources to two temporary
+directories, builds ``lib`` and ``python`` in them with ``fastload=0`` and
+``fastload=1`` (and the other variables given to scons), and reports for
+each how long a new Python process takes to load all the package's
+libraries and modules (the best of `REPEATS`), and how many symbol
+relocations the dynamic loader processes to do so.
+"""
+
+__all__ = ("REPEATS", "sharedObjects", "loadTime", "relocations")
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from . import reproducible
+from . import state
+
+# Times the libraries are loaded, to take the best of
+REPEATS = 10
+
+# Loads each shared object given as an argument and prints the time taken
+_LOADER = """
+import ctypes, sys, time
+start = time.perf_counter()
+for path in sys.argv[1:]:
+    ctypes.CDLL(path)
+print(time.perf_counter() - start)
+"""
+
+
+def sharedObjects(top):
+    """Return the shared libraries and Python modules built in a package.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+
+    Returns
+    -------
+    paths : `list` of `str`
+        The libraries in ``lib`` followed by the modules in ``python``, each
+        once however many links there are to it.
+    """
+    paths, seen = [], set()
+    for subdir, pattern in (("lib", r"\.(so(\.[0-9.]+)?|dylib)$"), ("python", r"\.so$")):
+        for root, dirs, names in os.walk(os.path.join(top, subdir)):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                if re.search(pattern, name) and os.path.isfile(path) and \
+                        os.path.realpath(path) not in seen:
+                    seen.add(os.path.realpath(path))
+                    paths.append(path)
+    return paths
+
+
+def _environ(top):
+    environ = dict(os.environ)
+    for var in ("LD_LIBRARY_PATH", "DYLD_LIBRARY_PATH"):
+        environ[var] = os.pathsep.join([os.path.join(top, "lib")] +
+                                       ([environ[var]] if environ.get(var) else []))
+    return environ
+
+
+def loadTime(top, paths, repeats=REPEATS):
+    """Return how long a Python process takes to load shared objects.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package, whose ``lib`` is searched for the
+        libraries the objects need.
+    paths : `list` of `str`
+        The shared objects.
+    repeats : `int`, optional
+        Number of processes to time.
+
+    Returns
+    -------
+    seconds : `float`
+        The shortest time.
+    """
+    times = []
+    for i in range(repeats):
+        output = subprocess.run([sys.executable, "-c", _LOADER] + paths, env=_environ(top),
+                                stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        times.append(float(output))
+    return min(times)
+
+
+def relocations(top, paths):
+    """Return how many symbol relocations the dynamic loader processes to
+    load shared objects into Python.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package, whose ``lib`` is searched for the
+        libraries the objects need.
+    paths : `list` of `str`
+        The shared objects.
+
+    Returns
+    -------
+    relocations : `int` or `None`
+        The number, or `None` if the loader doesn't report it (only the
+        GNU C library's does, with ``LD_DEBUG=statistics``).
+    """
+    counts = []
+    for args in ([], paths):
+        environ = _environ(top)
+        environ["LD_DEBUG"] = "statistics"
+        stderr = subprocess.run([sys.executable, "-c", _LOADER] + args, env=environ,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                universal_newlines=True, check=True).stderr
+        found = re.findall(r"final number of relocations: *(\d+)", stderr)
+        if not found:
+            return None
+        counts.append(int(found[-1]))
+    return counts[1] - counts[0]
+
+
+def _benchmark(target, source, env):
+    """Build the package with and without fastload and time loading it."""
+    top = env.Dir("#").abspath
+    files = reproducible.sourceFiles(top)
+    directory = tempfile.mkdtemp(prefix="fastload-")
+    try:
+        results = []
+        for setting in ("0", "1"):
+            copy = os.path.join(directory, "fastload%s" % setting)
+            if reproducible.buildCopy(top, files, copy, (("fastload", setting), ("cacheDir", ""))) != 0:
+                state.log.warn("Building in %s failed" % copy)
+                return 1
+            paths = sharedObjects(copy)
+            if not paths:
+                state.log.warn("The package has no shared libraries or Python modules to load")
+                return 1
+            results.append((len(paths), loadTime(copy, paths), relocations(copy, paths)))
+    finally:
+        shutil.rmtree(directory)
+    print("Loading the package's libraries and Python modules (best of %d):" % REPEATS)
+    print("%-10s  %7s  %9s  %11s" % ("fastload", "objects", "time (ms)", "relocations"))
+    for setting, (count, seconds, relocs) in zip(("0", "1"), results):
+        print("%-10s  %7d  %9.2f  %11s" % (setting, count, 1e3*seconds, "n/a" if relocs is None else relocs))
+    before, after = results[0][1], results[1][1]
+    print("fastload=1 loads them %.2fx as fast" % (before/after if after > 0 else 0))
+    return 0
+
+
+def _install():
+    env = state.env
+    env.AlwaysBuild(env.Alias("benchmarkImport", [], env.Action(_benchmark, None)))
@@ -0,0 +1,240 @@
+"""A persistent cache of file content signatures.
+
+SCons computes the content signature of every file that its timestamp
+decider can't vouch for, and forgets the result along with the
+``.sconsign`` file.  With ``hashCache=1`` the signatures of large files
+are also kept in an SQLite database, keyed by device, inode, size and
+modification and change times.  A file that hasn't been touched since
+it was last hashed, by any build of any package or variant directory
+(which hard-link their sources), is then not read again.
+
+The database is ``sconsUtils/hashes.sqlite`` in the user's cache
+directory (``$XDG_CACHE_HOME``, or ``~/.cache``), or the file given as
+``hashCacheFile``; it is best kept on a local disk rather than NFS.
+
+A file's times only say that it hasn't changed if they are older than
+the timestamps' resolution, which can be coarse (NFS servers may report
+whole seconds): a file that is edited within that time of being hashed
+can keep its times and size.  As git does with its index, signatures are
+therefore not cached for files modified less than `RACY_SECONDS` before
+they were hashed (by the clock of the machine running scons, which may
+differ a little from a file server's); they are hashed again by the
+next build.
+
+Files smaller than 64 kB are not cached, as they are hashed faster than
+they can be looked up.  The signatures are in the hash format SCons uses
+(``--hash-format``), so they are the same as those in ``.sconsign``.
+
+``scons hashbench`` measures how long re-signing every file in the
+package takes with each available hash function, and with the cache.
+SCons can't use BLAKE2, but on CPUs with SHA extensions
+``--hash-format=sha1`` is often faster than the default MD5 (changing it
+starts a new ``.sconsign`` file, so everything is rebuilt once).
+"""
+
+__all__ = ("HashCache", "RACY_SECONDS")
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import SCons.Node.FS
+import SCons.Util
+
+from . import interactive
+from . import state
+
+# Files smaller than this (bytes) are hashed faster than they can be looked up
+_MIN_SIZE = 64*1024
+
+# Files whose modification or change time is less than this many seconds
+# before they were hashed may change again without their times changing
+RACY_SECONDS = 2.0
+
+# Entries not used for this many days are dropped
+_EXPIRY_DAYS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (dev INTEGER, ino INTEGER, size INTEGER, mtime INTEGER, ctime INTEGER,
+                                   format TEXT, hash TEXT, used REAL, PRIMARY KEY (dev, ino, format));
+"""
+
+
+class HashCache:
+    """Content signatures of files, keyed by what `os.stat` says of them.
+
+    Parameters
+    ----------
+    filename : `str`, optional
+        Database to use; defaults to ``sconsUtils/hashes.sqlite`` in
+        ``$XDG_CACHE_HOME`` (or ``~/.cache``).
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            cacheDir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+            filename = os.path.join(cacheDir, "sconsUtils", "hashes.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.filename = filename
+        self._db = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._new = []
+        self._used = []
+        self.hits = self.misses = 0
+
+    def get(self, stat, hashFormat):
+        """Return the signature of a file, or `None` if it isn't known.
+
+        Parameters
+        ----------
+        stat : `os.stat_result`
+            The file's status.
+        hashFormat : `str`
+            Name of the hash function, e.g. ``"md5"``.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime, ctime, hash FROM hashes "
+                                   "WHERE dev = ? AND ino = ? AND format = ?",
+                                   (stat.st_dev, stat.st_ino, hashFormat)).fetchone()
+            if row is None or row[:3] != (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used.append((stat.st_dev, stat.st_ino, hashFormat))
+            return row[3]
+
+    def set(self, stat, hashFormat, signature, hashed=None):
+        """Remember the signature of a file, until `save` is called.
+
+        Parameters
+        ----------
+        stat : `os.stat_result`
+            The file's status before it was hashed.
+        hashFormat : `str`
+            Name of the hash function, e.g. ``"md5"``.
+        signature : `str`
+            The signature.
+        hashed : `float`, optional
+            When the file was hashed (seconds since 1970); defaults to now.
+
+        Returns
+        -------
+        cached : `bool`
+            `False` if the file was modified too recently (see
+            `RACY_SECONDS`) for the signature to be cached.
+        """
+        if hashed is None:
+            hashed = time.time()
+        if hashed - max(stat.st_mtime_ns, stat.st_ctime_ns)/1e9 < RACY_SECONDS:
+            return False
+        with self._lock:
+            self._new.append((stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns,
+                              hashFormat, signature))
+        return True
+
+    def save(self):
+        """Write the new signatures to the database and forget those that
+        haven't been used for a while."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [entry + (now,) for entry in self._new])
+            self._db.executemany("UPDATE hashes SET used = ? WHERE dev = ? AND ino = ? AND format = ?",
+                                 [(now,) + key for key in self._used])
+            self._db.execute("DELETE FROM hashes WHERE used < ?", (now - _EXPIRY_DAYS*86400,))
+            self._new, self._used = [], []
+
+
+_cache = None
+_getCsig = None                         # the File.get_csig that _cachedCsig replaced
+
+
+def _cachedCsig(node):
+    """Replacement for ``File.get_csig`` that uses the cache."""
+    ninfo = node.get_ninfo()
+    if hasattr(ninfo, "csig"):
+        return ninfo.csig
+    try:
+        stat = os.stat(node.rfile().get_abspath())
+    except OSError:
+        return _getCsig(node)
+    if stat.st_size < _MIN_SIZE:
+        return _getCsig(node)
+    hashFormat = SCons.Util.get_current_hash_algorithm_used()
+    signature = _cache.get(stat, hashFormat)
+    if signature is None:
+        signature = _getCsig(node)
+        _cache.set(stat, hashFormat, signature)
+    ninfo.csig = signature
+    return signature
+
+
+def _finish():
+    try:
+        _cache.save()
+    except sqlite3.Error as e:
+        state.log.warn("Unable to save file signatures to %s: %s" % (_cache.filename, e))
+    if _cache.hits or _cache.misses:
+        state.log.info("Signature cache: %d hits, %d misses" % (_cache.hits, _cache.misses))
+
+
+def _reset():
+    _cache.hits = _cache.misses = 0
+
+
+def _benchmark(target, source, env):
+    """Time re-signing every file in the package."""
+    files = []
+    top = env.Dir("#").abspath
+    for dirpath, dirnames, filenames in os.walk(top):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        files.extend(os.path.join(dirpath, f) for f in filenames)
+    chunksize = SCons.Node.FS.File.hash_chunksize
+    large = [f for f in files if os.path.getsize(f) >= _MIN_SIZE]
+    size = sum(os.path.getsize(f) for f in files)
+    print("Re-signing %d files (%d MB; %d of %d MB in files of at least %d kB) in %s:" % (
+        len(files), size//2**20, len(large), sum(os.path.getsize(f) for f in large)//2**20,
+        _MIN_SIZE//1024, top))
+
+    def timeIt(label, function):
+        start = time.time()
+        for f in files:
+            function(f)
+        print("    %-24s %7.2fs" % (label, time.time() - start))
+
+    for name in ("md5", "sha1", "sha256", "blake2b", "blake2s"):
+        if hasattr(hashlib, name):
+            timeIt(name, lambda f, name=name: SCons.Util.hash_file_signature(f, chunksize, name))
+    timeIt("stat only", os.stat)
+    if _cache is not None:
+        hashFormat = SCons.Util.get_current_hash_algorithm_used()
+
+        def cached(f):
+            stat = os.stat(f)
+            if stat.st_size < _MIN_SIZE:
+                SCons.Util.hash_file_signature(f, chunksize, hashFormat)
+            elif _cache.get(stat, hashFormat) is None:
+                _cache.set(stat, hashFormat, SCons.Util.hash_file_signature(f, chunksize, hashFormat))
+        timeIt("%s via cache, first" % hashFormat, cached)
+        _cache.save()
+        timeIt("%s via cache, again" % hashFormat, cached)
+
+
+def _install():
+    global _cache, _getCsig
+    env = state.env
+    env.AlwaysBuild(env.Alias("hashbench", [], env.Action(_benchmark, None)))
+    if not env["hashCache"] or env.GetOption("clean") or env.GetOption("help"):
+        return
+    try:
+        _cache = HashCache(os.path.expanduser(env["hashCacheFile"]) if env.get("hashCacheFile") else None)
+    except (OSError, sqlite3.Error) as e:
+        state.log.warn("Unable to open the file signature cache: %s" % e)
+        return
+    _getCsig = SCons.Node.FS.File.get_csig
+    SCons.Node.FS.File.get_csig = _cachedCsig
+    interactive.atBuildStart(_reset)
+    interactive.atBuildEnd(_finish)
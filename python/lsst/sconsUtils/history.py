@@ -0,0 +1,138 @@
+"""A record of the performance of every build of a package.
+
+Each build that runs at least one task adds a row to an SQLite database,
+``sconsUtils/history.sqlite`` in the user's cache directory (so that it
+survives ``scons -c``), holding the package directory, a fingerprint of
+the configuration, the time spent in each phase of startup and building,
+and the duration and peak memory of every target that was built.
+
+``scons perfreport`` (or ``sconsOpts --history`` outside SCons) shows
+how recent builds compare and lists targets whose duration has
+regressed compared with previous builds of the same configuration.
+The database is read and written with `lsst.sconsUtils.historyDb`.
+"""
+
+__all__ = ("mark", "fingerprint", "targetKind")
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import SCons.Node.Alias
+import SCons.Script
+
+from . import interactive
+from . import scheduling
+from . import state
+from .historyDb import openHistory, report
+
+_LINK_BUILDERS = ("Program", "SharedLibrary", "StaticLibrary", "Library", "LoadableModule")
+
+_marks = [("start", SCons.Script.start_time), ("startup", time.time())]
+
+
+def mark(phase):
+    """Record that a phase of the build has just finished.
+
+    Parameters
+    ----------
+    phase : `str`
+        Name of the phase, e.g. ``"configure"``.
+    """
+    _marks.append((phase, time.time()))
+
+
+def fingerprint():
+    """Return the build configuration and a digest of it.
+
+    Returns
+    -------
+    config : `dict`
+        Settings that affect how long targets take to build.
+    digest : `str`
+        A short digest of ``config``; only builds with the same digest
+        are compared.
+    """
+    env = state.env
+    config = dict(cc=getattr(env, "whichCc", None), opt=env.get("opt"),
+                  linker=getattr(env, "whichLinker", None), debuginfo=getattr(env, "whichDebugInfo", None),
+                  flags=env.subst("$CXX $CCFLAGS $CXXFLAGS $SHLINKFLAGS"))
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+    return config, digest
+
+
+def targetKind(node):
+    """Classify a target.
+
+    Parameters
+    ----------
+    node : `SCons.Node.Node`
+        The target.
+
+    Returns
+    -------
+    kind : `str`
+        One of ``"compile"``, ``"link"``, ``"test"`` or ``"other"``.
+    """
+    if ".tests" in str(node).split(os.sep):
+        return "test"
+    if not node.has_builder():
+        return "other"
+    suffix = os.path.splitext(str(node))[1]
+    if suffix and suffix in (node.env.subst("$OBJSUFFIX"), node.env.subst("$SHOBJSUFFIX")):
+        return "compile"
+    if node.builder.get_name(node.env) in _LINK_BUILDERS:
+        return "link"
+    return "other"
+
+
+def _recordBuild():
+    """Add this build to the history."""
+    if not scheduling._executed:
+        return
+    events = [event for event in scheduling._events if event[0] == "task"]
+    first, last = min(event[2] for event in events), max(event[3] for event in events)
+    started = _marks[0][1]
+    marks = _marks + [("prepare", first), ("build", last)]
+    config, digest = fingerprint()
+    try:
+        db = openHistory()
+        with db:
+            build = db.execute("INSERT INTO builds (package, started, fingerprint, config, jobs, targets, "
+                               "wall, failed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (state.env.Dir("#").abspath, started, digest,
+                                json.dumps(config), SCons.Script.GetOption("num_jobs"),
+                                " ".join(SCons.Script.COMMAND_LINE_TARGETS), last - started,
+                                len(SCons.Script.GetBuildFailures()))).lastrowid
+            db.executemany("INSERT INTO phases VALUES (?, ?, ?)",
+                           [(build, name, end - start) for (_, start), (name, end) in zip(marks, marks[1:])])
+            db.executemany("INSERT INTO targets VALUES (?, ?, ?, ?, ?)",
+                           [(build, str(node), targetKind(node), scheduling._durations.get(str(node)),
+                             scheduling._peakMemory.get(str(node))) for node in scheduling._executed
+                            if not isinstance(node, SCons.Node.Alias.Alias)])
+        db.close()
+    except (OSError, sqlite3.Error) as e:
+        state.log.warn("Unable to record build history: %s" % e)
+
+
+def _reset():
+    """Start timing a new build (see `lsst.sconsUtils.interactive`)."""
+    _marks[:] = [("start", time.time())]
+
+
+def _perfReport(target, source, env):
+    db = openHistory()
+    report(db, env.Dir("#").abspath)
+    db.close()
+
+
+def _install():
+    env = state.env
+    env.AlwaysBuild(env.Alias("perfreport", [], env.Action(_perfReport, None)))
+    if env.GetOption("clean") or env.GetOption("no_exec") or env.GetOption("help"):
+        return
+    if "perfreport" not in SCons.Script.COMMAND_LINE_TARGETS:
+        interactive.atBuildStart(_reset)
+        interactive.atBuildEnd(_recordBuild)
@@ -0,0 +1,109 @@
+"""The database of build history written by `lsst.sconsUtils.history`.
+
+This module uses only the standard library, so that ``sconsOpts --history``
+can load it outside SCons (importing `lsst.sconsUtils` starts configuring a
+build).
+"""
+
+__all__ = ("openHistory", "report")
+
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+# Number of previous builds of a target used as its baseline
+_BASELINE_BUILDS = 5
+
+# Fractional increase over the baseline reported as a regression
+_THRESHOLD = 0.25
+
+# Increases of less than this many seconds are never reported
+_MIN_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (id INTEGER PRIMARY KEY, package TEXT, started REAL, fingerprint TEXT,
+                                   config TEXT, jobs INTEGER, targets TEXT, wall REAL, failed INTEGER);
+CREATE TABLE IF NOT EXISTS phases (build INTEGER, name TEXT, seconds REAL);
+CREATE TABLE IF NOT EXISTS targets (build INTEGER, target TEXT, kind TEXT, seconds REAL, rss INTEGER);
+CREATE INDEX IF NOT EXISTS targetsByName ON targets (target, build);
+"""
+
+
+def openHistory(filename=None):
+    """Open the history database, creating it if necessary.
+
+    Parameters
+    ----------
+    filename : `str`, optional
+        Database to open; defaults to ``sconsUtils/history.sqlite`` in
+        ``$XDG_CACHE_HOME`` (or ``~/.cache``).
+
+    Returns
+    -------
+    db : `sqlite3.Connection`
+        Connection to the database.
+    """
+    if filename is None:
+        cacheDir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        filename = os.path.join(cacheDir, "sconsUtils", "history.sqlite")
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    db = sqlite3.connect(filename)
+    db.executescript(_SCHEMA)
+    return db
+
+
+def report(db, package, builds=10, threshold=_THRESHOLD, out=sys.stdout):
+    """Print recent builds of a package and the targets that have got
+    slower.
+
+    Parameters
+    ----------
+    db : `sqlite3.Connection`
+        The history database.
+    package : `str`
+        Absolute path of the package's top directory.
+    builds : `int`, optional
+        Number of recent builds to list.
+    threshold : `float`, optional
+        Fractional increase over the median of the previous builds of a
+        target (with the same configuration) that counts as a regression.
+    out : `file`, optional
+        Where to print the report.
+    """
+    rows = db.execute("SELECT id, started, fingerprint, jobs, targets, wall, failed FROM builds "
+                      "WHERE package = ? ORDER BY id DESC LIMIT ?", (package, builds)).fetchall()
+    if not rows:
+        print("No builds of %s recorded" % package, file=out)
+        return
+    print("%-16s  %-12s  %4s  %8s  %-30s  %s"
+          % ("started", "config", "jobs", "wall", "phases (s)", "targets"), file=out)
+    for build, started, digest, jobs, targets, wall, failed in reversed(rows):
+        phases = db.execute("SELECT name, seconds FROM phases WHERE build = ?", (build,)).fetchall()
+        kinds = db.execute("SELECT kind, COUNT(*), SUM(seconds) FROM targets WHERE build = ? GROUP BY kind",
+                           (build,)).fetchall()
+        print("%-16s  %-12s  %4d  %7.1fs  %-30s  %s%s" % (
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(started)), digest, jobs, wall,
+            " ".join("%s=%.1f" % (name, seconds) for name, seconds in phases if name != "startup"),
+            " ".join("%d %s (%.1fs)" % (count, kind, seconds) for kind, count, seconds in kinds),
+            " FAILED" if failed else ""), file=out)
+
+    latest, digest = rows[0][0], rows[0][2]
+    regressions = []
+    for target, seconds in db.execute("SELECT target, seconds FROM targets "
+                                      "WHERE build = ? AND seconds IS NOT NULL", (latest,)).fetchall():
+        previous = [row[0] for row in db.execute(
+            "SELECT seconds FROM targets JOIN builds ON targets.build = builds.id "
+            "WHERE package = ? AND target = ? AND fingerprint = ? AND build < ? AND seconds IS NOT NULL "
+            "ORDER BY build DESC LIMIT ?", (package, target, digest, latest, _BASELINE_BUILDS))]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        if seconds > baseline*(1 + threshold) and seconds - baseline >= _MIN_SECONDS:
+            regressions.append((seconds - baseline, target, baseline, seconds))
+    if regressions:
+        print("\nTargets more than %.0f%% slower than their last %d builds:"
+              % (100*threshold, _BASELINE_BUILDS), file=out)
+        for increase, target, baseline, seconds in sorted(regressions, reverse=True):
+            print("    %-50s %7.1fs -> %7.1fs" % (target, baseline, seconds), file=out)
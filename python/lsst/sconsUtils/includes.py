@@ -0,0 +1,164 @@
+"""Analysis of the include graph SCons discovers.
+
+``scons includereport`` scans every source compiled by the package (using
+the same scanners and ``CPPPATH`` as the build, but without compiling
+anything), writes the include graph to ``includeGraph.json`` in the SCons
+configuration directory and prints:
+
+- the headers whose edits would recompile the most (by recorded compile
+  time where `lsst.sconsUtils.scheduling` has one, else by count);
+- the sources that parse the most bytes of headers;
+- headers included by at least half of the sources, which are candidates
+  for a precompiled header.
+
+Only headers that the scanner can find on ``CPPPATH`` are seen, so system
+headers are not counted.
+"""
+
+__all__ = ("IncludeGraph",)
+
+import json
+import os
+
+import SCons.Node.FS
+import SCons.Script
+
+from . import history
+from . import scheduling
+from . import state
+
+# Number of entries in each ranking of the report
+_TOP = 15
+
+
+class IncludeGraph:
+    """The headers included by each compiled source.
+
+    Parameters
+    ----------
+    objects : `list` of `SCons.Node.Node`
+        Object files whose sources should be scanned.
+    """
+
+    def __init__(self, objects):
+        self.includes = {}              # header or source -> headers it includes directly
+        self.sources = {}               # object -> source
+        for obj in objects:
+            for source in obj.sources:
+                scanner = obj.get_source_scanner(source)
+                if scanner is None:
+                    continue
+                env = obj.get_build_env()
+                path = scanner.path(env, obj.cwd, [obj], [source])
+                self.sources[obj] = source
+                self._scan(source, env, scanner, path)
+
+    def _scan(self, node, env, scanner, path):
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if node in self.includes:
+                continue
+            selected = scanner.select(node)
+            found = node.get_found_includes(env, selected, path) if selected else []
+            self.includes[node] = [n for n in found if isinstance(n, SCons.Node.FS.File)]
+            pending.extend(self.includes[node])
+
+    def closure(self, node):
+        """Return every header a file includes, directly or not."""
+        seen = set()
+        pending = list(self.includes.get(node, []))
+        while pending:
+            header = pending.pop()
+            if header not in seen:
+                seen.add(header)
+                pending.extend(self.includes.get(header, []))
+        seen.discard(node)
+        return seen
+
+    @staticmethod
+    def size(node):
+        """Return the size of a file in bytes."""
+        try:
+            return os.path.getsize(node.abspath)
+        except OSError:
+            return 0
+
+    def analyze(self):
+        """Work out the fan-out of each header and the parsed bytes of each
+        source.
+
+        Returns
+        -------
+        headers : `dict`
+            For each header: its size, the objects that include it, and
+            the recorded compile time of those objects.
+        sources : `dict`
+            For each object: its source, the number of headers it
+            includes and the bytes parsed to compile it.
+        """
+        headers, sources = {}, {}
+        for obj, source in self.sources.items():
+            included = self.closure(source)
+            sources[str(obj)] = dict(source=str(source), headers=len(included),
+                                     bytes=self.size(source) + sum(self.size(h) for h in included))
+            seconds = scheduling.records.get(obj, "duration", 0.0)
+            for header in included:
+                entry = headers.setdefault(str(header), dict(size=self.size(header), objects=[], seconds=0.0))
+                entry["objects"].append(str(obj))
+                entry["seconds"] += seconds
+        return headers, sources
+
+    def write(self, filename, headers, sources):
+        """Write the graph and its analysis as JSON."""
+        graph = {str(node): sorted(str(h) for h in included) for node, included in self.includes.items()}
+        with open(filename, "w") as fd:
+            json.dump(dict(includes=graph, headers=headers, sources=sources), fd, indent=1, sort_keys=True)
+
+
+def _objects():
+    """Return the object files the package's targets are built from."""
+    objects, seen = [], set()
+    pending = [node for targets in state.targets.values() for node in SCons.Script.Flatten(targets)]
+    while pending:
+        node = pending.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        if history.targetKind(node) == "compile":
+            objects.append(node)
+        else:
+            pending.extend(node.children(scan=False))
+    return objects
+
+
+def _report(target, source, env):
+    graph = IncludeGraph(_objects())
+    headers, sources = graph.analyze()
+    filename = os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "includeGraph.json")
+    graph.write(filename, headers, sources)
+    print("Include graph of %d sources written to %s" % (len(sources), filename))
+    if not sources:
+        return
+
+    timed = any(entry["seconds"] for entry in headers.values())
+    print("\n%8s %8s %8s  headers causing the largest rebuilds" % ("sources", "compile", "size"))
+    for name, entry in sorted(headers.items(), key=lambda item: (-item[1]["seconds"] if timed else 0,
+                                                                 -len(item[1]["objects"])))[:_TOP]:
+        print("%8d %7.1fs %7dk  %s" % (len(entry["objects"]), entry["seconds"], entry["size"]//1024, name))
+
+    print("\n%8s %8s  sources parsing the most bytes" % ("headers", "parsed"))
+    for name, entry in sorted(sources.items(), key=lambda item: -item[1]["bytes"])[:_TOP]:
+        print("%8d %7dk  %s" % (entry["headers"], entry["bytes"]//1024, entry["source"]))
+
+    common = [(name, entry) for name, entry in headers.items() if 2*len(entry["objects"]) >= len(sources)]
+    if len(sources) > 1 and common:
+        print("\n%8s %8s  precompiled header candidates (included by at least half the sources)"
+              % ("sources", "size"))
+        for name, entry in sorted(common, key=lambda item: -item[1]["size"])[:_TOP]:
+            print("%8d %7dk  %s" % (len(entry["objects"]), entry["size"]//1024, name))
+
+
+def _install():
+    env = state.env
+    env.AlwaysBuild(env.Alias("includereport", [], env.Action(_report, None)))
@@ -492,6 +492,11 @@ def InstallLSST(self, prefix, dirs, ignoreRegex=None):
             t = self.InstallEups(os.path.join(prefix, "ups"))
         else:
             t = self.InstallDir(prefix, d, ignoreRegex=ignoreRegex)
+        if d == "ups" and self.installing:
+            # Record how the package was built; see lsst.sconsUtils.isa
+            buildCfg = os.path.join(self.Dir(self["CONFIGUREDIR"]).abspath, "build.cfg")
+            if os.path.exists(buildCfg):
+                t += self.Install(os.path.join(prefix, "ups"), buildCfg)
         self.Depends(t, d)
         results.extend(t)
         self.Alias("install", t)
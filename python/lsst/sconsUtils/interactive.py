@@ -0,0 +1,99 @@
+"""Builds run by ``scons --interactive``, as ``sconsd`` runs them.
+
+sconsUtils does some things once per run of scons, as it exits: saving
+the durations and memory of the targets built, recording the build in the
+history, and writing the build trace, the explanations of rebuilds, the
+compile profile and the signatures of the libraries' interfaces.  In
+interactive mode each ``build`` command is a build of its own, so they are
+done after each one instead, and what they are made from is reset before
+the next.  Dependencies are decided by content (``MD5``) rather than
+``MD5-timestamp``, which in interactive mode can miss a dependency
+rebuilt by an earlier build.  A build of ``tests`` checks the results of
+the tests, as ``scons tests`` does, and the exit status of each build is
+written to the file named by the ``SCONSUTILS_BUILD_STATUS`` environment
+variable, if it is set.
+"""
+
+__all__ = ("STATUS_VARIABLE", "atBuildStart", "atBuildEnd")
+
+import atexit
+import os
+
+import SCons.Script
+import SCons.Script.Interactive
+import SCons.Script.Main
+
+from . import state
+
+# Environment variable naming the file that the exit status of each
+# interactive build is written to
+STATUS_VARIABLE = "SCONSUTILS_BUILD_STATUS"
+
+_starting = []                          # functions called before each build
+_ending = []                            # (function, arguments) called after each build
+_doBuild = None                         # the SConsInteractiveCmd.do_build that _build replaced
+
+
+def atBuildStart(function):
+    """Call a function before each build in interactive mode, e.g. to
+    reset what an `atBuildEnd` function reports.
+
+    Parameters
+    ----------
+    function : callable
+        Function to call with no arguments.
+    """
+    _starting.append(function)
+
+
+def atBuildEnd(function, *args):
+    """Call a function when the build is done: as scons exits, or after
+    each build in interactive mode.
+
+    Parameters
+    ----------
+    function : callable
+        Function to call.
+    *args
+        Its arguments.
+
+    Notes
+    -----
+    As with `atexit`, the functions are called in the reverse of the order
+    in which they were registered.
+    """
+    if SCons.Script.GetOption("interactive"):
+        _ending.append((function, args))
+    else:
+        atexit.register(function, *args)
+
+
+def _build(cmd, argv):
+    """Replacement for ``SConsInteractiveCmd.do_build`` that does per
+    build what is otherwise done per run of scons."""
+    for function in _starting:
+        function()
+    if "tests" in argv[1:]:
+        argv = argv + ["checkTestStatus"]  # see BasicSConstruct.finish
+    SCons.Script.Main.this_build_status = 2  # unless the build gets as far as starting
+    try:
+        _doBuild(cmd, argv)
+    finally:
+        status = SCons.Script.Main.this_build_status
+        for function, args in reversed(_ending):
+            function(*args)
+        filename = os.environ.get(STATUS_VARIABLE)
+        if filename:
+            try:
+                with open(filename, "w") as fd:
+                    fd.write("%d\n" % status)
+            except OSError as e:
+                state.log.warn("Unable to write the build status to %s: %s" % (filename, e))
+
+
+def _install():
+    global _doBuild
+    if not SCons.Script.GetOption("interactive"):
+        return
+    _doBuild = SCons.Script.Interactive.SConsInteractiveCmd.do_build
+    SCons.Script.Interactive.SConsInteractiveCmd.do_build = _build
@@ -0,0 +1,116 @@
+"""Building for a particular x86-64 instruction set.
+
+``isa=<level>`` compiles and links the package's libraries, Python
+extension modules and tests with ``-march=<level>``:
+
+- ``generic`` (the default) adds nothing, so the compiler's default is
+  used.
+- ``x86-64-v2``, ``x86-64-v3`` and ``x86-64-v4`` are the microarchitecture
+  levels of the x86-64 psABI (SSE4.2; AVX2, BMI2 and FMA; AVX-512).
+- ``native`` is the processor the build runs on.  It is resolved to the
+  compiler's name for that processor (e.g. ``-march=skylake``), so that
+  files built on different processors have different signatures and
+  aren't shared through ``cacheDir``.
+
+The level is checked when scons starts by compiling a program with the
+flag and running it to see that the machine has the level's features
+(``--force`` turns a failure into a warning, to build for another
+machine).  It is recorded as ``isa`` in ``build.cfg``, which
+``scons install`` copies to the product's ``ups`` directory.
+
+A package can't run on less than the levels of the products it links
+with, so each upstream product's ``build.cfg`` (in its ``ups`` directory,
+or in its ``.sconf_temp`` if it was set up from a local build) is read,
+and building for a lower level than any of them, or for a processor
+other than one an upstream product was built for with ``native``, is
+warned about (it isn't an error, as a stack in which only some products
+were built for a higher level can still be built, and only fails to run
+on processors without that level).  Products without a ``build.cfg`` are
+taken to be ``generic``.
+"""
+
+__all__ = ("LEVELS", "FEATURES", "builtFor", "compatible", "checkUpstream")
+
+import os
+
+from . import state
+
+# The levels in increasing order; anything else is a processor named by
+# -march=native
+LEVELS = ("generic", "x86-64-v2", "x86-64-v3", "x86-64-v4")
+
+# The processor features each level needs, as named by
+# __builtin_cpu_supports
+FEATURES = {
+    "generic": (),
+    "x86-64-v2": ("popcnt", "sse3", "sse4.1", "sse4.2", "ssse3"),
+    "x86-64-v3": ("popcnt", "sse3", "sse4.1", "sse4.2", "ssse3", "avx", "avx2", "bmi", "bmi2", "fma"),
+    "x86-64-v4": ("popcnt", "sse3", "sse4.1", "sse4.2", "ssse3", "avx", "avx2", "bmi", "bmi2", "fma",
+                  "avx512f", "avx512bw", "avx512cd", "avx512dq", "avx512vl"),
+}
+
+
+def builtFor(root):
+    """Return the instruction set a product was built for.
+
+    Parameters
+    ----------
+    root : `str`
+        The product's directory.
+
+    Returns
+    -------
+    isa : `str`
+        The ``isa`` recorded in the product's ``build.cfg``, or ``generic``.
+    """
+    return state._loadState(root).get("isa", "generic")
+
+
+def compatible(upstream, isa):
+    """Can code built for one instruction set use code built for another?
+
+    Parameters
+    ----------
+    upstream : `str`
+        What the code being used was built for.
+    isa : `str`
+        What the code using it is built for.
+
+    Returns
+    -------
+    compatible : `bool`
+        `True` if ``isa`` is at least ``upstream``.
+    """
+    if upstream == isa or upstream == "generic":
+        return True
+    if upstream in LEVELS and isa in LEVELS:
+        return LEVELS.index(upstream) <= LEVELS.index(isa)
+    # A named processor can't be compared with a level, except that it
+    # presumably has the features of one that was checked on it
+    return upstream in LEVELS and isa not in LEVELS
+
+
+def checkUpstream(roots):
+    """Warn if the package is built for an instruction set that the
+    products it uses can't run on.
+
+    Parameters
+    ----------
+    roots : `dict`
+        The directory of each upstream product, keyed by name.
+    """
+    env = state.env
+    isa = getattr(env, "whichIsa", None)
+    if isa is None:                     # nothing is compiled
+        return
+    top = env.Dir("#").abspath
+    problems = []
+    for name, root in sorted(roots.items()):
+        if os.path.realpath(root) == os.path.realpath(top):
+            continue
+        upstream = builtFor(root)
+        if not compatible(upstream, isa):
+            problems.append("%s was built with isa=%s" % (name, upstream))
+    if problems:
+        state.log.warn("Building for isa=%s, but %s; the package will only run where they can" %
+                       (isa, "; ".join(problems)))
@@ -0,0 +1,81 @@
+"""Link-time optimization.
+
+``lto=thin`` or ``lto=full`` compiles the package's libraries and Python
+extension modules (the shared objects built by
+`lsst.sconsUtils.scripts.BasicSConscript.lib` and ``python``) for
+link-time optimization and optimizes them as a whole when they are
+linked; other objects, such as those of test programs, are compiled as
+with ``lto=off`` (the default), which with gcc is ``-fno-lto``, for
+compatibility with conda binaries.  Links don't get ``-fno-lto``, which
+would stop gcc from using its linker plugin at all.  ``partialLink`` is
+turned off, as the final link would redo the optimization of every
+object anyway.
+
+- With gcc, ``thin`` is ``-flto``, linking with ``-flto=<jobs>``: the
+  library is split into partitions that are optimized in parallel by as
+  many processes as scons runs jobs (which isn't part of the build
+  signatures, so changing ``-j`` doesn't relink).  ``full`` adds
+  ``-flto-partition=one``, which optimizes the whole library in one
+  process.
+- With clang, they are ``-flto=thin`` (with as many ThinLTO jobs as scons
+  runs jobs) and ``-flto=full``.
+
+When scons starts, a program is compiled and linked with these flags, and
+an LTO object is put into a static library with the compiler's ``ar``
+and ``ranlib`` (``gcc-ar``/``gcc-ranlib`` or ``llvm-ar``/``llvm-ranlib``,
+which become ``$AR`` and ``$RANLIB``).  The setting is recorded as ``lto``
+in ``build.cfg``, with the compiler and its version.
+
+Objects compiled for LTO can only be linked with LTO by the same compiler,
+so when upstream products' ``build.cfg`` files (see `lsst.sconsUtils.isa`)
+say they were built with LTO and the package is built without it or by
+another compiler or version, or the package is built with LTO and they
+weren't, what that means is reported before anything is built, rather
+than appearing as a link error or as optimization that silently stops at
+the package's boundary.
+"""
+
+__all__ = ("checkUpstream",)
+
+import os
+
+from . import state
+
+
+def checkUpstream(roots):
+    """Report how the link-time optimization of upstream products fits
+    with the package's.
+
+    Parameters
+    ----------
+    roots : `dict`
+        The directory of each upstream product, keyed by name.
+    """
+    env = state.env
+    lto = getattr(env, "whichLto", None)
+    if lto is None:                     # nothing is compiled
+        return
+    compiler = "%s %s" % (env.whichCc, getattr(env, "ccVersion", "unknown"))
+    top = env.Dir("#").abspath
+    unlinkable, withoutLto = [], []
+    for name, root in sorted(roots.items()):
+        if os.path.realpath(root) == os.path.realpath(top):
+            continue
+        built = state._loadState(root)
+        if not built:
+            continue
+        upstreamLto = built.get("lto", "off")
+        upstreamCompiler = "%s %s" % (built.get("cc", "unknown"), built.get("ccversion", "unknown"))
+        if upstreamLto != "off" and (lto == "off" or upstreamCompiler != compiler):
+            unlinkable.append("%s (lto=%s with %s)" % (name, upstreamLto, upstreamCompiler))
+        elif upstreamLto == "off" and lto != "off":
+            withoutLto.append(name)
+    if unlinkable:
+        state.log.warn("Upstream products built with link-time optimization can't be linked with LTO by %s "
+                       "with lto=%s: %s.  Their shared libraries can be used, but any static libraries or "
+                       "objects they provide won't link; build them and this package with the same "
+                       "compiler and lto, or rebuild them with lto=off" %
+                       (compiler, lto, ", ".join(unlinkable)))
+    if withoutLto:
+        state.log.info("Upstream products built without link-time optimization, which lto=%s won't "
+                       "optimize across: %s" % (lto, ", ".join(withoutLto)))
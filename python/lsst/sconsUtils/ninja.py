@@ -0,0 +1,293 @@
+"""Export of the build graph to Ninja.
+
+``scons ninja`` writes a ``build.ninja`` at the top of the package holding
+the commands that SCons would run to build the package's standard
+targets (``lib``, ``python``, ``tests``, ``shebang``, ``install``, ...),
+so that an edit-compile-test loop can run under ``ninja``, which starts
+instantly.  The environment SCons runs commands in (``ENV``) is exported
+before each command, and compiles ask gcc or clang to write the headers
+they include to a depfile that Ninja reads, so adding an ``#include``
+needs no regeneration.
+
+Steps that SCons runs as Python functions (e.g. rewriting shebangs or
+writing ``version.py``) are delegated to ``scons -Q <target>``, one at a
+time; the silent checks SCons adds to links are dropped.  These steps
+aren't safe to run alongside the commands Ninja runs itself: SCons checks
+the target's inputs with its own signatures, which don't know about what
+Ninja has built, and may rebuild them while Ninja is writing them.  Run
+``ninja -j1``, or build with ``scons`` first, if the package has any (they
+are the build statements using the ``scons`` rule).
+
+``build.ninja`` depends on ``SConstruct``, the ``SConscript`` files, the
+files in ``ups``, the file of build variables (``buildOpts.py`` or
+``optfile``), ``build.cfg`` (the configuration that the last run of
+``scons`` found) and ``buildVariables.json`` (the variables the last run of
+``scons`` was given, and a digest of the flags they led to), and Ninja
+regenerates it by running ``scons ninja`` with the variables it was
+written with when any of them change.  If ``scons`` has since been run with
+other variables (e.g. ``scons opt=0``), that fails, rather than going back
+to the old ones: run ``scons ninja`` with the variables to build with.
+"""
+
+__all__ = ("ninjaEscape", "writeNinja", "declare")
+
+import glob
+import json
+import os
+import shlex
+import sys
+
+import SCons.Action
+import SCons.Node.Alias
+import SCons.Node.FS
+import SCons.Script
+import SCons.Subst
+
+from . import history
+from . import state
+
+# File in the SCons configuration directory recording the variables and
+# flags of the last run of scons
+_VARIABLES_FILE = "buildVariables.json"
+
+# Environment variable set when Ninja runs scons to regenerate build.ninja
+_REGENERATE_VARIABLE = "SCONSUTILS_NINJA_REGENERATE"
+
+_RULES = """
+rule cmd
+  command = $env $cmd
+  description = $desc
+
+rule compile
+  command = $env $cmd -MMD -MF $out.d
+  description = $desc
+  depfile = $out.d
+  deps = gcc
+
+pool scons
+  depth = 1
+
+rule scons
+  command = $env $scons -Q $sconsargs $out
+  description = scons $out
+  pool = scons
+
+rule regenerate
+  command = SCONSUTILS_NINJA_REGENERATE=1 $scons -Q ninja $sconsargs
+  description = regenerating build.ninja
+  generator = 1
+"""
+
+
+class _Unsupported(Exception):
+    """An action that can't be expressed as shell commands."""
+    pass
+
+
+def ninjaEscape(path):
+    """Escape a path for the build line of a Ninja file."""
+    return path.replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+
+def _commands(action, targets, sources, env, executor):
+    """Return the shell commands that make up an action."""
+    if isinstance(action, SCons.Action.ListAction):
+        return [command for a in action.list for command in _commands(a, targets, sources, env, executor)]
+    if isinstance(action, SCons.Action.CommandGeneratorAction):
+        action = action._generate(targets, sources, env, 1, executor)
+        return _commands(action, targets, sources, env, executor)
+    if isinstance(action, SCons.Action.FunctionAction) and \
+            getattr(action.execfunction, "__module__", "").startswith("SCons.") and \
+            action.strfunction(targets, sources, env) is None:
+        return []  # a check, or symlinks that aren't needed
+    if not isinstance(action, SCons.Action.CommandAction):
+        raise _Unsupported(action)
+    escape = env.get("ESCAPE", lambda x: x)
+    lines, ignore, silent = action.process(targets, sources, env, executor)
+    commands = [" ".join(SCons.Subst.escape_list(line, escape)) for line in lines if line]
+    if ignore:
+        commands = ["(%s || true)" % command for command in commands]
+    return commands
+
+
+def _isFile(node):
+    return isinstance(node, SCons.Node.FS.Base) and not isinstance(node, SCons.Node.FS.Dir)
+
+
+class _Writer:
+    """Collect the build statements for the nodes reachable from some
+    aliases."""
+
+    def __init__(self):
+        self.statements = []
+        self.seen = set()
+
+    def paths(self, nodes):
+        return " ".join(ninjaEscape(str(node)) for node in nodes)
+
+    def add(self, node):
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if node in self.seen:
+                continue
+            self.seen.add(node)
+            children = [child for child in node.children() if child not in self.seen]
+            pending.extend(children)
+            pending.extend(node.prerequisites or [])
+            if isinstance(node, SCons.Node.Alias.Alias):
+                inputs = [child for child in node.children() if _isFile(child) or
+                          isinstance(child, SCons.Node.Alias.Alias)]
+                self.statements.append("build %s: phony %s" % (ninjaEscape(str(node)), self.paths(inputs)))
+            elif _isFile(node) and node.has_builder():
+                self.addBuilt(node)
+
+    def addBuilt(self, node):
+        executor = node.get_executor()
+        targets = [t for t in executor.get_all_targets() if _isFile(t)]
+        self.seen.update(targets)
+        sources = executor.get_all_sources()
+        env = executor.get_build_env()
+        compile = history.targetKind(node) == "compile" and \
+            getattr(state.env, "whichCc", None) in ("gcc", "clang")
+        if compile:
+            inputs = list(sources) + [d for t in targets for d in t.depends]
+        else:
+            inputs = [child for t in targets for child in t.children()]
+        inputs = [n for n in dict.fromkeys(inputs) if _isFile(n)]
+        orderOnly = [n for t in targets for n in (t.prerequisites or []) if _isFile(n) or
+                     isinstance(n, SCons.Node.Alias.Alias)]
+        build = "build %s: %%s %s" % (self.paths(targets), self.paths(inputs))
+        if orderOnly:
+            build += " || " + self.paths(orderOnly)
+        try:
+            commands = _commands(executor.get_action_list()[0] if len(executor.get_action_list()) == 1
+                                 else SCons.Action.ListAction(executor.get_action_list()),
+                                 targets, [s.rfile() for s in sources], env, executor)
+        except _Unsupported:
+            self.statements.append(build % "scons")
+            return
+        if compile and len(commands) != 1:
+            compile = False
+        self.statements.append(build % ("compile" if compile else "cmd"))
+        command = " && ".join(command.rstrip().rstrip(";") for command in commands)
+        self.statements.append("  cmd = %s" % command.replace("$", "$$"))
+        self.statements.append("  desc = %s" % self.paths(targets))
+
+
+def writeNinja(filename, aliases, defaults):
+    """Write a Ninja file that builds some aliases.
+
+    Parameters
+    ----------
+    filename : `str`
+        The file to write; it is left untouched if it wouldn't change.
+    aliases : `list` of `SCons.Node.Alias.Alias`
+        The targets to include, with everything they depend on.
+    defaults : `list` of `SCons.Node.Node`
+        What ``ninja`` should build when given no targets.
+    """
+    writer = _Writer()
+    for alias in aliases:
+        writer.add(alias)
+
+    env = state.env
+    exports = " ".join("%s=%s" % (key, shlex.quote(str(value))) for key, value in sorted(env["ENV"].items())
+                       if "\n" not in str(value))
+    sconsArgs = " ".join(shlex.quote("%s=%s" % (key, value)) for key, value in SCons.Script.ARGLIST)
+    top = env.Dir("#").abspath
+    generators = glob.glob(os.path.join(top, "ups", "*"))
+    for root, dirs, files in os.walk(top):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        generators.extend(os.path.join(root, name) for name in files if name in ("SConstruct", "SConscript"))
+    generators = [os.path.relpath(path, top) for path in sorted(generators)]
+    for path in (env.File(SCons.Script.ARGUMENTS.get("optfile", "buildOpts.py")).abspath,
+                 os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "build.cfg"), _variablesFile()):
+        if os.path.isfile(path):
+            generators.append(os.path.relpath(path, top))
+    _, digest = history.fingerprint()
+
+    lines = ["# Generated by 'scons ninja'; fingerprint %s" % digest,
+             "ninja_required_version = 1.3",
+             "env = export %s;" % exports.replace("$", "$$"),
+             "scons = %s %s" % (shlex.quote(sys.executable), shlex.quote(sys.argv[0])),
+             "sconsargs = %s" % sconsArgs.replace("$", "$$"),
+             _RULES,
+             "build %s: regenerate %s" % (ninjaEscape(os.path.basename(filename)),
+                                          " ".join(ninjaEscape(p) for p in generators)),
+             ""] + writer.statements + ["", "default %s" % writer.paths(defaults), ""]
+    text = "\n".join(lines)
+    try:
+        with open(filename) as fd:
+            if fd.read() == text:
+                os.utime(filename)  # so that ninja knows it is up to date
+                return
+    except OSError:
+        pass
+    with open(filename, "w") as fd:
+        fd.write(text)
+    print("Wrote %s (%d statements)" % (filename, len(writer.statements)))
+
+
+def _variablesFile():
+    return os.path.join(state.env.Dir(state.env["CONFIGUREDIR"]).abspath, _VARIABLES_FILE)
+
+
+def _readVariables():
+    """Return what `_recordVariables` last recorded, or `None`."""
+    try:
+        with open(_variablesFile()) as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return None
+
+
+def _recordVariables():
+    """Record the variables this run of scons was given and a digest of
+    the flags they led to, leaving the file alone if they haven't
+    changed, as build.ninja depends on it."""
+    recorded = dict(variables=[list(arg) for arg in SCons.Script.ARGLIST],
+                    fingerprint=history.fingerprint()[1])
+    if _readVariables() == recorded:
+        return
+    try:
+        os.makedirs(os.path.dirname(_variablesFile()), exist_ok=True)
+        with open(_variablesFile(), "w") as fd:
+            json.dump(recorded, fd, indent=1)
+    except OSError as e:
+        state.log.warn("Unable to record the build variables in %s: %s" % (_variablesFile(), e))
+
+
+def _describe(variables):
+    return " ".join("%s=%s" % tuple(arg) for arg in variables) or "no variables"
+
+
+def declare(aliases, defaults):
+    """Add the ``ninja`` target.
+
+    Parameters
+    ----------
+    aliases : `list` of `str`
+        Names of the aliases to export.
+    defaults : `list` of `str`
+        Names of the aliases ``ninja`` builds by default.
+    """
+    env = state.env
+
+    def action(target, source, env):
+        writeNinja(env.File("#build.ninja").abspath, [env.Alias(name)[0] for name in aliases],
+                   [env.Alias(name)[0] for name in defaults])
+    env.AlwaysBuild(env.Alias("ninja", [], env.Action(action, None)))
+    if not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        _recordVariables()
+
+
+def _install():
+    if not os.environ.get(_REGENERATE_VARIABLE):
+        return
+    recorded = _readVariables()
+    variables = [list(arg) for arg in SCons.Script.ARGLIST]
+    if recorded is not None and recorded["variables"] != variables:
+        state.log.fail("build.ninja was written by scons with %s, but scons has since been run with %s; "
+                       "run scons ninja with the variables to build with"
+                       % (_describe(variables), _describe(recorded["variables"])))
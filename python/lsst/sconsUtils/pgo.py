@@ -0,0 +1,359 @@
+"""Profile-guided optimization.
+
+``pgo=generate`` compiles and links the package's libraries and Python
+extension modules (as `lsst.sconsUtils.lto` does) with
+``-fprofile-generate``, so that running anything that uses them writes
+profiles (``.gcda`` files with gcc, ``.profraw`` files with clang) to
+``pgo/raw``.  ``pgo=use`` compiles them with ``-fprofile-use`` and the
+merged profiles in ``pgo/profile``; ``pgo=off`` is the default.  The
+setting is recorded as ``pgo`` in ``build.cfg``; it can't be combined with
+``profile=gcov``, which writes ``.gcda`` files of its own.
+
+``scons pgo`` does the whole thing, with the other variables given to
+scons:
+
+1. builds ``lib`` and ``python`` (and ``tests``, if they are the training
+   workload) with ``pgo=off`` and times the workload;
+2. builds them with ``pgo=generate`` and runs the workload once;
+3. merges the profiles into ``pgo/profile`` (with ``llvm-profdata`` for
+   clang) and writes ``pgo/manifest.json``, which records the compiler and
+   a digest of each C and C++ source;
+4. builds them with ``pgo=use`` and times the workload again, and writes
+   the times before and after, and the speedup, to ``pgo/report.txt``.
+
+Times are the best of `REPEATS` runs.  The workload is the shell command
+given as ``pgoTrain``; otherwise the executables and Python scripts in
+``benchmarks``, if there is such a directory; otherwise the package's
+tests (the C++ test programs, and pytest on the Python tests).  It runs in
+the package's directory, with ``lib`` and ``python`` first in the library
+and Python paths.
+
+Each object built with ``pgo=use`` depends on the manifest, so it is
+recompiled when the package is retrained.  A profile made from other
+sources or by another compiler isn't an error: when scons starts, the
+number of sources that have changed since ``scons pgo`` was run is
+reported (as is a different compiler) and the compiler's own warnings
+about profiles that don't match are left as warnings; code that has
+changed is optimized without its profile.  If there is no profile at all,
+``pgo=use`` builds as ``pgo=off`` does, with a warning.
+"""
+
+__all__ = ("REPEATS", "directory", "sourceDigests", "checkProfile", "track", "train")
+
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import SCons.Node.FS
+import SCons.Script
+import SCons.Util
+
+from . import reproducible
+from . import state
+
+# Times the workload is run before and after, to take the best of
+REPEATS = 3
+
+# Targets built for every phase of scons pgo
+_TARGETS = ("lib", "python")
+
+# Suffixes of the sources the manifest records
+_SOURCE_SUFFIXES = (".c", ".cc", ".cpp", ".cxx", ".h", ".hh", ".hpp", ".hxx")
+
+_products = set()                       # objects that depend on the manifest
+
+
+def directory(name=""):
+    """Return the absolute path of the profile directory, or of a file or
+    directory in it.
+
+    Parameters
+    ----------
+    name : `str`, optional
+        ``raw``, ``profile``, ``manifest.json`` or ``report.txt``.
+
+    Returns
+    -------
+    path : `str`
+        The path, in ``pgo`` at the top of the package.
+    """
+    path = state.env.Dir("#pgo").abspath
+    return os.path.join(path, name) if name else path
+
+
+def sourceDigests(top):
+    """Return a digest of each of the package's C and C++ sources.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+
+    Returns
+    -------
+    digests : `dict` [`str`, `str`]
+        The SHA-1 of each source, keyed by its path relative to ``top``.
+    """
+    digests = {}
+    for path in reproducible.sourceFiles(top):
+        if path.endswith(_SOURCE_SUFFIXES) and not path.startswith((".", "build/", "pgo/")):
+            with open(os.path.join(top, path), "rb") as fd:
+                digests[path] = hashlib.sha1(fd.read()).hexdigest()
+    return digests
+
+
+def checkProfile(compiler):
+    """Check whether there is a profile to build with, and report how
+    far it is out of date.
+
+    Parameters
+    ----------
+    compiler : `str`
+        The compiler and its version (e.g. ``gcc 12.2.0``).
+
+    Returns
+    -------
+    found : `bool`
+        `True` if ``scons pgo`` has made a profile.
+    """
+    try:
+        with open(directory("manifest.json")) as fd:
+            manifest = json.load(fd)
+    except (OSError, ValueError):
+        state.log.warn("There is no profile in %s, so pgo=use builds without one; run scons pgo to make "
+                       "one" % directory())
+        return False
+    if manifest.get("compiler") != compiler:
+        state.log.warn("The profile in %s was made with %s, not %s, and may not be used; run scons pgo "
+                       "to remake it" % (directory(), manifest.get("compiler"), compiler))
+    recorded = manifest.get("sources", {})
+    current = sourceDigests(state.env.Dir("#").abspath)
+    changed = [path for path in sorted(set(recorded) | set(current))
+               if recorded.get(path) != current.get(path)]
+    if changed:
+        state.log.warn("%d of the package's %d sources have changed since the profile in %s was made "
+                       "(%s); code that changed is optimized without it.  Run scons pgo to remake it" %
+                       (len(changed), len(current), directory(), ", ".join(changed[:5]) +
+                        (", ..." if len(changed) > 5 else "")))
+    return True
+
+
+def track(nodes):
+    """Have the objects that targets are built from depend on the
+    profile, if they are built with it.
+
+    Parameters
+    ----------
+    nodes : `list` of `SCons.Node.Node`
+        The targets.
+    """
+    env = state.env
+    if getattr(env, "whichPgo", "off") != "use":
+        return
+    manifest = env.File("#pgo/manifest.json")
+    suffix = env.subst("$SHOBJSUFFIX")
+    pending = list(SCons.Util.flatten(nodes))
+    while pending:
+        node = pending.pop()
+        if isinstance(node, SCons.Node.FS.Entry):
+            node = node.disambiguate()
+        if node in _products or not isinstance(node, SCons.Node.FS.File) or not node.has_builder():
+            continue
+        _products.add(node)
+        if node.get_path().endswith(suffix):
+            env.Depends(node, manifest)
+        pending.extend(node.sources)
+
+
+def _workload(top):
+    """Return the training commands and whether they are the tests.
+
+    Returns
+    -------
+    commands : `list` of `str` or `list` of `str`
+        Commands (a `str` is run by the shell).
+    tests : `bool`
+        Are the commands the package's tests?
+    """
+    if state.env.get("pgoTrain"):
+        return [state.env["pgoTrain"]], False
+    benchmarks = os.path.join(top, "benchmarks")
+    if os.path.isdir(benchmarks):
+        commands = []
+        for path in sorted(glob.glob(os.path.join(benchmarks, "*"))):
+            relative = os.path.relpath(path, top)
+            if path.endswith(".py"):
+                commands.append([sys.executable, relative])
+            elif os.path.isfile(path) and os.access(path, os.X_OK):
+                commands.append([os.path.join(".", relative)])
+        return commands, False
+    commands = [[os.path.join(".", os.path.splitext(os.path.relpath(path, top))[0])]
+                for path in sorted(glob.glob(os.path.join(top, "tests", "*.cc")))]
+    if glob.glob(os.path.join(top, "tests", "*.py")):
+        commands.append([sys.executable, "-m", "pytest", "-q", "tests"])
+    return commands, True
+
+
+def _describe(command):
+    return command if isinstance(command, str) else " ".join(command)
+
+
+class _TrainingError(Exception):
+    """Something stopped scons pgo."""
+
+
+def _jobsGiven():
+    """Was the number of jobs given on the command line?"""
+    return any(re.search(r"^(-[^-]*j|--jobs)", arg) for arg in sys.argv[1:])
+
+
+def _build(phase, targets):
+    """Build targets with a setting of pgo; return the exit status."""
+    variables = ["%s=%s" % (key, value) for key, value in SCons.Script.ARGLIST if key != "pgo"]
+    # Without -j the builds choose the default number of jobs themselves
+    jobs = ["-j", str(SCons.Script.GetOption("num_jobs"))] if _jobsGiven() else []
+    command = [sys.executable, sys.argv[0], "-Q"] + jobs + variables + ["pgo=%s" % phase] + list(targets)
+    print("Building %s with pgo=%s" % (" ".join(targets), phase))
+    return subprocess.call(command)
+
+
+def _run(commands, top, repeats):
+    """Run the training commands; return the best time of each."""
+    environ = dict(os.environ)
+    for var, subdir in (("LD_LIBRARY_PATH", "lib"), ("DYLD_LIBRARY_PATH", "lib"), ("PYTHONPATH", "python")):
+        environ[var] = os.pathsep.join([os.path.join(top, subdir)] +
+                                       ([environ[var]] if environ.get(var) else []))
+    times = []
+    for command in commands:
+        best = None
+        for i in range(repeats):
+            start = time.perf_counter()
+            status = subprocess.call(command, cwd=top, env=environ, shell=isinstance(command, str),
+                                     stdout=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            if status != 0:
+                raise _TrainingError("Training command %r failed with status %d" %
+                                     (_describe(command), status))
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+    return times
+
+
+def _merge(top):
+    """Move or merge the raw profiles into the profile directory."""
+    raw, profile = directory("raw"), directory("profile")
+    built = state._loadState(top)
+    if os.path.isdir(profile):
+        shutil.rmtree(profile)
+    if built.get("cc") == "clang":
+        profraw = sorted(glob.glob(os.path.join(raw, "*.profraw")))
+        tool = state._toolFor("llvm-profdata", state.env.subst("$CC"), "clang") or \
+            state.env.WhereIs("llvm-profdata")
+        if not profraw or tool is None:
+            reason = "llvm-profdata wasn't found" if profraw else "the workload wrote none"
+            raise _TrainingError("Can't merge the profiles in %s: %s" % (raw, reason))
+        os.makedirs(profile)
+        if subprocess.call([tool, "merge", "-o", os.path.join(profile, "default.profdata")] + profraw) != 0:
+            raise _TrainingError("Merging the profiles in %s failed" % raw)
+        shutil.rmtree(raw)
+    else:
+        # gcc has already merged the profiles of each run into one file
+        # per object
+        if not glob.glob(os.path.join(raw, "*.gcda")):
+            raise _TrainingError("The workload wrote no profiles to %s" % raw)
+        os.replace(raw, profile)
+    manifest = dict(compiler="%s %s" % (built.get("cc", "unknown"), built.get("ccversion", "unknown")),
+                    sources=sourceDigests(top))
+    with open(directory("manifest.json"), "w") as fd:
+        json.dump(manifest, fd, indent=2, sort_keys=True)
+
+
+def _report(commands, before, after):
+    """Write and print the times before and after optimization."""
+    width = max([len(_describe(command)) for command in commands] + [len("total")])
+    lines = ["Profile-guided optimization (best of %d runs)" % REPEATS,
+             "%-*s  %10s  %10s  %7s" % (width, "command", "before (s)", "after (s)", "speedup")]
+    rows = list(zip([_describe(command) for command in commands], before, after))
+    rows.append(("total", sum(before), sum(after)))
+    for name, old, new in rows:
+        lines.append("%-*s  %10.3f  %10.3f  %6.2fx" % (width, name, old, new, old/new if new > 0 else 0))
+    text = "\n".join(lines) + "\n"
+    with open(directory("report.txt"), "w") as fd:
+        fd.write(text)
+    print(text, end="")
+    print("Written to %s" % directory("report.txt"))
+
+
+def train():
+    """Build the package with profile-guided optimization and report what
+    it gained.
+
+    Returns
+    -------
+    status : `int`
+        0 if the package was built with its profile, 1 if a build or the
+        training failed.
+
+    Notes
+    -----
+    This is what ``scons pgo`` runs; it builds the package with further
+    runs of scons, so it shouldn't be called while this one is building
+    anything.
+    """
+    top = state.env.Dir("#").abspath
+    commands, tests = _workload(top)
+    if not commands:
+        state.log.warn("There is no training workload: set pgoTrain, or add benchmarks or tests")
+        return 1
+    targets = list(_TARGETS) + (["tests"] if tests else []) + \
+        (["benchmarks"] if os.path.isdir(os.path.join(top, "benchmarks")) else [])
+    print("Training with: %s" % "; ".join(_describe(command) for command in commands))
+
+    try:
+        if _build("off", targets) != 0:
+            return 1
+        before = _run(commands, top, REPEATS)
+
+        if _build("generate", targets) != 0:
+            return 1
+        shutil.rmtree(directory("raw"), ignore_errors=True)
+        os.makedirs(directory("raw"))
+        _run(commands, top, 1)
+        _merge(top)
+
+        if _build("use", targets) != 0:
+            return 1
+        after = _run(commands, top, REPEATS)
+    except _TrainingError as e:
+        state.log.warn(str(e))
+        return 1
+    _report(commands, before, after)
+    return 0
+
+
+_scratch = None                         # directory of the signatures of this run of scons pgo
+
+
+def _train(target, source, env):
+    return train()
+
+
+def _install():
+    global _scratch
+    env = state.env
+    if "pgo" in SCons.Script.COMMAND_LINE_TARGETS and \
+            (len(SCons.Script.COMMAND_LINE_TARGETS) > 1 or "pgo" in SCons.Script.ARGUMENTS):
+        state.log.fail("scons pgo builds the package itself; don't give it other targets or pgo=")
+    if "pgo" in SCons.Script.COMMAND_LINE_TARGETS and env["sconsign"] != "directory":
+        # The builds train runs record the signatures of what they build;
+        # keep this run's own, which it would write as it exits, apart
+        _scratch = tempfile.TemporaryDirectory(prefix="sconsUtils-pgo-")
+        env.SConsignFile(os.path.join(_scratch.name, ".sconsign"))
+    env.AlwaysBuild(env.Alias("pgo", [], env.Action(_train, None)))
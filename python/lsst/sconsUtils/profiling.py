@@ -0,0 +1,244 @@
+"""Where compile time and memory go.
+
+With ``profileCompile=1`` the compiler is asked to report where its time
+goes (``-ftime-trace`` for clang, ``-ftime-report`` for gcc; see
+`lsst.sconsUtils.state`).  After each compile the report is parsed and
+combined with the duration and peak memory measured by
+`lsst.sconsUtils.scheduling`.  The profiles of all sources compiled so far
+are kept in ``compileProfile.json`` in the SCons configuration directory,
+and at the end of the build a summary ranks the slowest sources (split
+into frontend and backend time) and, over all sources, the most expensive
+headers and template instantiations (clang) or compiler passes (gcc).
+
+Independently, ``compileTimeBudget`` and ``compileMemoryBudget`` warn about
+each source whose compilation exceeds them.
+"""
+
+__all__ = ("CompileProfile", "parseTimeReport", "parseTimeTrace")
+
+import json
+import os
+import re
+
+import SCons.Script
+import SCons.Script.Main
+
+from . import history
+from . import interactive
+from . import scheduling
+from . import state
+
+# Number of entries in each ranking of the summary
+_TOP = 10
+
+# gcc phases that make up the frontend and backend
+_FRONTEND_PHASES = ("phase parsing", "phase lang. deferred")
+_BACKEND_PHASES = ("phase opt and generate", "phase last asm", "phase finalize")
+
+_TIME_REPORT_LINE = re.compile(r"^\s*(?P<name>[^:]+?)\s*:\s*[\d.]+\s*\(\s*\d+%\)\s*[\d.]+\s*\(\s*\d+%\)"
+                               r"\s*(?P<wall>[\d.]+)\s*\(\s*\d+%\)")
+
+
+class CompileProfile:
+    """The profiles of the sources compiled by this and earlier builds.
+
+    Parameters
+    ----------
+    filename : `str`
+        File to load the profiles from and save them to.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            with open(filename) as fd:
+                self.profiles = json.load(fd)
+        except (OSError, ValueError):
+            self.profiles = {}
+
+    def add(self, target, profile):
+        """Replace the profile of a target."""
+        self.profiles[str(target)] = profile
+
+    def save(self):
+        """Write the profiles back."""
+        try:
+            with open(self.filename, "w") as fd:
+                json.dump(self.profiles, fd, indent=1, sort_keys=True)
+        except OSError as e:
+            state.log.warn("Unable to save compile profile to %s: %s" % (self.filename, e))
+
+    def _total(self, key):
+        """Sum the named breakdown over all profiles."""
+        totals = {}
+        for profile in self.profiles.values():
+            for name, seconds in profile.get(key, {}).items():
+                count, total = totals.get(name, (0, 0.0))
+                totals[name] = (count + 1, total + seconds)
+        return totals
+
+    def summarize(self):
+        """Print the slowest sources and the costliest headers,
+        templates and compiler passes."""
+        print("Compile profile of %d sources (see %s):" % (len(self.profiles), self.filename))
+        print("  %8s %8s %8s %7s  %s" % ("total", "frontend", "backend", "memory", "slowest sources"))
+        for target, profile in sorted(self.profiles.items(), key=lambda item: -item[1]["seconds"])[:_TOP]:
+            print("  %7.1fs %s %s %7s  %s" % (
+                profile["seconds"],
+                "%7.1fs" % profile["frontend"] if profile.get("frontend") is not None else "%8s" % "-",
+                "%7.1fs" % profile["backend"] if profile.get("backend") is not None else "%8s" % "-",
+                "%dM" % profile["rss"] if profile.get("rss") else "-", target))
+        for key, title in (("headers", "headers (including what they include)"),
+                           ("templates", "template instantiations"),
+                           ("passes", "compiler passes")):
+            totals = self._total(key)
+            if not totals:
+                continue
+            print("  %8s %8s  most expensive %s" % ("total", "sources", title))
+            for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])[:_TOP]:
+                print("  %7.1fs %8d  %s" % (total, count, name))
+
+
+def parseTimeReport(text):
+    """Parse the output of gcc's ``-ftime-report``.
+
+    Parameters
+    ----------
+    text : `str`
+        Everything the compiler wrote to standard error.
+
+    Returns
+    -------
+    profile : `dict` or `None`
+        Wall-clock ``frontend`` and ``backend`` time and the time of each
+        compiler pass (``passes``), or `None` if there was no report.
+    rest : `str`
+        ``text`` without the report.
+    """
+    lines = text.splitlines(keepends=True)
+    for first, line in enumerate(lines):
+        if line.startswith("Time variable"):
+            break
+    else:
+        return None, text
+    last = first
+    profile = dict(frontend=0.0, backend=0.0, passes={})
+    for last in range(first + 1, len(lines)):
+        if lines[last].lstrip().startswith("TOTAL"):
+            break
+        match = _TIME_REPORT_LINE.search(lines[last])
+        if not match:
+            continue
+        name, wall = match.group("name"), float(match.group("wall"))
+        if name in _FRONTEND_PHASES:
+            profile["frontend"] += wall
+        elif name in _BACKEND_PHASES:
+            profile["backend"] += wall
+        elif not name.startswith(("phase ", "|")) and wall > 0:
+            profile["passes"][name] = wall
+    if first > 0 and not lines[first - 1].strip():
+        first -= 1
+    return profile, "".join(lines[:first] + lines[last + 1:])
+
+
+def parseTimeTrace(filename):
+    """Parse the trace written by clang's ``-ftime-trace``.
+
+    Parameters
+    ----------
+    filename : `str`
+        The ``.json`` file written next to the object file.
+
+    Returns
+    -------
+    profile : `dict` or `None`
+        Wall-clock ``frontend`` and ``backend`` time and the time spent
+        on each header (``headers``) and template (``templates``), or
+        `None` if the trace can't be read.
+    """
+    try:
+        with open(filename) as fd:
+            events = json.load(fd)["traceEvents"]
+    except (OSError, ValueError, KeyError):
+        return None
+    profile = dict(frontend=0.0, backend=0.0, headers={}, templates={})
+    for event in events:
+        name, seconds = event.get("name"), event.get("dur", 0)*1e-6
+        detail = event.get("args", {}).get("detail")
+        if name == "Frontend":
+            profile["frontend"] += seconds
+        elif name == "Backend":
+            profile["backend"] += seconds
+        elif name == "Source" and detail:
+            profile["headers"][detail] = profile["headers"].get(detail, 0.0) + seconds
+        elif name in ("InstantiateClass", "InstantiateFunction") and detail:
+            profile["templates"][detail] = profile["templates"].get(detail, 0.0) + seconds
+    return profile
+
+
+_profiles = None
+_timeBudget = None
+_memoryBudget = None
+_reports = {}                           # parsed -ftime-report of each target, until its task finishes
+
+
+def _filterStderr(task, text):
+    """Take gcc's time report out of what a compile writes to stderr."""
+    profile, rest = parseTimeReport(text)
+    if profile is not None and task is not None:
+        _reports[task.targets[0]] = profile
+    return rest
+
+
+_buildTaskExecute = None                # the BuildTask.execute that _execute replaced
+
+
+def _execute(task):
+    """Replacement for ``BuildTask.execute`` that profiles compiles."""
+    _buildTaskExecute(task)
+    target = task.targets[0]
+    if history.targetKind(target) != "compile":
+        return
+    seconds = scheduling._durations.get(str(target), 0.0)
+    rss = scheduling._peakMemory.get(str(target))
+    if _timeBudget is not None and seconds > _timeBudget:
+        state.log.warn("Compiling %s took %.1fs, more than compileTimeBudget=%g"
+                       % (target, seconds, _timeBudget))
+    if _memoryBudget is not None and rss is not None and rss > _memoryBudget:
+        state.log.warn("Compiling %s needed %d MB, more than compileMemoryBudget=%d MB"
+                       % (target, rss, _memoryBudget))
+    if _profiles is None:
+        return
+    if state.env.whichCc == "clang":
+        profile = parseTimeTrace(os.path.splitext(target.abspath)[0] + ".json")
+    else:
+        profile = _reports.pop(target, None)
+    profile = profile or {}
+    profile.update(seconds=seconds, rss=rss)
+    _profiles.add(target, profile)
+
+
+def _finish():
+    if _profiles.profiles:
+        _profiles.save()
+        _profiles.summarize()
+
+
+def _install():
+    global _profiles, _timeBudget, _memoryBudget, _buildTaskExecute
+    env = state.env
+    if env.GetOption("clean") or env.GetOption("no_exec") or env.GetOption("help") or \
+            env.GetOption("estimate"):
+        return
+    if env.get("compileTimeBudget"):
+        _timeBudget = float(env["compileTimeBudget"])
+    if env.get("compileMemoryBudget"):
+        _memoryBudget = scheduling._parseMemory(env["compileMemoryBudget"])
+    if env["profileCompile"]:
+        _profiles = CompileProfile(os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "compileProfile.json"))
+        scheduling.filterStderr(_filterStderr)
+        interactive.atBuildEnd(_finish)
+    elif _timeBudget is None and _memoryBudget is None:
+        return
+    _buildTaskExecute = SCons.Script.Main.BuildTask.execute
+    SCons.Script.Main.BuildTask.execute = _execute
@@ -0,0 +1,174 @@
+"""Builds that don't depend on where or when they happen.
+
+With ``reproducible=1``:
+
+- The compiler is told to write the package's directory as ``.``, and
+  the directory of each upstream product as the product's name, wherever
+  it would record them (``__FILE__``, the DWARF ``comp_dir`` and source
+  file names), using ``-ffile-prefix-map`` or, with older compilers,
+  ``-fdebug-prefix-map`` and ``-fmacro-prefix-map``.  These flags, and the
+  ``-rpath-link`` directories, are left out of the build signatures, so
+  builds in different directories can share the files in ``cacheDir``.
+- ``SOURCE_DATE_EPOCH`` is set to the time of the last commit, unless it
+  is set already, so that ``__DATE__`` and ``__TIME__`` are the same in
+  every build of a commit.
+- Static libraries are written in ``ar``'s deterministic mode.
+
+Lists of sources, tests and directories are sorted whether or not
+``reproducible`` is set.  Shared libraries already record their
+``SONAME`` (or install name) without a directory, and no ``rpath`` is
+added to them.
+
+``scons checkReproducible`` copies the package's sources to two
+directories with names of different lengths, builds ``lib`` and
+``python`` in each with ``reproducible=1`` (and the other variables given
+to scons), and lists the files that aren't identical; the copies are
+kept for inspection if there are any.
+"""
+
+__all__ = ("sourceFiles", "compareTrees", "buildCopy")
+
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import SCons.Script
+
+from . import state
+
+# Files written by SCons or sconsUtils rather than by the commands being
+# checked, relative to the top of the package
+_IGNORED = (".sconf_temp", ".sconsign.dblite", ".sconsign.sqlite", "config.log", ".cache", "__pycache__",
+            ".pytest_cache")
+
+# Targets built by checkReproducible
+_TARGETS = ("lib", "python")
+
+
+def sourceFiles(top):
+    """Return the package's source files.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+
+    Returns
+    -------
+    files : `list` of `str`
+        Paths relative to ``top``: those git knows of or would add, or if
+        ``top`` isn't in a git repository, everything but hidden files.
+    """
+    try:
+        output = subprocess.run(["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                                cwd=top, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+        return sorted(f for f in os.fsdecode(output).split("\0")
+                      if f and os.path.isfile(os.path.join(top, f)))
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    files = []
+    for root, dirs, names in os.walk(top):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in _IGNORED)
+        files.extend(os.path.relpath(os.path.join(root, name), top) for name in sorted(names)
+                     if not name.startswith("."))
+    return files
+
+
+def compareTrees(first, second, ignore=()):
+    """List the files that differ between two directories.
+
+    Parameters
+    ----------
+    first, second : `str`
+        The directories.
+    ignore : iterable of `str`
+        Files not to compare, relative to the directories.
+
+    Returns
+    -------
+    differences : `list` of `str`
+        The files (relative to the directories) whose contents differ, or
+        that are only in one of them.
+    """
+    ignore = set(ignore)
+
+    def files(top):
+        result = set()
+        for root, dirs, names in os.walk(top):
+            dirs[:] = [d for d in dirs if d not in _IGNORED]
+            for name in names:
+                path = os.path.relpath(os.path.join(root, name), top)
+                if path not in ignore and name not in _IGNORED and not name.endswith(".pyc"):
+                    result.add(path)
+        return result
+
+    firstFiles, secondFiles = files(first), files(second)
+    differences = sorted(firstFiles ^ secondFiles)
+    for path in sorted(firstFiles & secondFiles):
+        if not filecmp.cmp(os.path.join(first, path), os.path.join(second, path), shallow=False):
+            differences.append(path)
+    return sorted(differences)
+
+
+def buildCopy(top, files, directory, settings=(("reproducible", "1"), ("cacheDir", ""))):
+    """Copy the package's sources to a directory and build it there.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+    files : `list` of `str`
+        The files to copy, relative to ``top`` (see `sourceFiles`).
+    directory : `str`
+        Where to copy them to.
+    settings : iterable of (`str`, `str`), optional
+        Variables to build with, overriding those given to scons.
+
+    Returns
+    -------
+    status : `int`
+        The exit status of scons.
+    """
+    for path in files:
+        os.makedirs(os.path.join(directory, os.path.dirname(path)), exist_ok=True)
+        shutil.copy2(os.path.join(top, path), os.path.join(directory, path))
+    settings = dict(settings)
+    variables = ["%s=%s" % (key, value) for key, value in SCons.Script.ARGLIST if key not in settings]
+    command = [sys.executable, sys.argv[0], "-Q", "-j", str(SCons.Script.GetOption("num_jobs"))] + \
+        ["%s=%s" % item for item in settings.items()] + variables + list(_TARGETS)
+    # Products set up from this directory must be found in the copy
+    environ = {k: v for k, v in os.environ.items() if k != "SCONSUTILS_CACHE_DIR" and
+               not (k.endswith("_DIR") and os.path.realpath(v) == os.path.realpath(top))}
+    environ.setdefault("SOURCE_DATE_EPOCH", state._lastCommitTime(top) or "0")
+    print("Building %s in %s" % (" ".join(_TARGETS), directory))
+    return subprocess.call(command, cwd=directory, env=environ)
+
+
+def _check(target, source, env):
+    """Build the package twice and compare the results."""
+    top = env.Dir("#").abspath
+    files = sourceFiles(top)
+    first = tempfile.mkdtemp(prefix="reproducible-")
+    second = os.path.join(tempfile.mkdtemp(prefix="reproducible-"), "another-directory")
+    for directory in (first, second):
+        if buildCopy(top, files, directory) != 0:
+            state.log.warn("Building in %s failed" % directory)
+            return 1
+    differences = compareTrees(first, second, files)
+    if differences:
+        print("%d built files differ between %s and %s:" % (len(differences), first, second))
+        for path in differences:
+            print("    %s" % path)
+        return 1
+    print("The builds in %s and %s are identical" % (first, second))
+    shutil.rmtree(first)
+    shutil.rmtree(os.path.dirname(second))
+    return 0
+
+
+def _install():
+    env = state.env
+    env.AlwaysBuild(env.Alias("checkReproducible", [], env.Action(_check, None)))
@@ -0,0 +1,566 @@
+"""Resource-aware execution of build commands.
+
+Every task SCons executes goes through `_execute`, which records how long
+it took, and on POSIX platforms every command it spawns goes through
+`_spawn`, which records the peak resident memory of the command.
+
+When SCons chooses which dependencies of a target to visit first, those
+with the longest chain of work below them (according to the durations
+recorded by previous builds) are preferred, so that the critical path
+starts as early as possible.  Commands for targets marked with
+`lowPriority` are run with reduced CPU and I/O priority.
+
+The start and end of every task and command, and the job slot that ran
+it, are kept so that ``--buildTrace`` can write a timeline of the build
+in the Chrome trace-event format (viewable with Perfetto or
+``chrome://tracing``).
+
+Targets created by
+`lsst.sconsUtils.scripts.BasicSConscript` are weighted by their expected
+memory use (learned from previous builds or declared with
+`declareMemory`), and if ``--maxBuildMemory`` is given the total weight
+of the tasks running at once is kept under that limit.
+
+Importing this module also sets the default number of jobs (when ``-j``
+is not given) from the number of CPUs and the available memory.
+"""
+
+__all__ = ("TargetRecords", "MemoryPool", "declareMemory", "track", "memoryWeight", "defaultJobs",
+           "lowPriority", "pathLength", "criticalPath", "writeTrace", "filterStderr")
+
+import contextlib
+import fnmatch
+import itertools
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from distutils.spawn import find_executable
+
+import SCons.Script
+import SCons.Script.Main
+import SCons.Taskmaster
+
+from . import interactive
+from . import state
+
+# Memory (MB) assumed for a tracked target we know nothing about
+_DEFAULT_MEMORY = 512
+
+# Memory (MB) to allow per job when choosing the default number of jobs
+_JOB_MEMORY = 1024
+
+
+class TargetRecords:
+    """Measurements of individual targets from previous builds.
+
+    The records are kept in ``targets.json`` in the SCons configuration
+    directory (next to ``build.cfg``), keyed by target path.
+
+    Parameters
+    ----------
+    filename : `str`
+        File to load the records from and save them to.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.modified = False
+        self._lock = threading.Lock()
+        try:
+            with open(filename) as fd:
+                self._records = json.load(fd)
+        except (OSError, ValueError):
+            self._records = {}
+
+    def get(self, target, key, default=None):
+        """Return a measurement of a target, or ``default`` if there is
+        none."""
+        return self._records.get(str(target), {}).get(key, default)
+
+    def has(self, key):
+        """Return `True` if any target has a measurement called ``key``."""
+        return any(key in record for record in self._records.values())
+
+    def set(self, target, key, value):
+        """Record a measurement of a target."""
+        with self._lock:
+            self._records.setdefault(str(target), {})[key] = value
+            self.modified = True
+
+    def save(self):
+        """Write the records back if anything changed."""
+        if not self.modified:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(self.filename, "w") as fd:
+                json.dump(self._records, fd, indent=1, sort_keys=True)
+        except OSError as e:
+            state.log.warn("Unable to save target records to %s: %s" % (self.filename, e))
+
+
+class MemoryPool:
+    """A counting semaphore for the estimated memory of running tasks.
+
+    Parameters
+    ----------
+    budget : `int`
+        Total memory (MB) the running tasks may use.
+
+    Notes
+    -----
+    A task whose weight alone exceeds the budget is still run, but only
+    once nothing else holds a reservation.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def reserve(self, amount):
+        """Context manager that holds ``amount`` MB of the budget,
+        waiting until it is available."""
+        amount = min(amount, self.budget)
+        with self._condition:
+            while self.used and self.used + amount > self.budget:
+                self._condition.wait()
+            self.used += amount
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.used -= amount
+                self._condition.notify_all()
+
+
+_patterns = []
+_tracked = set()
+_current = threading.local()
+_peakMemory = {}                        # peak memory (MB) of the targets built by this run
+_durations = {}                         # wall-clock time (s) of the tasks run by this run, by target
+_executed = []                          # targets of the tasks run by this run
+_events = []                            # (category, name, start, end, slot, targets, command)
+_timesLock = threading.Lock()
+_slots = itertools.count()
+_background = set()
+_backgroundPrefix = []                  # command prefix used to lower priority
+_pathLengths = {}
+_stderrFilter = None
+_pool = None
+records = None
+
+
+def declareMemory(pattern, megabytes):
+    """Declare the expected peak memory of the targets matching a pattern.
+
+    Parameters
+    ----------
+    pattern : `str`
+        Shell-style pattern matched against target paths relative to the
+        top of the package, e.g. ``"python/lsst/afw/image/*.os"``.
+    megabytes : `int`
+        Expected peak resident memory of building one such target.
+
+    Notes
+    -----
+    Measurements from previous builds take precedence over declarations.
+    """
+    _patterns.append((pattern, megabytes))
+
+
+def track(nodes):
+    """Give targets (and the objects they are built from) a memory weight.
+
+    Parameters
+    ----------
+    nodes : `list`
+        Targets, as returned by a builder.
+    """
+    for node in SCons.Script.Flatten(nodes):
+        _tracked.add(node)
+        for source in node.sources:
+            if source.has_builder():
+                _tracked.add(source)
+
+
+def memoryWeight(targets):
+    """Return the expected peak memory (MB) of building targets.
+
+    Parameters
+    ----------
+    targets : `list`
+        Targets built together by a single task.
+
+    Returns
+    -------
+    weight : `int`
+        Expected memory in MB; 0 if none of the targets is tracked.
+    """
+    weight = 0
+    for target in targets:
+        if target not in _tracked:
+            continue
+        memory = records.get(target, "rss")
+        if memory is None:
+            for pattern, megabytes in _patterns:
+                if fnmatch.fnmatch(str(target), pattern):
+                    memory = megabytes
+                    break
+            else:
+                memory = _DEFAULT_MEMORY
+        weight = max(weight, memory)
+    return weight
+
+
+def lowPriority(nodes):
+    """Run the commands that build targets at reduced CPU and I/O priority.
+
+    Parameters
+    ----------
+    nodes : `list`
+        Targets, as returned by a builder.
+
+    Notes
+    -----
+    This is intended for targets nothing else waits for, such as the
+    documentation and Emacs tags; it has no effect on platforms without
+    ``nice``.
+    """
+    _background.update(SCons.Script.Flatten(nodes))
+
+
+def pathLength(node, durations=None, memo=None):
+    """Return the length of the longest chain of work that ends with
+    building a node.
+
+    Parameters
+    ----------
+    node : `SCons.Node.Node`
+        Node to consider.
+    durations : `dict`, optional
+        Time (s) to build each target, keyed by path; defaults to the
+        durations recorded by previous builds.
+    memo : `dict`, optional
+        Cache of results to use for ``durations``.
+
+    Returns
+    -------
+    length : `float`
+        Time (s) needed to build the node and, one after another, the
+        slowest chain of its dependencies.
+    """
+    if durations is None:
+        memo = _pathLengths
+    elif memo is None:
+        memo = {}
+    try:
+        return memo[node]
+    except KeyError:
+        pass
+    memo[node] = 0.0  # in case of a cycle; SCons will report it
+    if durations is None:
+        length = records.get(node, "duration", 0.0)
+    else:
+        length = durations.get(str(node), 0.0)
+    length += max((pathLength(child, durations, memo) for child in node.children(scan=False)), default=0.0)
+    memo[node] = length
+    return length
+
+
+def _order(dependencies):
+    """Sort dependencies so those with the longest path are visited first.
+
+    The Taskmaster pushes dependencies on a stack, so the last entry is
+    the first visited; the sort is stable, so ties keep SCons' order.
+    """
+    return sorted(dependencies, key=pathLength)
+
+
+class _Taskmaster(SCons.Taskmaster.Taskmaster):
+    """Taskmaster that applies `_order` after the order SCons asks for."""
+
+    def __init__(self, targets=[], tasker=None, order=None, trace=None):
+        if order is None:
+            ordered = _order
+        else:
+            def ordered(dependencies):
+                return _order(order(dependencies))
+        super().__init__(targets, tasker, ordered, trace)
+
+
+def filterStderr(function):
+    """Pass the standard error of every command through a function.
+
+    Parameters
+    ----------
+    function : callable
+        Called as ``function(task, text)`` once a command has finished,
+        where ``task`` is the task that ran the command (or `None`) and
+        ``text`` is everything the command wrote to standard error; it
+        returns the text that should be shown.
+
+    Notes
+    -----
+    Only one filter can be installed.  This has no effect on platforms
+    where commands are not spawned by this module.
+    """
+    global _stderrFilter
+    _stderrFilter = function
+
+
+def _parseMemory(value):
+    """Convert a memory size such as ``16G`` or ``4000M`` to MB."""
+    match = re.search(r"^\s*(\d+(?:\.\d+)?)\s*([kKmMgGtT]?)[bB]?\s*$", value)
+    if not match:
+        state.log.fail("Unable to parse memory size %r" % value)
+    scale = {"k": 1.0/1024, "m": 1, "": 1, "g": 1024, "t": 1024**2}[match.group(2).lower()]
+    return int(float(match.group(1))*scale)
+
+
+def _availableMemory():
+    """Return the available physical memory in MB, or `None` if unknown."""
+    try:
+        with open("/proc/meminfo") as fd:
+            for line in fd:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1])//1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE")*os.sysconf("SC_PHYS_PAGES")//1024**2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def defaultJobs(maxMemory=None):
+    """Return a number of parallel jobs suited to this machine.
+
+    Parameters
+    ----------
+    maxMemory : `int`, optional
+        Memory (MB) the build may use; defaults to the available memory.
+
+    Returns
+    -------
+    jobs : `int`
+        The number of CPUs, reduced so each job has ``_JOB_MEMORY`` MB.
+    """
+    jobs = os.cpu_count() or 1
+    memory = _availableMemory()
+    if maxMemory is not None:
+        memory = min(memory, maxMemory) if memory else maxMemory
+    if memory:
+        jobs = min(jobs, memory//_JOB_MEMORY)
+    return max(1, jobs)
+
+
+def _slot():
+    """Return the number of the job slot running in this thread."""
+    try:
+        return _current.slot
+    except AttributeError:
+        # SCons' worker threads live for the whole build, so each new
+        # thread takes the next number.
+        _current.slot = next(_slots)
+        return _current.slot
+
+
+def _spawn(sh, escape, cmd, args, env):
+    """Run a command like SCons' POSIX ``SPAWN``, recording its peak
+    memory against the targets of the current task."""
+    task = getattr(_current, "task", None)
+    prefix = []
+    if task is not None and _background.intersection(task.targets):
+        prefix = _backgroundPrefix
+    # Standard error goes to a file rather than a pipe as we can't read a
+    # pipe while waiting for the command.
+    errors = tempfile.TemporaryFile() if _stderrFilter is not None else None
+    start = time.time()
+    proc = subprocess.Popen(prefix + [sh, "-c", " ".join(args)], env=env, close_fds=True, stderr=errors)
+    pid, status, usage = os.wait4(proc.pid, 0)
+    if errors is not None:
+        errors.seek(0)
+        sys.stderr.write(_stderrFilter(task, errors.read().decode(errors="replace")))
+        errors.close()
+    targets = [str(target) for target in task.targets] if task is not None else []
+    _events.append(("command", os.path.basename(args[0]), start, time.time(), _slot(), targets,
+                    " ".join(args)))
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    # The child's peak includes the image of this process it was forked
+    # from, so only a peak above our own is a measurement of the command.
+    if task is not None and usage.ru_maxrss > resource.getrusage(resource.RUSAGE_SELF).ru_maxrss:
+        rss = usage.ru_maxrss//(1024**2 if sys.platform == "darwin" else 1024)  # MB
+        with _timesLock:
+            for target in task.targets:
+                _peakMemory[str(target)] = max(rss, _peakMemory.get(str(target), 0))
+    return proc.returncode
+
+
+_buildTaskExecute = None                # the BuildTask.execute that _execute replaced
+
+
+def _execute(task):
+    """Replacement for ``BuildTask.execute`` that waits for memory to be
+    available before running a task, and times it."""
+    _current.task = task
+    try:
+        if _pool is None:
+            _timedExecute(task)
+        else:
+            with _pool.reserve(memoryWeight(task.targets)):
+                _timedExecute(task)
+    finally:
+        _current.task = None
+
+
+def _timedExecute(task):
+    start = time.time()
+    try:
+        _buildTaskExecute(task)
+    finally:
+        end = time.time()
+        targets = [str(target) for target in task.targets]
+        with _timesLock:
+            for target in targets:
+                _durations[target] = round(end - start, 3)
+            _executed.extend(task.targets)
+            _events.append(("task", targets[0], start, end, _slot(), targets, None))
+
+
+def _saveRecords():
+    for target, rss in _peakMemory.items():
+        records.set(target, "rss", rss)
+    for target, duration in _durations.items():
+        records.set(target, "duration", duration)
+    records.save()
+
+
+def _reset():
+    """Forget the tasks run by the previous build (see
+    `lsst.sconsUtils.interactive`)."""
+    with _timesLock:
+        _peakMemory.clear()
+        _durations.clear()
+        del _executed[:]
+        del _events[:]
+    _pathLengths.clear()  # the records have changed
+
+
+def criticalPath(targets, durations=None):
+    """Return the longest chain of work among some targets.
+
+    Parameters
+    ----------
+    targets : `list`
+        Nodes to consider.
+    durations : `dict`, optional
+        Time (s) to build each target, keyed by path; see `pathLength`.
+
+    Returns
+    -------
+    path : `list` of (`SCons.Node.Node`, `float`)
+        The nodes on the chain, ending with the first one to be built,
+        and the time each took.
+    """
+    memo = None if durations is None else {}
+    path = []
+    nodes = targets
+    while nodes:
+        node = max(nodes, key=lambda n: pathLength(n, durations, memo))
+        length = pathLength(node, durations, memo)
+        if not length:
+            break
+        children = node.children(scan=False)
+        below = max((pathLength(child, durations, memo) for child in children), default=0.0)
+        path.append((node, length - below))
+        nodes = children
+    return path
+
+
+def writeTrace(filename):
+    """Write the tasks and commands run so far as a trace-event file.
+
+    Parameters
+    ----------
+    filename : `str`
+        File to write; it can be loaded by Perfetto or
+        ``chrome://tracing``.
+    """
+    with _timesLock:
+        events = list(_events)
+    origin = min((event[2] for event in events), default=0.0)
+    trace = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": slot, "args": {"name": "job %d" % slot}}
+             for slot in sorted({event[4] for event in events})]
+    for category, name, start, end, slot, targets, command in events:
+        args = {"targets": targets}
+        if command is not None:
+            args["command"] = command
+        trace.append({"name": name, "cat": category, "ph": "X", "pid": 1, "tid": slot,
+                      "ts": int((start - origin)*1e6), "dur": int((end - start)*1e6), "args": args})
+    with open(filename, "w") as fd:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, fd)
+
+
+def _report():
+    """Compare the time the build took with the best any schedule could
+    have achieved on the same number of jobs, and write the trace."""
+    traceFile = SCons.Script.GetOption("buildTrace")
+    if traceFile:
+        try:
+            writeTrace(traceFile)
+        except OSError as e:
+            state.log.warn("Unable to write build trace to %s: %s" % (traceFile, e))
+    tasks = [event for event in _events if event[0] == "task"]
+    if len(tasks) < 2 or not (traceFile or state.log.verbose):
+        return
+    jobs = SCons.Script.GetOption("num_jobs")
+    makespan = max(event[3] for event in tasks) - min(event[2] for event in tasks)
+    busy = sum(event[3] - event[2] for event in tasks)
+    path = criticalPath(_executed, _durations)
+    critical = sum(duration for node, duration in path)
+    ideal = max(critical, busy/jobs)
+    print("Build took %.1fs with %d job%s; ideal %.1fs (critical path %.1fs); cores idle %.0f%% of the time"
+          % (makespan, jobs, "" if jobs == 1 else "s", ideal, critical,
+             100*max(0.0, 1 - busy/(makespan*jobs)) if makespan else 0.0))
+    for node, duration in path:
+        if duration:
+            print("    %6.1fs %s" % (duration, node))
+
+
+def _install():
+    global _pool, records, _buildTaskExecute
+    env = state.env
+    records = TargetRecords(os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "targets.json"))
+
+    maxMemory = env.GetOption("maxBuildMemory")
+    if maxMemory is not None:
+        maxMemory = _parseMemory(maxMemory)
+        _pool = MemoryPool(maxMemory)
+        if not env.GetOption("no_progress"):
+            state.log.info("Limiting estimated build memory to %d MB" % maxMemory)
+    SCons.Script.SetOption("num_jobs", defaultJobs(maxMemory))  # -j on the command line wins
+
+    _buildTaskExecute = SCons.Script.Main.BuildTask.execute
+    SCons.Script.Main.BuildTask.execute = _execute
+    if records.has("duration"):
+        SCons.Taskmaster.Taskmaster = _Taskmaster
+    if hasattr(os, "wait4") and env["PLATFORM"] != "win32":
+        env["SPAWN"] = _spawn
+        for command in (["nice", "-n", "10"], ["ionice", "-c", "2", "-n", "7"]):
+            if find_executable(command[0]):
+                _backgroundPrefix.extend(command)
+    if not (env.GetOption("clean") or env.GetOption("no_exec") or env.GetOption("help")):
+        interactive.atBuildStart(_reset)
+        interactive.atBuildEnd(_saveRecords)
+        interactive.atBuildEnd(_report)
@@ -10,14 +10,104 @@ from stat import ST_MODE
 from SCons.Script import SConscript, File, Dir, Glob, BUILD_TARGETS
 from distutils.spawn import find_executable
 
+from . import abi
+from . import artifacts
+from . import benchmarks
 from . import dependencies
+from . import estimate
+from . import explain
+from . import fastload
+from . import hashcache
+from . import history
+from . import includes
+from . import interactive
+from . import ninja
+from . import pgo
+from . import profiling
+from . import reproducible
+from . import scheduling
+from . import signatures
 from . import state
 from . import tests
 from . import utils
+from . import variants
+from . import watch
 
 DEFAULT_TARGETS = ("lib", "python", "shebang", "tests", "examples", "doc")
 
 
+def _installedDirs(top="."):
+    """Return the subdirectories of a package that are installed by default.
+
+    Parameters
+    ----------
+    top : `str`, optional
+        Top directory of the package.
+
+    Returns
+    -------
+    subDirs : `list` of `str`
+        The non-hidden subdirectories, except the one the build type is
+        built in if ``buildType`` is given (its products are linked into
+        the usual places; see `lsst.sconsUtils.variants`) and the profile
+        directory if ``pgo`` is used (see `lsst.sconsUtils.pgo`).
+    """
+    uninstalled = set()
+    if variants.variantDir() is not None:
+        uninstalled.add("build")
+    if state.env["pgo"] != "off":
+        uninstalled.add(os.path.basename(pgo.directory()))
+    return [path for path in sorted(os.listdir(top)) if os.path.isdir(os.path.join(top, path)) and
+            not path.startswith(".") and path not in uninstalled]
+
+
+def _installHooks():
+    """Install the hooks with which sconsUtils modules change how SCons
+    runs, as the options and variables that enable them ask.
+
+    They are installed in this order; where several replace the same SCons
+    method, each calls the one installed before it.
+
+    #. `lsst.sconsUtils.watch` (``--watch``) runs the builds itself and
+       exits rather than returning.
+    #. `lsst.sconsUtils.interactive` (``--interactive``) makes the others'
+       hooks that run at exit run after each build instead.
+    #. `lsst.sconsUtils.ninja` (when Ninja regenerates ``build.ninja``)
+       stops if scons has since been run with other variables.
+    #. `lsst.sconsUtils.scheduling` (always) sets the number of jobs and
+       replaces ``BuildTask.execute``, to wait for memory and time tasks,
+       and the Taskmaster, to start the longest chains of work first.
+    #. `lsst.sconsUtils.history` (always, unless cleaning) records the
+       build when scons exits.
+    #. `lsst.sconsUtils.estimate` (``--estimate`` or ``--timeRemaining``)
+       replaces ``BuildTask.execute`` and derives from the Taskmaster
+       left by `lsst.sconsUtils.scheduling`.
+    #. `lsst.sconsUtils.profiling` (``profileCompile``,
+       ``compileTimeBudget`` or ``compileMemoryBudget``) wraps
+       ``BuildTask.execute``.
+    #. `lsst.sconsUtils.explain` (``--explainRebuilds``) wraps
+       ``BuildTask.make_ready``.
+    #. `lsst.sconsUtils.abi` (``abiDecider``) loads the signatures of the
+       libraries' interfaces.
+    #. `lsst.sconsUtils.hashcache` (``hashCache``) replaces
+       ``File.get_csig``.
+    #. `lsst.sconsUtils.signatures` (``sconsign``) chooses where the
+       signatures are kept.
+    #. `lsst.sconsUtils.artifacts` (``cacheDir``) sets the cache.
+    #. `lsst.sconsUtils.variants` (``buildType``) sets the directory the
+       package is built in.
+
+    The aliases of their reports and benchmarks (and those of
+    `lsst.sconsUtils.includes`, `lsst.sconsUtils.reproducible`,
+    `lsst.sconsUtils.fastload`, `lsst.sconsUtils.pgo` and
+    `lsst.sconsUtils.benchmarks`) are declared along the way.  Hooks
+    registered to run at exit run in the reverse order.
+    """
+    for module in (watch, interactive, ninja, scheduling, history, estimate, profiling, includes, explain,
+                   abi, hashcache, signatures, artifacts, reproducible, variants, fastload, pgo, benchmarks):
+        module._install()
+
+
 def _getFileBase(node):
     name, ext = os.path.splitext(os.path.basename(str(node)))
     return name
@@ -42,6 +132,7 @@ class BasicSConstruct:
     """
 
     _initializing = False
+    _installed = False
 
     def __new__(cls, packageName, versionString=None, eupsProduct=None, eupsProductPath=None, cleanExt=None,
                 defaultTargets=DEFAULT_TARGETS,
@@ -63,6 +154,9 @@ class BasicSConstruct:
 
         This function:
 
+        - Installs the hooks that the options ask for (see
+          ``_installHooks``); with ``--watch``, this rebuilds whenever files
+          change instead of returning (see `lsst.sconsUtils.watch`).
         - Calls all SConscript files found in subdirectories.
         - Configures dependencies.
         - Sets how the ``--clean`` option works.
@@ -110,16 +204,21 @@ class BasicSConstruct:
         env : `lsst.sconsUtils.env`
             A SCons Environment object.
         """
+        if not cls._installed:
+            cls._installed = True
+            _installHooks()
         if not disableCc:
             state._configureCommon()
             state._saveState()
+            history.mark("compiler")
         if cls._initializing:
             state.log.fail("Recursion detected; an SConscript file should not call BasicSConstruct.")
         cls._initializing = True
         dependencies.configure(packageName, versionString, eupsProduct, eupsProductPath, noCfgFile)
-        state.env.BuildETags()
+        history.mark("dependencies")
+        scheduling.lowPriority(state.env.BuildETags())
         if cleanExt is None:
-            cleanExt = r"*~ core core.[1-9]* *.so *.os *.o *.pyc *.pkgc"
+            cleanExt = r"*~ core core.[1-9]* *.so *.os *.o *.dwo *.dwp *.pyc *.pkgc"
         state.env.CleanTree(cleanExt, ".cache __pycache__ .pytest_cache")
         if versionModuleName is not None:
             try:
@@ -151,6 +250,7 @@ class BasicSConstruct:
         for script in scripts:
             state.log.info("Using SConscript at %s" % script)
             SConscript(script)
+        history.mark("sconscripts")
         cls._initializing = False
         return state.env
 
@@ -166,12 +266,22 @@ class BasicSConstruct:
         - Tells SCons to only do MD5 checks when timestamps have changed.
         - Sets the "include", "lib", "python", and "tests" targets as the
           defaults to be built when scons is run with no target arguments.
+        - Adds the "ninja" target, which writes a ``build.ninja`` for these
+          targets (see `lsst.sconsUtils.ninja`).
+        - Lets the libraries, Python modules and test results be shared
+          through ``cacheDir`` (see `lsst.sconsUtils.artifacts`).
+        - Makes the objects of the libraries and Python modules depend on
+          the profile they are built with if ``pgo=use`` (see
+          `lsst.sconsUtils.pgo`).
 
         Parameters
         ----------
         subDirList : `list`
             An explicit list of subdirectories that should be installed.
-            By default, all non-hidden subdirectories will be installed.
+            By default, all non-hidden subdirectories will be installed,
+            except ``build`` if ``buildType`` is given (see
+            `lsst.sconsUtils.variants`) and ``pgo`` if ``pgo`` is used (see
+            `lsst.sconsUtils.pgo`).
         defaultTargets : `list`
             A sequence of targets (see `lsst.sconsUtils.state.targets`)
             that should be built when scons is run with no arguments.
@@ -184,12 +294,9 @@ class BasicSConstruct:
             A SCons Environment.
         """
         if ignoreRegex is None:
-            ignoreRegex = r"(~$|\.pyc$|^\.svn$|\.o|\.os$)"
+            ignoreRegex = r"(~$|\.pyc$|^\.svn$|\.o|\.os$|\.dwo$)"
         if subDirList is None:
-            subDirList = []
-            for path in os.listdir("."):
-                if os.path.isdir(path) and not path.startswith("."):
-                    subDirList.append(path)
+            subDirList = _installedDirs()
         install = state.env.InstallLSST(state.env["prefix"],
                                         [subDir for subDir in subDirList],
                                         ignoreRegex=ignoreRegex)
@@ -202,12 +309,23 @@ class BasicSConstruct:
 
         # shebang should be in the list if bin.src exists but the location
         # matters so we can not append it afterwards.
-        state.env.Default([t for t in defaultTargets
-                           if os.path.exists(t) or (t == "shebang" and os.path.exists("bin.src"))])
+        defaultTargets = [t for t in defaultTargets
+                          if os.path.exists(t) or (t == "shebang" and os.path.exists("bin.src"))]
+        state.env.Default(defaultTargets)
         if "version" in state.targets:
             state.env.Default(state.targets["version"])
         state.env.Requires(state.targets["tests"], state.targets["version"])
-        state.env.Decider("MD5-timestamp")  # if timestamps haven't changed, don't do MD5 checks
+        ninja.declare(list(state.targets) + ["install"], defaultTargets)
+        artifacts.track([state.targets[name] for name in ("lib", "python", "tests")])
+        pgo.track([state.targets[name] for name in ("lib", "python")])
+        if state.env["abiDecider"]:
+            state.env.Decider(abi.decide)
+            state.env.Depends(state.targets["tests"], state.targets["lib"])
+        else:
+            # If timestamps haven't changed, don't do MD5 checks; but in
+            # interactive mode that misses dependencies rebuilt since the last
+            # build, as their recorded timestamps are those of the new files
+            state.env.Decider("MD5" if state.env.GetOption("interactive") else "MD5-timestamp")
         #
         # Check if any of the tests failed by looking for *.failed files.
         # Perform this test just before scons exits
@@ -215,7 +333,7 @@ class BasicSConstruct:
         # N.b. the test is written in sh not python as then we can use @ to
         # suppress output
         #
-        if "tests" in [str(t) for t in BUILD_TARGETS]:
+        if "tests" in [str(t) for t in BUILD_TARGETS] or state.env.GetOption("interactive"):
             testsDir = pipes.quote(os.path.join(os.getcwd(), "tests", ".tests"))
             checkTestStatus_command = state.env.Command('checkTestStatus', [], """
                 @ if [ -d {0} ]; then \
@@ -239,9 +357,14 @@ class BasicSConstruct:
                   fi; \
             """.format(testsDir))
 
-            state.env.Depends(checkTestStatus_command, BUILD_TARGETS)  # this is why the check runs last
-            BUILD_TARGETS.extend(checkTestStatus_command)
             state.env.AlwaysBuild(checkTestStatus_command)
+            if state.env.GetOption("interactive"):
+                # Built with each build of tests (see interactive._build)
+                state.env.Depends(checkTestStatus_command, state.env.Alias("tests"))
+            else:
+                # this is why the check runs last
+                state.env.Depends(checkTestStatus_command, BUILD_TARGETS)
+                BUILD_TARGETS.extend(checkTestStatus_command)
 
 
 class BasicSConscript:
@@ -261,7 +384,8 @@ class BasicSConscript:
         With no arguments, this will build a shared library with the same name
         as the package.  This uses
         `lsst.sconsUtils.env.SourcesForSharedLibrary` to support the
-        ``optFiles``/``noOptFiles`` command-line variables.
+        ``optFiles``/``noOptFiles`` command-line variables, and
+        `lsst.sconsUtils.env.PartialLinkObjects` if ``partialLink=True``.
 
         Parameters
         ----------
@@ -289,13 +413,19 @@ class BasicSConscript:
             src = Glob("#src/*.cc") + Glob("#src/*/*.cc") + Glob("#src/*/*/*.cc") + Glob("#src/*/*/*/*.cc")
         if noBuildList is not None:
             src = [node for node in src if os.path.basename(str(node)) not in noBuildList]
-        src = state.env.SourcesForSharedLibrary(src)
+        src = state.env.SourcesForSharedLibrary(variants.sources(src))
+        if state.env['partialLink']:
+            src = state.env.PartialLinkObjects(src, libName)
         if isinstance(libs, str):
             libs = state.env.getLibs(libs)
         elif libs is None:
             libs = []
-        result = state.env.SharedLibrary(libName, src, LIBS=libs)
-        state.targets["lib"].extend(result)
+        result = state.env.SharedLibrary(variants.target(libName), src, LIBS=libs)
+        packages = state.env.PackageSplitDwarf(result)
+        scheduling.track(src + result)
+        abi.track(result)
+        result = variants.link(result)
+        state.targets["lib"].extend(result + packages)
         return result
 
     @staticmethod
@@ -402,8 +532,11 @@ class BasicSConscript:
             libs = state.env.getLibs(libs)
         elif libs is None:
             libs = []
-        result = state.env.Pybind11LoadableModule(module, src, LIBS=libs)
-        state.targets["python"].append(result)
+        result = state.env.Pybind11LoadableModule(variants.target(module), variants.sources(src), LIBS=libs)
+        packages = state.env.PackageSplitDwarf(result)
+        scheduling.track(result)
+        result = variants.link(result)
+        state.targets["python"].extend([result] + packages)
         return result
 
     @staticmethod
@@ -510,6 +643,7 @@ class BasicSConscript:
             makeTag=(state.env["packageName"] + ".tag"),
             **kwargs
         )
+        scheduling.lowPriority(result)
         state.targets["doc"].extend(result)
         return result
 
@@ -611,7 +745,9 @@ class BasicSConscript:
         state.log.info("Ignored tests: %s" % ignoreList)
         control = tests.Control(state.env, ignoreList=ignoreList, args=args, verbose=True)
         for ccTest in ccList:
-            state.env.Program(ccTest, LIBS=state.env.getLibs("main test"))
+            program = state.env.Program(variants.sources([ccTest]), LIBS=state.env.getLibs("main test"))
+            scheduling.track(program)
+            variants.link(program)
         swigMods = []
         for name, src in swigSrc.items():
             swigMods.extend(
@@ -647,6 +783,7 @@ class BasicSConscript:
             state.env.Depends(pyTest, state.targets["python"])
             state.env.Depends(pyTest, state.targets["shebang"])
         result = ccList + pyList
+        scheduling.track(result)
         state.targets["tests"].extend(result)
         return result
 
@@ -0,0 +1,210 @@
+"""Where SCons keeps its signatures.
+
+By default SCons keeps the signatures of every file in a single
+``.sconsign.dblite``, which is read completely at startup and written
+completely at the end of every run.  The ``sconsign`` variable selects
+another store:
+
+``dblite``
+    The SCons default.
+``directory``
+    A ``.sconsign`` file in each directory, read when a file in it is
+    first needed and rewritten only if something in it changed.
+``sqlite``
+    ``.sconsign.sqlite``, an SQLite database with a row per directory,
+    read as ``directory`` is and updated in a single transaction.
+
+``scons sconsignbench`` measures the time each takes to save and load
+synthetic signatures for increasing numbers of files, and to update one
+directory.
+"""
+
+__all__ = ("SqliteDbm", "open")
+
+import collections.abc
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import SCons.Node.FS
+import SCons.SConsign
+import SCons.dblite
+
+from . import state
+
+# Number of files in each synthetic directory of the benchmark
+_FILES_PER_DIR = 50
+
+# Numbers of files the benchmark is run for
+_BENCHMARK_FILES = (1000, 10000, 100000)
+
+_builtinOpen = open
+
+
+class SqliteDbm(collections.abc.MutableMapping):
+    """A `dbm`-like mapping of `str` to `bytes` kept in SQLite.
+
+    Parameters
+    ----------
+    filename : `str`
+        The database.
+    flag : `str`, optional
+        ``"r"`` to open it read-only, else it is created if necessary.
+
+    Notes
+    -----
+    Values are read from the database when they are asked for, and
+    changes are written in one transaction by `sync`.
+    """
+
+    def __init__(self, filename, flag="c"):
+        self.filename = filename
+        readOnly = flag == "r"
+        if readOnly:
+            self._db = sqlite3.connect("file:%s?mode=ro" % filename, uri=True, check_same_thread=False)
+        else:
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sconsign (key TEXT PRIMARY KEY, value BLOB)")
+            if flag == "n":
+                self._db.execute("DELETE FROM sconsign")
+        self._readOnly = readOnly
+
+    def __getitem__(self, key):
+        row = self._db.execute("SELECT value FROM sconsign WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def __setitem__(self, key, value):
+        if self._readOnly:
+            raise OSError("%s is open read-only" % self.filename)
+        self._db.execute("INSERT OR REPLACE INTO sconsign VALUES (?, ?)", (key, value))
+
+    def __delitem__(self, key):
+        if self._db.execute("DELETE FROM sconsign WHERE key = ?", (key,)).rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter([row[0] for row in self._db.execute("SELECT key FROM sconsign")])
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM sconsign").fetchone()[0]
+
+    def sync(self):
+        """Commit the changes."""
+        self._db.commit()
+
+    def close(self):
+        """Commit the changes and close the database."""
+        self._db.commit()
+        self._db.close()
+
+
+def open(file, flag="r", mode=0o666):
+    """Open a `SqliteDbm`, adding ``.sqlite`` to the name.
+
+    This makes the module usable as the ``dbm_module`` argument of
+    ``SConsignFile``.
+    """
+    return SqliteDbm(file + ".sqlite", flag)
+
+
+def _entries(directory, nFiles):
+    """Make the signatures of a synthetic directory."""
+    entries = {}
+    for i in range(nFiles):
+        entry = SCons.SConsign.SConsignEntry()
+        entry.ninfo = SCons.Node.FS.FileNodeInfo()
+        entry.ninfo.csig = "%032x" % hash((directory, i))
+        entry.ninfo.timestamp = time.time()
+        entry.ninfo.size = 1000 + i
+        entry.binfo = SCons.Node.FS.FileBuildInfo()
+        entry.binfo.bsources = ["src/%s/file%d.cc" % (directory, i)]
+        entry.binfo.bsourcesigs = [entry.ninfo]
+        entry.binfo.bdepends, entry.binfo.bdependsigs = [], []
+        entry.binfo.bimplicit = ["include/header%d.h" % j for j in range(20)]
+        entry.binfo.bimplicitsigs = [entry.ninfo]*20
+        entry.binfo.bactsig = entry.ninfo.csig
+        entries["file%d.os" % i] = entry
+    return entries
+
+
+def _benchmarkDbm(module, base, directories):
+    """Time saving, loading and updating with a dbm module."""
+    start = time.time()
+    db = module.open(base, "n")
+    for name, entries in directories.items():
+        db[name] = pickle.dumps(entries, SCons.SConsign.PICKLE_PROTOCOL)
+    db.sync()
+    db.close()
+    save = time.time() - start
+
+    start = time.time()
+    db = module.open(base, "r")
+    for name in directories:
+        pickle.loads(db[name])
+    db.close()
+    load = time.time() - start
+
+    start = time.time()
+    db = module.open(base, "c")
+    name = next(iter(directories))
+    db[name] = pickle.dumps(pickle.loads(db[name]), SCons.SConsign.PICKLE_PROTOCOL)
+    db.sync()
+    db.close()
+    return save, load, time.time() - start
+
+
+def _benchmarkDirectory(top, directories):
+    """Time saving, loading and updating per-directory files."""
+    start = time.time()
+    for name, entries in directories.items():
+        os.makedirs(os.path.join(top, name), exist_ok=True)
+        with _builtinOpen(os.path.join(top, name, ".sconsign"), "wb") as fd:
+            pickle.dump(entries, fd, SCons.SConsign.PICKLE_PROTOCOL)
+    save = time.time() - start
+
+    start = time.time()
+    for name in directories:
+        with _builtinOpen(os.path.join(top, name, ".sconsign"), "rb") as fd:
+            pickle.load(fd)
+    load = time.time() - start
+
+    start = time.time()
+    filename = os.path.join(top, next(iter(directories)), ".sconsign")
+    with _builtinOpen(filename, "rb") as fd:
+        entries = pickle.load(fd)
+    with _builtinOpen(filename, "wb") as fd:
+        pickle.dump(entries, fd, SCons.SConsign.PICKLE_PROTOCOL)
+    return save, load, time.time() - start
+
+
+def _benchmark(target, source, env):
+    """Time each signature store against the number of files."""
+    print("%8s %-10s %8s %8s %8s" % ("files", "sconsign", "save", "load", "update"))
+    for nFiles in _BENCHMARK_FILES:
+        directories = {"dir%d" % i: _entries("dir%d" % i, _FILES_PER_DIR)
+                       for i in range(nFiles//_FILES_PER_DIR)}
+        top = tempfile.mkdtemp()
+        try:
+            for name, times in (
+                    ("dblite", _benchmarkDbm(SCons.dblite, os.path.join(top, "sconsign"), directories)),
+                    ("directory", _benchmarkDirectory(top, directories)),
+                    ("sqlite", _benchmarkDbm(sys.modules[__name__], os.path.join(top, "sconsign"),
+                                             directories))):
+                print("%8d %-10s %7.2fs %7.2fs %7.2fs" % ((nFiles, name) + times))
+        finally:
+            shutil.rmtree(top)
+
+
+def _install():
+    env = state.env
+    env.AlwaysBuild(env.Alias("sconsignbench", [], env.Action(_benchmark, None)))
+    if env["sconsign"] == "directory":
+        env.SConsignFile(None)
+    elif env["sconsign"] == "sqlite":
+        env.SConsignFile(".sconsign", sys.modules[__name__])
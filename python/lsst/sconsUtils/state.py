@@ -13,9 +13,11 @@ These are all initialized when the module is imported, but may be modified
 by other code (particularly `lsst.sconsUtils.dependencies.configure`).
 """
 
+import io
 import os
 import re
 import shlex
+import subprocess
 
 import SCons.Script
 import SCons.Conftest
@@ -46,14 +48,35 @@ log = None
 opts = None
 
 
+# Settings of each buildType; see lsst.sconsUtils.variants
+_buildTypes = {
+    "release": dict(opt="3", debug=False, profile="0", archflags=""),
+    "debug": dict(opt="0", debug=True, profile="0", archflags=""),
+    "relwithdebinfo": dict(opt="2", debug=True, profile="0", archflags=""),
+    "profile": dict(opt="3", debug=True, profile="1", archflags=""),
+}
+
+
 def _initOptions():
     SCons.Script.AddOption('--checkDependencies', dest='checkDependencies',
                            action='store_true', default=False,
                            help="Verify dependencies with autoconf-style tests.")
     SCons.Script.AddOption('--filterWarn', dest='filterWarn', action='store_true', default=False,
                            help="Filter out a class of warnings deemed irrelevant"),
+    SCons.Script.AddOption('--estimate', dest='estimate', action='store_true', default=False,
+                           help="Estimate how long building the targets would take, without building them")
+    SCons.Script.AddOption('--timeRemaining', dest='timeRemaining', action='store_true', default=False,
+                           help="Print an estimate of the time remaining every so often during the build")
+    SCons.Script.AddOption('--explainRebuilds', dest='explainRebuilds', action='store', default=None,
+                           help="Write why each target was rebuilt to this file (JSON)")
     SCons.Script.AddOption('--force', dest='force', action='store_true', default=False,
                            help="Set to force possibly dangerous behaviours")
+    SCons.Script.AddOption('--maxBuildMemory', dest='maxBuildMemory', action='store', default=None,
+                           help="Keep the estimated memory of concurrently running commands below this "
+                           "(e.g. 16G); also limits the default number of jobs")
+    SCons.Script.AddOption('--buildTrace', dest='buildTrace', action='store', default=None,
+                           help="Write a timeline of the build in trace-event format to this file, "
+                           "and summarize its critical path")
     SCons.Script.AddOption('--linkFarmDir', dest='linkFarmDir', action='store', default=None,
                            help="The directory of symbolic links needed to build and use the package")
     SCons.Script.AddOption('--prefix', dest='prefix', action='store', default=False,
@@ -66,6 +89,8 @@ def _initOptions():
                            help="Print additional messages for debugging.")
     SCons.Script.AddOption('--traceback', dest='traceback', action='store_true', default=False,
                            help="Print full exception tracebacks when errors occur.")
+    SCons.Script.AddOption('--watch', dest='watch', action='store_true', default=False,
+                           help="Rebuild the targets whenever source files change, until interrupted")
     SCons.Script.AddOption('--no-eups', dest='no_eups', action='store_true', default=False,
                            help="Do not use EUPS for configuration")
 
@@ -90,18 +115,55 @@ def _initVariables():
     global opts
     opts = SCons.Script.Variables(files)
     opts.AddVariables(
+        SCons.Script.BoolVariable('abiDecider', 'Only relink when the interface of a shared library changes',
+                                  False),
         ('archflags', 'Extra architecture specification to add to CC/LINK flags (e.g. -m32)', ''),
+        SCons.Script.EnumVariable('buildType', 'Set opt, debug, profile and archflags together, and build in '
+                                  'build/<buildType>', '', allowed_values=('',) + tuple(_buildTypes)),
+        ('cacheDir', 'Share built libraries, modules and test results through this directory or http URL',
+         None),
         ('cc', 'Choose the compiler to use', ''),
+        ('compileMemoryBudget', 'Warn when compiling a source needs more memory than this (e.g. 2G)', None),
+        ('compileTimeBudget', 'Warn when compiling a source takes longer than this many seconds', None),
         SCons.Script.BoolVariable('debug', 'Set to enable debugging flags (use --debug)', True),
+        SCons.Script.EnumVariable('debuginfo', 'Form of the debugging information generated if debug=True',
+                                  'full', allowed_values=('full', 'split', 'compressed', 'none')),
         ('eupsdb', 'Specify which element of EUPS_PATH should be used', None),
+        SCons.Script.BoolVariable('fastload', 'Build the libraries and Python modules to load quickly',
+                                  False),
         ('flavor', 'Set the build flavor', None),
         SCons.Script.BoolVariable('force', 'Set to force possibly dangerous behaviours', False),
+        SCons.Script.BoolVariable('hashCache', 'Remember the signatures of large files between builds',
+                                  False),
+        ('hashCacheFile', 'Database for hashCache (default: sconsUtils/hashes.sqlite in $XDG_CACHE_HOME)',
+         None),
+        SCons.Script.EnumVariable('isa', 'Choose the x86-64 instruction set to build for', 'generic',
+                                  allowed_values=('generic', 'x86-64-v2', 'x86-64-v3', 'x86-64-v4',
+                                                  'native')),
+        SCons.Script.EnumVariable('lto', 'Link-time optimization of the libraries and Python modules',
+                                  'off', allowed_values=('off', 'thin', 'full')),
+        SCons.Script.EnumVariable('linker', 'Choose the linker to use ("default" is the compiler\'s own, '
+                                  '"auto" picks the fastest available)',
+                                  'default',
+                                  allowed_values=('default', 'auto', 'bfd', 'gold', 'lld', 'mold')),
         ('optfile', 'Specify a file to read default options from', None),
+        SCons.Script.BoolVariable('partialLink', 'Partially link library objects per source directory '
+                                  '(does nothing if they are all in one directory, or with lto)',
+                                  False),
+        SCons.Script.EnumVariable('pgo', 'Profile-guided optimization of the libraries and Python modules '
+                                  '(or use "scons pgo")', 'off', allowed_values=('off', 'generate', 'use')),
+        ('pgoTrain', 'Command to train profile-guided optimization with (default: benchmarks or tests)',
+         None),
         ('prefix', 'Specify the install destination', None),
         SCons.Script.EnumVariable('opt', 'Set the optimisation level', 3,
                                   allowed_values=('g', '0', '1', '2', '3')),
         SCons.Script.EnumVariable('profile', 'Compile/link for profiler', 0,
                                   allowed_values=('0', '1', 'pg', 'gcov')),
+        SCons.Script.BoolVariable('profileCompile', 'Report where compile time and memory go', False),
+        SCons.Script.BoolVariable('reproducible', 'Make the built files independent of where and when they '
+                                  'are built', False),
+        SCons.Script.EnumVariable('sconsign', 'Where to keep the signatures of built files', 'dblite',
+                                  allowed_values=('dblite', 'directory', 'sqlite')),
         ('version', 'Specify the version to declare', None),
         ('baseversion', 'Specify the current base version', None),
         ('optFiles', "Specify a list of files that SHOULD be optimized", None),
@@ -124,6 +186,7 @@ def _initEnvironment():
       LD_LIBRARY_PATH
       PATH
       SHELL
+      SOURCE_DATE_EPOCH
       TEMP
       TERM
       TMP
@@ -180,6 +243,12 @@ def _initEnvironment():
     # we'll import them under their given names.
     #
     env['LDMODULEPREFIX'] = ""
+    #
+    # Relocatable link used to combine groups of objects (partialLink=True),
+    # with the flags of the shared link (linker, LTO) that make sense for one
+    #
+    env['_partialLinkFlags'] = _partialLinkFlags
+    env['PARTIALLINKCOM'] = "$SHCXX -r -nostdlib ${_partialLinkFlags(SHLINKFLAGS)} -o $TARGET $SOURCES"
     if env['PLATFORM'] == 'darwin':
         env['LDMODULESUFFIX'] = ".so"
         if not re.search(r"-install_name", str(env['SHLINKFLAGS'])):
@@ -233,7 +302,15 @@ def _initEnvironment():
         if SCons.Script.GetOption(k):
             env[k] = SCons.Script.GetOption(k)
 
-    if env['debug']:
+    if env['buildType']:
+        settings = _buildTypes[env['buildType']]
+        given = sorted(set(key for key, value in SCons.Script.ARGLIST if key in settings))
+        if given:
+            log.fail("%s can't be given with buildType=%s, which sets them" %
+                     (", ".join(given), env['buildType']))
+        env.Replace(**settings)
+
+    if env['debug'] and env['debuginfo'] != 'none':
         env.Append(CCFLAGS=['-g'])
 
     #
@@ -301,6 +378,104 @@ def _initEnvironment():
 
 _configured = False
 
+# Linkers to try, fastest first, when linker=auto
+_fastLinkers = ("mold", "lld", "gold")
+
+
+def _appendLinkFlags(flags):
+    """Append flags to every link command line.
+
+    Parameters
+    ----------
+    flags : `list` of `str`
+        Flags to be added to ``LINKFLAGS``, ``SHLINKFLAGS`` and
+        ``LDMODULEFLAGS``.
+
+    Notes
+    -----
+    By default ``SHLINKFLAGS`` expands ``$LINKFLAGS`` and ``LDMODULEFLAGS``
+    expands ``$SHLINKFLAGS``; the flags are only added to the variables that
+    don't already inherit them, so they appear once per command line.
+    """
+    env.Append(LINKFLAGS=flags)
+    for var, parent in (("SHLINKFLAGS", "$LINKFLAGS"), ("LDMODULEFLAGS", "$SHLINKFLAGS")):
+        if parent not in str(env[var]):
+            env.Append(**{var: flags})
+
+
+def _partialLinkFlags(flags):
+    """Return the flags of a shared link that a relocatable (``-r``) link
+    can take too.
+
+    Parameters
+    ----------
+    flags : `list` of `str`
+        The value of ``SHLINKFLAGS``.
+
+    Returns
+    -------
+    flags : `list` of `str`
+        ``flags`` without those that make a shared library.
+    """
+    result, skip = [], False
+    for flag in flags:
+        if not skip and flag not in ("-shared", "-dynamiclib", "-install_name"):
+            result.append(flag)
+        skip = flag == "-install_name"
+    return result
+
+
+def _toolFor(tool, cc, name):
+    """Return the tool that goes with a compiler (e.g. ``gcc-ar-12`` for
+    ``/usr/bin/gcc-12``), or `None` if there isn't one.
+
+    Parameters
+    ----------
+    tool : `str`
+        Name of the tool for the compiler with the unadorned name.
+    cc : `str`
+        The compiler.
+    name : `str`
+        The unadorned name of the compiler (e.g. ``gcc``).
+    """
+    directory, base = os.path.split(cc.split()[0]) if cc else ("", "")
+    if name not in base:
+        return env.WhereIs(tool)
+    return env.WhereIs(os.path.join(directory, tool.join(base.rsplit(name, 1))))
+
+
+def _lastCommitTime(directory):
+    """Return the time of the last git commit in a directory (seconds
+    since 1970, as a `str`), or `None` if it isn't in a git repository."""
+    try:
+        return subprocess.run(["git", "log", "-1", "--format=%ct"], cwd=directory, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _appendPrefixMap(path, replacement):
+    """Have the compiler write a directory as something else in the files
+    it writes, if ``reproducible`` is set and the compiler can.
+
+    Parameters
+    ----------
+    path : `str`
+        The directory.
+    replacement : `str`
+        What to write instead.
+
+    Notes
+    -----
+    The compiler tries the most recently added mapping first, so mappings
+    of subdirectories should be added after those of their parents.  The
+    directories aren't part of the build signature, but the flags are, so
+    that setting ``reproducible`` rebuilds everything, and objects built
+    with and without it have different signatures in ``cacheDir``.
+    """
+    if getattr(env, "prefixMapFlags", None):
+        env.Append(CCFLAGS=[flag % ("$(%s$)" % path, replacement) for flag in env.prefixMapFlags])
+
 
 def _configureCommon():
     """Configuration checks for the compiler, platform, and standard
@@ -348,8 +523,133 @@ def _configureCommon():
         context.Result("unknown")
         return ("unknown", "unknown")
 
+    def CheckLinker(context, linker):
+        """Check whether the compiler can link using the given linker.
+
+        Parameters
+        ----------
+        context : context
+            Context.
+        linker : `str`
+            Name of the linker, as passed to ``-fuse-ld=``.
+
+        Returns
+        -------
+        result : `bool`
+            Did the test program link?
+        """
+        context.Message("Checking whether %s can link with -fuse-ld=%s... " % (env.whichCc, linker))
+        linkflags = context.env["LINKFLAGS"]
+        context.env.Append(LINKFLAGS=["-fuse-ld=%s" % linker])
+        result = context.TryLink("int main(int argc, char **argv) { return 0; }\n", ".cc")
+        context.env.Replace(LINKFLAGS=linkflags)
+        context.Result(result)
+        return result
+
+    def CheckFlags(context, ccflags, linkflags):
+        """Check whether the compiler and linker accept the given flags.
+
+        Parameters
+        ----------
+        context : context
+            Context.
+        ccflags : `list` of `str`
+            Flags to compile with.
+        linkflags : `list` of `str`
+            Flags to link with.
+
+        Returns
+        -------
+        result : `bool`
+            Did the test program compile and link?
+        """
+        context.Message("Checking whether %s supports %s... " % (env.whichCc, " ".join(ccflags + linkflags)))
+        oldFlags = context.env["CCFLAGS"], context.env["LINKFLAGS"]
+        context.env.Append(CCFLAGS=ccflags, LINKFLAGS=linkflags)
+        result = context.TryLink("int main(int argc, char **argv) { return 0; }\n", ".cc")
+        context.env.Replace(CCFLAGS=oldFlags[0], LINKFLAGS=oldFlags[1])
+        context.Result(result)
+        return result
+
+    def CheckIsa(context, level):
+        """Check whether the compiler can build for, and this machine run,
+        an instruction set.
+
+        Parameters
+        ----------
+        context : context
+            Context.
+        level : `str`
+            The ``isa`` variable.
+
+        Returns
+        -------
+        march : `str`
+            The argument to pass to ``-march=`` (``native`` resolved to a
+            processor if the compiler says which), or `None` if the compiler
+            can't build for ``level``.
+        runs : `bool`
+            Did a program built for ``level`` find the features it needs?
+        """
+        from . import isa
+        context.Message("Checking whether %s can build for, and this machine run, isa=%s... " %
+                        (env.whichCc, level))
+        march = level
+        if level == "native":
+            if env.whichCc == "clang":
+                ok, output = context.TryAction(SCons.Script.Action(
+                    "$CC -march=native -### -x c -c %s > $TARGET 2>&1" % os.devnull))[0:2]
+                match = re.search(r'"-target-cpu" "([^"]+)"', output) if ok else None
+            else:
+                ok, output = context.TryAction(SCons.Script.Action(
+                    "$CC -march=native -Q --help=target > $TARGET 2>&1"))[0:2]
+                match = re.search(r"^\s*-march=\s+(\S+)", output, re.MULTILINE) if ok else None
+            if match:
+                march = match.group(1)
+        ccflags = context.env["CCFLAGS"]
+        context.env.Append(CCFLAGS=["-march=%s" % march])
+        features = isa.FEATURES.get(level, ())
+        program = "int main(void) {\n    __builtin_cpu_init();\n    return %s ? 0 : 1;\n}\n" % \
+            " && ".join(['__builtin_cpu_supports("%s")' % f for f in features] or ["1"])
+        if not context.TryCompile(program, ".c"):
+            march, runs = None, False
+        else:
+            runs = context.TryRun(program, ".c")[0]
+        context.env.Replace(CCFLAGS=ccflags)
+        context.Result("-march=%s" % march if runs else
+                       "no" if march is None else "built, but the program failed")
+        return march, runs
+
+    def CheckLtoArchiver(context, ccflags):
+        """Check whether the archiver can index objects compiled for
+        link-time optimization.
+
+        Parameters
+        ----------
+        context : context
+            Context.
+        ccflags : `list` of `str`
+            Flags to compile with.
+
+        Returns
+        -------
+        result : `bool`
+            Did the archiver and ranlib succeed without complaining that they
+            need a plugin?
+        """
+        context.Message("Checking whether %s can index LTO objects... " % context.env.subst("$AR"))
+        action = "$CC %s -c -o ${TARGET}.o $SOURCE && $AR $ARFLAGS ${TARGET}.a ${TARGET}.o > $TARGET 2>&1 " \
+            "&& $RANLIB ${TARGET}.a >> $TARGET 2>&1" % " ".join(ccflags)
+        ok, output = context.TryAction(SCons.Script.Action(action), "int f(void) { return 0; }\n", ".c")[0:2]
+        result = bool(ok) and "plugin" not in output
+        context.Result(result)
+        return result
+
+    env.whichLinker = "default"
+    env.whichDebugInfo = env['debuginfo'] if env['debug'] else "none"
     if env.GetOption("clean") or env.GetOption("no_exec") or env.GetOption("help"):
         env.whichCc = "unknown"         # who cares? We're cleaning/not execing, not building
+        env.whichLinker = "unknown"
     else:
         if 'SCONSUTILS_USE_CONDA_COMPILERS' in os.environ:
             # conda-build expects you to use the compilers as-is
@@ -404,6 +704,28 @@ def _configureCommon():
     if ARCHFLAGS:
         env.Append(CCFLAGS=ARCHFLAGS.split())
         env.Append(LINKFLAGS=ARCHFLAGS.split())
+    #
+    # Build for an instruction set; see lsst.sconsUtils.isa
+    #
+    env.whichIsa = env['isa']
+    if env['isa'] != "generic" and \
+            not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        conf = env.Configure(custom_tests={'CheckIsa': CheckIsa})
+        march, runs = conf.CheckIsa(env['isa'])
+        conf.Finish()
+        if march is None:
+            log.fail("%s can't build for isa=%s" % (env.whichCc, env['isa']))
+        if not runs:
+            message = "This machine can't run code built for isa=%s" % env['isa']
+            if env['force']:
+                log.warn(message)
+            else:
+                log.fail(message + " (use --force to build for another machine)")
+        env.whichIsa = march
+        env.Append(CCFLAGS=["-march=%s" % march])
+        env.Append(LINKFLAGS=["-march=%s" % march])
+        if not env.GetOption("no_progress"):
+            log.info("Building for -march=%s" % march)
     # We'll add warning and optimisation options last
     if env['profile'] == '1' or env['profile'] == "pg":
         env.Append(CCFLAGS=['-pg'])
@@ -420,17 +742,100 @@ def _configureCommon():
             log.info("Checking for C++14 support")
         conf = env.Configure()
         for cpp14Arg in ("-std=%s" % (val,) for val in ("c++14",)):
-            conf.env = env.Clone()
-            conf.env.Append(CXXFLAGS=cpp14Arg)
+            cxxflags = env["CXXFLAGS"]
+            env.Append(CXXFLAGS=cpp14Arg)
             if conf.CheckCXX():
-                env.Append(CXXFLAGS=cpp14Arg)
                 if not env.GetOption("no_progress"):
                     log.info("C++14 supported with %r" % (cpp14Arg,))
                 break
+            env.Replace(CXXFLAGS=cxxflags)
         else:
             log.fail("C++14 extensions could not be enabled for compiler %r" % env.whichCc)
         conf.Finish()
 
+    #
+    # Select the linker.  By default the compiler chooses; GNU ld is slow on
+    # large libraries, so with linker=auto we use the fastest one the
+    # compiler can drive, falling back to the compiler's.
+    #
+    if env['linker'] != "default" and \
+            not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        if env['linker'] == "auto":
+            candidates = _fastLinkers if env['PLATFORM'] != 'darwin' else ()
+        else:
+            candidates = (env['linker'],)
+        conf = env.Configure(custom_tests={'CheckLinker': CheckLinker})
+        for linker in candidates:
+            if conf.CheckLinker(linker):
+                env.whichLinker = linker
+                break
+        else:
+            if env['linker'] != "auto":
+                log.fail("Linker %r cannot be used with compiler %r" % (env['linker'], env.whichCc))
+        conf.Finish()
+        if env.whichLinker != "default":
+            _appendLinkFlags(["-fuse-ld=%s" % env.whichLinker])
+        if not env.GetOption("no_progress"):
+            log.info("Linker is %s" % env.whichLinker)
+
+    #
+    # Reduce the size of the debugging information carried through links
+    # and installs: either leave it in .dwo files next to the objects
+    # (packaged into a .dwp per library, see BasicSConscript.lib) or
+    # compress it.
+    #
+    if env.whichDebugInfo in ("split", "compressed") and \
+            not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        conf = env.Configure(custom_tests={'CheckFlags': CheckFlags})
+        if env.whichDebugInfo == "split":
+            debugFlags = ["-gsplit-dwarf"]
+            if not conf.CheckFlags(debugFlags, []):
+                debugFlags = None
+            elif conf.CheckFlags(debugFlags, ["-Wl,--gdb-index"]):
+                _appendLinkFlags(["-Wl,--gdb-index"])
+        else:
+            debugFlags = ["-gz"]
+            if conf.CheckFlags(debugFlags, debugFlags):
+                _appendLinkFlags(debugFlags)
+            else:
+                debugFlags = None
+        conf.Finish()
+        if debugFlags:
+            env.Append(CCFLAGS=debugFlags)
+        else:
+            log.warn("debuginfo=%s is not supported by %s; using full debugging information" %
+                     (env.whichDebugInfo, env.whichCc))
+            env.whichDebugInfo = "full"
+
+    #
+    # Keep the build directory and time out of the files built; see
+    # lsst.sconsUtils.reproducible.  The directories of upstream products
+    # are mapped by dependencies.configure
+    #
+    env.prefixMapFlags = []
+    if env['reproducible'] and \
+            not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        conf = env.Configure(custom_tests={'CheckFlags': CheckFlags})
+        for flags in (["-ffile-prefix-map=%s=%s"], ["-fdebug-prefix-map=%s=%s", "-fmacro-prefix-map=%s=%s"],
+                      ["-fdebug-prefix-map=%s=%s"]):
+            if conf.CheckFlags([flag % ("/nonexistent", ".") for flag in flags], []):
+                env.prefixMapFlags = flags
+                break
+        else:
+            log.warn("%s can't rewrite source paths, so objects will contain the build directory" %
+                     env.whichCc)
+        conf.Finish()
+        _appendPrefixMap(SCons.Script.Dir("#").abspath, ".")
+        if env['PLATFORM'] != 'darwin' and list(env['ARFLAGS']) == ['rc']:
+            env['ARFLAGS'] = ['rcD']
+        if "SOURCE_DATE_EPOCH" not in env['ENV']:
+            epoch = _lastCommitTime(SCons.Script.Dir("#").abspath)
+            if epoch is not None:
+                env['ENV']['SOURCE_DATE_EPOCH'] = epoch
+            else:
+                log.warn("Not in a git repository and SOURCE_DATE_EPOCH isn't set; "
+                         "__DATE__ and __TIME__ will be the time of the build")
+
     #
     # Byte order
     #
@@ -442,8 +847,10 @@ def _configureCommon():
     # shareable libraries we need to do something special.
     #
     if (re.search(r"^(Linux|Linux64)$", env["eupsFlavor"]) and "LD_LIBRARY_PATH" in os.environ):
-        env.Append(LINKFLAGS=["-Wl,-rpath-link"])
-        env.Append(LINKFLAGS=["-Wl,%s" % os.environ["LD_LIBRARY_PATH"]])
+        rpathLink = ["-Wl,-rpath-link", "-Wl,%s" % os.environ["LD_LIBRARY_PATH"]]
+        if env['reproducible']:
+            rpathLink = ["$("] + rpathLink + ["$)"]  # not part of the signature
+        env.Append(LINKFLAGS=rpathLink)
     #
     # Set the optimization level.
     #
@@ -508,12 +915,131 @@ def _configureCommon():
         # Workaround intel bug; cf. RHL's intel bug report 580167
         env.Append(LINKFLAGS=["-Wl,-no_compact_unwind", "-wd,11015"])
     #
+    # Have the compiler report where its time goes; see
+    # lsst.sconsUtils.profiling
+    #
+    if env['profileCompile']:
+        if env.whichCc == "clang":
+            env.Append(CCFLAGS=['-ftime-trace'])
+        elif env.whichCc == "gcc":
+            env.Append(CCFLAGS=['-ftime-report'])
+        else:
+            log.warn("profileCompile is not supported by %s; only times and memory will be reported"
+                     % env.whichCc)
+    #
     # Disable link-time-optimization on GCC, for compatibility with conda
-    # binaries
+    # binaries, except for the package's own libraries and Python modules
+    # if asked to; see lsst.sconsUtils.lto.  Any -fno-lto on a link command
+    # line stops gcc from using the linker plugin at all
     #
     if env.whichCc == "gcc":
         env.Append(CCFLAGS=['-fno-lto'])
-        env.Append(LINKFLAGS=['-fno-lto'])
+        if env['lto'] == "off":
+            env.Append(LINKFLAGS=['-fno-lto'])
+    env.whichLto = "off"
+    if env['lto'] != "off" and env['partialLink']:
+        # A relocatable link only carries the LTO objects through to the
+        # final link, which then optimizes (and so redoes) everything
+        log.warn("Ignoring partialLink=True, which gains nothing with lto=%s" % env['lto'])
+        env['partialLink'] = False
+    if env['lto'] != "off" and \
+            not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        # The number of jobs is left out of the signatures, so changing -j
+        # doesn't relink everything
+        jobs = SCons.Script.GetOption("num_jobs")
+        if env.whichCc == "gcc":
+            ccflags = ["-flto"]
+            linkflags = ccflags + (["-flto-partition=one"] if env['lto'] == "full" else [])
+            jobFlags = ["-flto=%d" % jobs]
+            archiver = ("gcc-ar", "gcc-ranlib", "gcc")
+        elif env.whichCc == "clang":
+            ccflags = ["-flto=%s" % env['lto']]
+            linkflags = list(ccflags)
+            if env['lto'] == "full":
+                jobFlags = []
+            elif env.whichLinker in ("lld", "mold"):
+                jobFlags = ["-Wl,--thinlto-jobs=%d" % jobs]
+            else:
+                jobFlags = ["-Wl,-plugin-opt,jobs=%d" % jobs]
+            archiver = ("llvm-ar", "llvm-ranlib", "clang")
+        else:
+            log.fail("lto=%s is not supported by %s" % (env['lto'], env.whichCc))
+        conf = env.Configure(custom_tests={'CheckFlags': CheckFlags,
+                                           'CheckLtoArchiver': CheckLtoArchiver})
+        if not conf.CheckFlags(ccflags, linkflags + jobFlags):
+            log.fail("%s can't compile and link with lto=%s (%s)" %
+                     (env.whichCc, env['lto'], " ".join(linkflags + jobFlags)))
+        ar, ranlib = [_toolFor(tool, env.subst("$CC"), archiver[2]) for tool in archiver[:2]]
+        if ar and ranlib:
+            env.Replace(AR=ar, RANLIB=ranlib)
+        if not conf.CheckLtoArchiver(ccflags):
+            log.warn("%s can't index LTO objects, so static libraries built with lto=%s may not link" %
+                     (env.subst("$AR"), env['lto']))
+        conf.Finish()
+        env.Append(SHCCFLAGS=ccflags)
+        env.Append(SHLINKFLAGS=linkflags + (["$("] + jobFlags + ["$)"] if jobFlags else []))
+        env.whichLto = env['lto']
+        if not env.GetOption("no_progress"):
+            log.info("Linking libraries and Python modules with %s" % " ".join(linkflags + jobFlags))
+    #
+    # Profile-guided optimization of the libraries and Python modules; see
+    # lsst.sconsUtils.pgo
+    #
+    env.whichPgo = "off"
+    if env['pgo'] != "off" and \
+            not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        from . import pgo
+        if env['profile'] == "gcov":
+            log.fail("pgo=%s can't be used with profile=gcov" % env['pgo'])
+        if env['pgo'] == "generate":
+            ccflags = ["-fprofile-generate=%s" % pgo.directory("raw")]
+            linkflags = list(ccflags)
+            if env.whichCc == "gcc":
+                ccflags.append("-fprofile-update=atomic")
+        elif env.whichCc == "gcc":
+            # The profile's directory is relative, as commands are run at the
+            # top of the package; objects depend on the profile through
+            # pgo.track
+            ccflags = ["-fprofile-use=pgo/profile", "-fprofile-partial-training", "-Wno-missing-profile",
+                       "-Wno-error=coverage-mismatch"]
+            linkflags = []
+        else:
+            ccflags = ["-fprofile-use=pgo/profile/default.profdata", "-Wno-profile-instr-unprofiled",
+                       "-Wno-profile-instr-out-of-date"]
+            linkflags = []
+        if env.whichCc not in ("gcc", "clang"):
+            log.fail("pgo=%s is not supported by %s" % (env['pgo'], env.whichCc))
+        if env['pgo'] == "generate" or \
+                pgo.checkProfile("%s %s" % (env.whichCc, getattr(env, "ccVersion", "unknown"))):
+            conf = env.Configure(custom_tests={'CheckFlags': CheckFlags})
+            if not conf.CheckFlags(ccflags, linkflags):
+                log.fail("%s can't compile and link with pgo=%s (%s)" %
+                         (env.whichCc, env['pgo'], " ".join(ccflags + linkflags)))
+            conf.Finish()
+            env.Append(SHCCFLAGS=ccflags)
+            env.Append(SHLINKFLAGS=linkflags)
+            env.whichPgo = env['pgo']
+    #
+    # Make the libraries and Python modules quicker to load; see
+    # lsst.sconsUtils.fastload
+    #
+    if env['fastload'] and not (env.GetOption("clean") or env.GetOption("help") or env.GetOption("no_exec")):
+        conf = env.Configure(custom_tests={'CheckFlags': CheckFlags})
+        flags = [("SHCCFLAGS", "-fno-semantic-interposition", True),
+                 ("SHCXXFLAGS", "-fvisibility-inlines-hidden", True),
+                 ("SHLINKFLAGS", "-Wl,-O1", False),
+                 ("SHLINKFLAGS", "-Wl,--as-needed", False),
+                 ("SHLINKFLAGS", "-Wl,--hash-style=gnu", False),
+                 ("LDMODULEFLAGS", "-Wl,-Bsymbolic-functions", False)]
+        unsupported = []
+        for var, flag, compiling in flags:
+            if conf.CheckFlags([flag] if compiling else [], [] if compiling else [flag]):
+                env.Append(**{var: [flag]})
+            else:
+                unsupported.append(flag)
+        conf.Finish()
+        if unsupported:
+            log.info("fastload: %s doesn't support %s" % (env.whichCc, " ".join(unsupported)))
 
 
 def _saveState():
@@ -537,17 +1063,62 @@ def _saveState():
     config = ConfigParser()
     config.add_section('Build')
     config.set('Build', 'cc', env.whichCc)
+    config.set('Build', 'ccVersion', getattr(env, "ccVersion", "unknown"))
+    config.set('Build', 'linker', env.whichLinker)
+    config.set('Build', 'debuginfo', env.whichDebugInfo)
+    config.set('Build', 'isa', env.whichIsa)
+    config.set('Build', 'lto', env.whichLto)
+    config.set('Build', 'pgo', env.whichPgo)
+    if env['buildType']:
+        config.set('Build', 'buildType', env['buildType'])
     if env['opt']:
         config.set('Build', 'opt', env['opt'])
 
     try:
         confFile = os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "build.cfg")
-        with open(confFile, 'w') as configfile:
-            config.write(configfile)
+        # Leave the file alone if it wouldn't change, as build.ninja depends
+        # on it (see lsst.sconsUtils.ninja)
+        text = io.StringIO()
+        config.write(text)
+        try:
+            with open(confFile) as configfile:
+                unchanged = configfile.read() == text.getvalue()
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            with open(confFile, 'w') as configfile:
+                configfile.write(text.getvalue())
     except Exception as e:
         log.warn("Unexpected exception in _saveState: %s" % e)
 
 
+def _loadState(root):
+    """Read what `_saveState` recorded about the build of a product.
+
+    Parameters
+    ----------
+    root : `str`
+        The product's directory.
+
+    Returns
+    -------
+    state : `dict`
+        The ``Build`` section of the product's ``build.cfg``, from its
+        ``ups`` directory if it was installed or its ``.sconf_temp`` if it
+        was built in place; empty if there is neither.
+    """
+    from configparser import ConfigParser, Error
+
+    for path in (os.path.join(root, "ups", "build.cfg"), os.path.join(root, ".sconf_temp", "build.cfg")):
+        config = ConfigParser()
+        try:
+            if config.read(path) and config.has_section("Build"):
+                return dict(config.items("Build"))
+        except Error:
+            pass
+    return {}
+
+
 _initOptions()
 _initLog()
 _initVariables()
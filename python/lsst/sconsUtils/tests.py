@@ -235,7 +235,7 @@ class Control:
         # to the command.
         libpathstr = utils.libraryLoaderEnvironment()
 
-        for f in glob.glob(fileGlob):
+        for f in sorted(glob.glob(fileGlob)):
             interpreter = ""            # interpreter to run test, if needed
 
             if f.endswith(".cc"):  # look for executable
@@ -325,7 +325,7 @@ class Control:
         for fileGlob in pyList:
             if not isinstance(fileGlob, str):  # env.Glob() returns an scons Node
                 fileGlob = str(fileGlob)
-            for f in glob.glob(fileGlob):
+            for f in sorted(glob.glob(fileGlob)):
                 if self.ignore(f):
                     continue
                 pythonTestFiles.append(os.path.join(self._cwd, f))
@@ -0,0 +1,134 @@
+"""Named build types, each built in a directory of its own.
+
+``buildType=<type>`` sets ``opt``, ``debug``, ``profile`` and ``archflags``
+together (giving any of them as well is an error):
+
+==================  ===  =====  =======
+``buildType``       opt  debug  profile
+==================  ===  =====  =======
+``release``         3    no     0
+``debug``           0    yes    0
+``relwithdebinfo``  2    yes    0
+``profile``         3    yes    1
+==================  ===  =====  =======
+
+and builds the objects, libraries, Python extension modules and test
+programs of `lsst.sconsUtils.scripts.BasicSConscript.lib`, ``python`` and
+``tests`` under ``build/<type>``, in the same layout as the package.  Each
+product is then linked into its usual place (``lib/libfoo.so``,
+``python/lsst/foo/_foo.so``, ``tests/testFoo``), so these links point at
+the type built last, which is what the tests run, ``scons install``
+copies and other packages build against; the type is also recorded in
+``build.cfg``.  Switching back to a type that was built before only
+replaces the links.
+
+Without ``buildType`` everything is built in place, with ``opt``,
+``debug``, ``profile`` and ``archflags`` as given.
+"""
+
+__all__ = ("variantDir", "sources", "target", "link")
+
+import os
+
+from . import state
+
+
+def variantDir():
+    """Return the directory the package is built in.
+
+    Returns
+    -------
+    directory : `SCons.Node.FS.Dir` or `None`
+        ``build/<buildType>``, or `None` if no ``buildType`` was given.
+    """
+    if not state.env["buildType"]:
+        return None
+    return state.env.Dir(os.path.join("#build", state.env["buildType"]))
+
+
+def sources(nodes):
+    """Return the sources to build from so that their objects are written
+    to the build type's directory.
+
+    Parameters
+    ----------
+    nodes : `list` of `SCons.Node.FS.File` or `str`
+        Source files.
+
+    Returns
+    -------
+    nodes : `list` of `SCons.Node.FS.File`
+        The same sources in the build type's directory (which SCons reads
+        from the package), or ``nodes`` unchanged if there is no build type.
+    """
+    directory = variantDir()
+    if directory is None:
+        return nodes
+    top = state.env.Dir("#")
+    return [directory.File(state.env.File(node).srcnode().get_path(top))
+            for node in state.env.Flatten(nodes)]
+
+
+def target(name):
+    """Return where to build a target.
+
+    Parameters
+    ----------
+    name : `str`
+        Name of the target, relative to the SConscript's directory.
+
+    Returns
+    -------
+    name : `str`
+        The name in the build type's directory, or ``name`` unchanged if
+        there is no build type.
+    """
+    directory = variantDir()
+    if directory is None:
+        return name
+    here = state.env.Dir(".").srcnode().get_path(state.env.Dir("#"))
+    return os.path.join(directory.abspath, here, name)
+
+
+def _link(target, source, env):
+    """Replace each target by a symbolic link to its source."""
+    for linkNode, product in zip(target, source):
+        path = linkNode.get_abspath()
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.symlink(os.path.relpath(product.get_abspath(), os.path.dirname(path)), path)
+    return 0
+
+
+def link(products):
+    """Link products built in the build type's directory into their usual
+    places.
+
+    Parameters
+    ----------
+    products : `list` of `SCons.Node.FS.File`
+        Files built in the build type's directory.
+
+    Returns
+    -------
+    links : `list` of `SCons.Node.FS.File`
+        The links, to be used in place of ``products``, or ``products`` if
+        there is no build type.
+    """
+    directory = variantDir()
+    if directory is None:
+        return products
+    env = state.env
+    top = env.Dir("#")
+    result = []
+    for product in env.Flatten(products):
+        path = top.File(product.get_path(directory))
+        result.extend(env.Command(path, product, env.Action(_link, None)))
+    env.NoCache(result)
+    return result
+
+
+def _install():
+    directory = variantDir()
+    if directory is not None:
+        state.env.VariantDir(directory, "#", duplicate=False)
@@ -0,0 +1,250 @@
+"""Rebuilding when files change.
+
+``scons --watch [targets]`` builds the targets (the default targets if
+none are given) and then waits for files in ``src``, ``include``,
+``python``, ``tests``, ``ups`` and ``lib`` or the ``SConstruct`` to
+change, rebuilding when they do, until interrupted.  Each build is an
+ordinary run of ``scons`` with the same arguments, so only the targets
+that are out of date are rebuilt, and only the tests whose outputs in
+``tests/.tests`` are out of date (because the test, or a library, module
+or executable it depends on, changed, or because it failed last time)
+are rerun.
+
+Changes are noticed with inotify on Linux and by looking at every
+file's modification time once a second elsewhere.  A build starts once
+no file has changed for `DEBOUNCE` seconds, so that saving many files at
+once starts a single build.  Files written by a build don't start
+another, but those edited while a build is running start one as soon as
+it is done.
+"""
+
+__all__ = ("DEBOUNCE", "Watcher", "watch")
+
+import atexit
+import ctypes
+import ctypes.util
+import os
+import select
+import subprocess
+import sys
+import tempfile
+import time
+
+import SCons.Node.FS
+import SCons.Script
+
+from . import scheduling
+from . import state
+
+# Seconds without changes to wait for before building
+DEBOUNCE = 0.3
+
+# Interval (s) between looks at the files when inotify isn't available
+_POLL_INTERVAL = 1.0
+
+# What is watched, relative to the top of the package
+_WATCHED = ("src", "include", "python", "tests", "ups", "lib", "SConstruct")
+
+# inotify events: IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+# IN_MOVED_TO | IN_CREATE | IN_DELETE
+_INOTIFY_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+
+_IN_NONBLOCK = 0o4000
+
+# Environment variable naming the file in which a build run by `watch`
+# lists the files it wrote
+_WRITTEN_VARIABLE = "SCONSUTILS_WATCH_WRITTEN"
+
+
+class Watcher:
+    """Wait for files in some directories to change.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+    paths : `list` of `str`, optional
+        Directories and files to watch, relative to ``top``.
+    """
+
+    def __init__(self, top, paths=_WATCHED):
+        self.paths = [os.path.join(top, p) for p in paths if os.path.exists(os.path.join(top, p))]
+        self._inotify = None
+        self._libc = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                fd = self._libc.inotify_init1(_IN_NONBLOCK)
+                if fd >= 0:
+                    self._inotify = fd
+            except (OSError, AttributeError):
+                pass
+        self.snapshot = self._scan()
+
+    @property
+    def usingInotify(self):
+        return self._inotify is not None
+
+    def _scan(self):
+        """Return the modification time and size of every file watched,
+        adding inotify watches for any new directories."""
+        files = {}
+        for path in self.paths:
+            if os.path.isfile(path):
+                walk = [(os.path.dirname(path), [], [os.path.basename(path)])]
+            else:
+                walk = os.walk(path)
+            for root, dirs, names in walk:
+                dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+                if self._inotify is not None:
+                    self._libc.inotify_add_watch(self._inotify, os.fsencode(root), _INOTIFY_MASK)
+                for name in names:
+                    if name.startswith(".") or name.endswith((".pyc", "~")):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files[os.path.join(root, name)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _drain(self):
+        """Read any pending inotify events; return whether there were any."""
+        events = False
+        while True:
+            try:
+                data = os.read(self._inotify, 65536)
+            except BlockingIOError:
+                return events
+            if not data:
+                return events
+            events = True
+
+    def _wait(self, timeout):
+        """Wait up to timeout seconds for an inotify event; return whether
+        there was one."""
+        ready, _, _ = select.select([self._inotify], [], [], timeout)
+        return self._drain() if ready else False
+
+    def update(self, written=()):
+        """Take in the changes made since the last snapshot, e.g. during a
+        build.
+
+        Parameters
+        ----------
+        written : `set` of `str`, optional
+            Files written by the build, whose changes are ignored.
+
+        Returns
+        -------
+        changed : `list` of `str`
+            The other files that were added, removed or modified.
+        """
+        if self._inotify is not None:
+            self._drain()
+        snapshot = self._scan()
+        changed = sorted(path for path in set(snapshot) | set(self.snapshot)
+                         if snapshot.get(path) != self.snapshot.get(path) and path not in written)
+        self.snapshot = snapshot
+        return changed
+
+    def changes(self):
+        """Wait for files to change and settle down.
+
+        Returns
+        -------
+        changed : `list` of `str`
+            The files that were added, removed or modified.
+        """
+        while True:
+            if self._inotify is not None:
+                self._wait(None)
+                while self._wait(DEBOUNCE):
+                    pass
+                snapshot = self._scan()
+            else:
+                time.sleep(_POLL_INTERVAL)
+                snapshot = self._scan()
+                while snapshot != self.snapshot:
+                    time.sleep(DEBOUNCE)
+                    settled, snapshot = snapshot, self._scan()
+                    if snapshot == settled:
+                        break
+            changed = sorted(path for path in set(snapshot) | set(self.snapshot)
+                             if snapshot.get(path) != self.snapshot.get(path))
+            self.snapshot = snapshot
+            if changed:
+                return changed
+
+
+def _buildCommand(argv):
+    """Return the scons command line to run for each build."""
+    return [sys.executable, argv[0]] + [arg for arg in argv[1:] if arg != "--watch"]
+
+
+def _build(command, top):
+    """Run a build, returning its exit status and the files it wrote."""
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "written")
+        status = subprocess.call(command, cwd=top, env=dict(os.environ, **{_WRITTEN_VARIABLE: filename}))
+        try:
+            with open(filename) as fd:
+                written = set(fd.read().splitlines())
+        except OSError:
+            written = set()
+    return status, written
+
+
+def _writeWritten(filename):
+    """List the files written by this run, for the `watch` that ran it."""
+    with open(filename, "w") as fd:
+        for node in scheduling._executed:
+            for written in [node] + list(node.side_effects):
+                if isinstance(written, SCons.Node.FS.Base):
+                    fd.write(written.abspath + "\n")
+
+
+def watch(top, command):
+    """Run a command each time the package's files change.
+
+    Parameters
+    ----------
+    top : `str`
+        Top directory of the package.
+    command : `list` of `str`
+        The build command.
+
+    Returns
+    -------
+    status : `int`
+        Exit status of the last build.
+    """
+    watcher = Watcher(top)
+    status, written = _build(command, top)
+    try:
+        while True:
+            changed = watcher.update(written)  # edited during the build
+            if not changed:
+                print("Watching %s for changes%s; interrupt to stop" % (
+                    ", ".join(os.path.relpath(p, top) for p in watcher.paths),
+                    "" if watcher.usingInotify else " (polling)"))
+                changed = watcher.changes()
+            print("\n%s changed" % (os.path.relpath(changed[0], top) if len(changed) == 1 else
+                                    "%d files" % len(changed)))
+            status, written = _build(command, top)
+    except KeyboardInterrupt:
+        print()
+    return status
+
+
+def _install():
+    """Run the builds if ``--watch`` was given (not returning), or have a
+    build run by `watch` list the files it writes."""
+    filename = os.environ.pop(_WRITTEN_VARIABLE, None)  # not for the builds this one runs
+    if filename:
+        atexit.register(_writeWritten, filename)
+    if not SCons.Script.GetOption("watch"):
+        return
+    if SCons.Script.GetOption("clean") or SCons.Script.GetOption("help"):
+        state.log.fail("--watch can't be used with --clean or --help")
+    sys.exit(watch(state.env.Dir("#").abspath, _buildCommand(sys.argv)))
@@ -0,0 +1,46 @@
+"""
+Import lsst.sconsUtils outside scons, so that its modules can be tested.
+
+lsst.sconsUtils expects to be imported by an SConstruct file: it reads
+the options scons was run with and sets up an environment whose top
+directory is the current directory.
+"""
+
+import os
+import sys
+import tempfile
+
+import SCons.SConsign
+import SCons.Script.Main
+import SCons.Script.SConsOptions
+
+_top = None
+
+
+def importSconsUtils():
+    """Import lsst.sconsUtils as if scons had been run with no arguments
+    in an empty directory.
+
+    Returns
+    -------
+    sconsUtils : `module`
+        The lsst.sconsUtils package, imported from this package's python
+        directory.
+    """
+    global _top
+    if _top is None:
+        _top = tempfile.TemporaryDirectory(prefix="sconsUtils-tests-")
+        parser = SCons.Script.SConsOptions.Parser("")
+        values = SCons.Script.SConsOptions.SConsValues(parser.get_default_values())
+        parser.parse_args([], values)
+        SCons.Script.Main.OptionsParser = parser
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "python"))
+        cwd = os.getcwd()
+        os.chdir(_top.name)
+        try:
+            import lsst.sconsUtils  # noqa: F401
+        finally:
+            os.chdir(cwd)
+        # Signatures of the targets tests build go in the top directory too
+        SCons.SConsign.File(os.path.join(_top.name, ".sconsign"))
+    return sys.modules["lsst.sconsUtils"]
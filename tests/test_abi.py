@@ -0,0 +1,71 @@
+"""
+Tests for lsst.sconsUtils.abi
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+abi = importSconsUtils().abi
+
+
+class ParseSymbolsTestCase(unittest.TestCase):
+    """Test reading the exported symbols from nm's output."""
+
+    def testParse(self):
+        output = """\
+0000000000001130 0000000000000010 T _Z5demoYi
+0000000000004010 0000000000000008 D demoTable
+0000000000004020 0000000000000004 B demoCount
+0000000000001110 0000000000000004 W _ZN4demo3fooEv
+0000000000000000 A VERS_1.0
+
+"""
+        self.assertEqual(abi._parseSymbols(output),
+                         ["VERS_1.0 A ", "_Z5demoYi T ", "_ZN4demo3fooEv W ",
+                          "demoCount B 0000000000000004", "demoTable D 0000000000000008"])
+
+    def testNoSizes(self):
+        """nm -gU on macOS doesn't report sizes."""
+        self.assertEqual(abi._parseSymbols("0000000000003f90 T __Z5demoYi\n0000000000008000 D _demoTable\n"),
+                         ["__Z5demoYi T ", "_demoTable D "])
+
+
+@unittest.skipUnless(sys.platform.startswith("linux") and shutil.which("cc") and shutil.which("nm"),
+                     "needs a compiler and nm")
+class AbiSignatureTestCase(unittest.TestCase):
+    """Test the signatures of libraries built from different sources."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self, name, source):
+        path = os.path.join(self.directory.name, name)
+        with open(path + ".c", "w") as fd:
+            fd.write(source)
+        subprocess.run(["cc", "-shared", "-fPIC", "-Wl,-soname,libdemo.so.1", "-o", path + ".so",
+                        path + ".c"], check=True)
+        return abi.abiSignature(path + ".so")
+
+    def testSignature(self):
+        original = self.build("original", "int demoX(int i) { return i; }\nint demoTable[2];\n")
+        self.assertIsNotNone(original)
+        self.assertEqual(self.build("implementation", "int demoX(int i) { return 2*i + 1; }\n"
+                                    "int demoTable[2];\n"), original)
+        self.assertNotEqual(self.build("data", "int demoX(int i) { return i; }\nint demoTable[3];\n"),
+                            original)
+        self.assertNotEqual(self.build("function", "int demoY(int i) { return i; }\nint demoTable[2];\n"),
+                            original)
+        self.assertIsNone(abi.abiSignature(os.path.join(self.directory.name, "missing.so")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+"""
+Tests for lsst.sconsUtils.estimate
+"""
+
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+estimate = importSconsUtils().estimate
+
+
+class SimulateTestCase(unittest.TestCase):
+    """Test the simulation of a build on several jobs."""
+
+    def testJobs(self):
+        costs = {"a.os": 1.0, "b.os": 2.0, "c.os": 3.0, "libfoo.so": 1.0}
+        dependencies = {"a.os": [], "b.os": [], "c.os": [], "libfoo.so": ["a.os", "b.os", "c.os"]}
+        self.assertEqual(estimate.simulate(costs, dependencies, 1), 7.0)
+        self.assertEqual(estimate.simulate(costs, dependencies, 2), 4.0)
+        self.assertEqual(estimate.simulate(costs, dependencies, 8), 4.0)
+
+    def testLongestPathFirst(self):
+        """``a.os`` starts first, as ``libfoo.so`` waits for it, although
+        ``b.os`` and ``c.os`` cost more."""
+        costs = {"b.os": 2.0, "c.os": 2.0, "a.os": 1.0, "libfoo.so": 4.0}
+        dependencies = {"b.os": [], "c.os": [], "a.os": [], "libfoo.so": ["a.os"]}
+        self.assertEqual(estimate.simulate(costs, dependencies, 2), 5.0)
+
+    def testFormatTime(self):
+        self.assertEqual(estimate.formatTime(12.34), "12.3s")
+        self.assertEqual(estimate.formatTime(185), "3m05s")
+        self.assertEqual(estimate.formatTime(3720), "1h02m")
+
+
+if __name__ == "__main__":
+    unittest.main()
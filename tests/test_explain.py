@@ -0,0 +1,60 @@
+"""
+Tests for lsst.sconsUtils.explain
+"""
+
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+explain = importSconsUtils().explain
+
+
+class CommandChangeTestCase(unittest.TestCase):
+    """Test the description of a changed command line."""
+
+    def testChanged(self):
+        self.assertEqual(explain._commandChange("g++ -O2 -c a.cc", "g++ -O3 -g -c a.cc"),
+                         dict(cause="command", old="g++ -O2 -c a.cc", new="g++ -O3 -g -c a.cc",
+                              added=["-O3", "-g"], removed=["-O2"]))
+
+    def testReordered(self):
+        self.assertEqual(explain._commandChange("g++ -O2 -g a.cc", "g++ -g -O2 a.cc"),
+                         dict(cause="command", old="g++ -O2 -g a.cc", new="g++ -g -O2 a.cc", reordered=True))
+
+
+class RootCausesTestCase(unittest.TestCase):
+    """Test grouping rebuilt targets by what caused them to rebuild."""
+
+    def testChain(self):
+        """A rebuilt dependency is replaced by the causes of its rebuild."""
+        explanations = {
+            "a.os": [dict(cause="changed", node="a.h")],
+            "b.os": [dict(cause="changed", node="a.h"), dict(cause="changed", node="b.cc")],
+            "lib.so": [dict(cause="changed", node="a.os"), dict(cause="changed", node="b.os")],
+            "test": [dict(cause="changed", node="lib.so"), dict(cause="command", old="x", new="y",
+                                                                added=["y"], removed=["x"])],
+        }
+        self.assertEqual(explain.rootCauses(explanations), [
+            dict(cause="changed", node="a.h", targets=["a.os", "b.os", "lib.so", "test"]),
+            dict(cause="changed", node="b.cc", targets=["b.os", "lib.so", "test"]),
+            dict(cause="command", reordered=False, targets=["test"]),
+        ])
+
+    def testKeys(self):
+        """Causes are grouped by their kind, node and variables only."""
+        explanations = {
+            "a.os": [dict(cause="environment", variables=["PATH"]),
+                     dict(cause="command", old="x -g", new="-g x", reordered=True)],
+            "b.os": [dict(cause="environment", variables=["PATH"]),
+                     dict(cause="command", old="y -g", new="-g y", reordered=True)],
+            "c.os": [dict(cause="environment", variables=["HOME"])],
+        }
+        self.assertEqual(explain.rootCauses(explanations), [
+            dict(cause="command", reordered=True, targets=["a.os", "b.os"]),
+            dict(cause="environment", variables=["PATH"], targets=["a.os", "b.os"]),
+            dict(cause="environment", variables=["HOME"], targets=["c.os"]),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
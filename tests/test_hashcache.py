@@ -0,0 +1,60 @@
+"""
+Tests for lsst.sconsUtils.hashcache
+"""
+
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+hashcache = importSconsUtils().hashcache
+
+
+class HashCacheTestCase(unittest.TestCase):
+    """Test the persistent cache of content signatures."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbFile = os.path.join(self.directory.name, "cache", "hashes.sqlite")
+        self.path = os.path.join(self.directory.name, "source.cc")
+        with open(self.path, "w") as fd:
+            fd.write("int main() { return 0; }\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testRoundTrip(self):
+        stat = os.stat(self.path)
+        cache = hashcache.HashCache(self.dbFile)
+        self.assertTrue(cache.set(stat, "md5", "0123abcd", hashed=stat.st_mtime + 10))
+        cache.save()
+
+        cache = hashcache.HashCache(self.dbFile)
+        self.assertEqual(cache.get(stat, "md5"), "0123abcd")
+        self.assertIsNone(cache.get(stat, "sha1"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def testChanged(self):
+        stat = os.stat(self.path)
+        cache = hashcache.HashCache(self.dbFile)
+        cache.set(stat, "md5", "0123abcd", hashed=stat.st_mtime + 10)
+        cache.save()
+        with open(self.path, "a") as fd:
+            fd.write("// changed\n")
+        self.assertIsNone(cache.get(os.stat(self.path), "md5"))
+
+    def testRacy(self):
+        """A file modified just before it was hashed may change again
+        without its times changing, so its signature isn't kept."""
+        stat = os.stat(self.path)
+        cache = hashcache.HashCache(self.dbFile)
+        self.assertFalse(cache.set(stat, "md5", "0123abcd"))
+        self.assertFalse(cache.set(stat, "md5", "0123abcd",
+                                   hashed=stat.st_mtime + hashcache.RACY_SECONDS/2))
+        cache.save()
+        self.assertIsNone(cache.get(stat, "md5"))
+
+
+if __name__ == "__main__":
+    unittest.main()
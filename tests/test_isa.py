@@ -0,0 +1,47 @@
+"""
+Tests for lsst.sconsUtils.isa
+"""
+
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+isa = importSconsUtils().isa
+
+
+class CompatibleTestCase(unittest.TestCase):
+    """Test whether code built for one instruction set can use another's."""
+
+    def testLevels(self):
+        self.assertTrue(isa.compatible("generic", "x86-64-v3"))
+        self.assertTrue(isa.compatible("x86-64-v2", "x86-64-v3"))
+        self.assertTrue(isa.compatible("x86-64-v3", "x86-64-v3"))
+        self.assertFalse(isa.compatible("x86-64-v4", "x86-64-v3"))
+        self.assertFalse(isa.compatible("x86-64-v2", "generic"))
+
+    def testProcessors(self):
+        """Named processors (isa=native) only match themselves, or a
+        level used from one."""
+        self.assertTrue(isa.compatible("skylake", "skylake"))
+        self.assertTrue(isa.compatible("generic", "skylake"))
+        self.assertTrue(isa.compatible("x86-64-v3", "skylake"))
+        self.assertFalse(isa.compatible("skylake", "x86-64-v4"))
+        self.assertFalse(isa.compatible("skylake", "znver3"))
+
+
+class BuiltForTestCase(unittest.TestCase):
+    """Test reading what an upstream product was built for."""
+
+    def testBuiltFor(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.assertEqual(isa.builtFor(root), "generic")
+            os.mkdir(os.path.join(root, "ups"))
+            with open(os.path.join(root, "ups", "build.cfg"), "w") as fd:
+                fd.write("[Build]\nisa = x86-64-v3\n")
+            self.assertEqual(isa.builtFor(root), "x86-64-v3")
+
+
+if __name__ == "__main__":
+    unittest.main()
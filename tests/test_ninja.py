@@ -0,0 +1,101 @@
+"""
+Tests for lsst.sconsUtils.ninja
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+sconsUtils = importSconsUtils()
+ninja = sconsUtils.ninja
+env = sconsUtils.env
+
+
+def _copy(target, source, env):
+    return 0
+
+
+class NinjaTestCase(unittest.TestCase):
+    """Test the export of the build graph."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "build.ninja")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testEscape(self):
+        self.assertEqual(ninja.ninjaEscape("lib/libfoo.so"), "lib/libfoo.so")
+        self.assertEqual(ninja.ninjaEscape("C:/my dir/$x"), "C$:/my$ dir/$$x")
+
+    def testWrite(self):
+        generated = env.Command("ninja-generated.txt", "ninja-input.txt", "sed s/a/b/ $SOURCE > $TARGET")
+        copied = env.Command("ninja-copied.txt", generated, env.Action(_copy, None))
+        alias = env.Alias("ninjaTest", [generated, copied])
+        configFile = os.path.join(env.Dir(env["CONFIGUREDIR"]).abspath, "build.cfg")
+        os.makedirs(os.path.dirname(configFile), exist_ok=True)
+        with open(configFile, "w") as fd:
+            fd.write("[Build]\n")
+
+        ninja.writeNinja(self.filename, alias, alias)
+        with open(self.filename) as fd:
+            lines = fd.read().splitlines()
+        self.assertIn("build build.ninja: regenerate %s" % os.path.relpath(configFile, env.Dir("#").abspath),
+                      lines)
+        self.assertIn("build ninjaTest: phony ninja-generated.txt ninja-copied.txt", lines)
+        # Python functions are run by scons
+        self.assertIn("build ninja-copied.txt: scons ninja-generated.txt", lines)
+        statement = lines.index("build ninja-generated.txt: cmd ninja-input.txt %s"
+                                % env.WhereIs("sed"))
+        self.assertEqual(lines[statement + 1], '  cmd = sed s/a/b/ "ninja-input.txt" > "ninja-generated.txt"')
+        self.assertEqual(lines[-1], "default ninjaTest")
+
+        # Writing the same graph again only touches the file, so ninja knows
+        # it is up to date
+        os.utime(self.filename, (0, 0))
+        ninja.writeNinja(self.filename, alias, alias)
+        self.assertGreater(os.stat(self.filename).st_mtime, 0)
+        with open(self.filename) as fd:
+            self.assertEqual(fd.read().splitlines(), lines)
+
+
+class VariablesTestCase(unittest.TestCase):
+    """Test recording the variables scons was run with, and refusing to
+    regenerate build.ninja with others."""
+
+    def setUp(self):
+        self.filename = ninja._variablesFile()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def tearDown(self):
+        os.environ.pop(ninja._REGENERATE_VARIABLE, None)
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def testRecord(self):
+        ninja._recordVariables()
+        self.assertEqual(ninja._readVariables()["variables"], [])
+        # It is left alone if it wouldn't change
+        os.utime(self.filename, (0, 0))
+        ninja._recordVariables()
+        self.assertEqual(os.stat(self.filename).st_mtime, 0)
+
+    def testRegenerate(self):
+        ninja._install()
+        os.environ[ninja._REGENERATE_VARIABLE] = "1"
+        ninja._install()
+        ninja._recordVariables()
+        ninja._install()
+        with open(self.filename, "w") as fd:
+            json.dump(dict(variables=[["opt", "0"]], fingerprint=""), fd)
+        with self.assertRaises(SystemExit):
+            ninja._install()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests for lsst.sconsUtils.profiling
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+profiling = importSconsUtils().profiling
+
+# gcc -ftime-report, after a warning
+TIME_REPORT = """\
+tr.cc:1:5: warning: unused variable 'y'
+
+Time variable                                   usr           sys          wall           GGC
+ phase setup                        :   0.00 (  0%)   0.01 (100%)   0.01 ( 10%)  1576k ( 70%)
+ phase parsing                      :   0.10 ( 50%)   0.00 (  0%)   0.20 ( 20%)   500k ( 20%)
+ phase lang. deferred               :   0.05 ( 25%)   0.00 (  0%)   0.05 (  5%)   100k (  5%)
+ phase opt and generate             :   0.00 (  0%)   0.00 (  0%)   0.50 ( 50%)    76k (  3%)
+ phase finalize                     :   0.01 (100%)   0.00 (  0%)   0.02 (  2%)     0  (  0%)
+ |name lookup                       :   0.00 (  0%)   0.01 (100%)   0.01 ( 50%)   102k (  5%)
+ callgraph functions expansion      :   0.00 (  0%)   0.00 (  0%)   0.30 ( 30%)    60k (  3%)
+ initialize rtl                     :   0.00 (  0%)   0.00 (  0%)   0.00 (  0%)    12k (  1%)
+ TOTAL                              :   0.16          0.01          1.00         2253k
+In file included from tr.cc:2:
+"""
+
+
+class TimeReportTestCase(unittest.TestCase):
+    """Test parsing gcc's -ftime-report."""
+
+    def testParse(self):
+        profile, rest = profiling.parseTimeReport(TIME_REPORT)
+        self.assertAlmostEqual(profile["frontend"], 0.25)
+        self.assertAlmostEqual(profile["backend"], 0.52)
+        self.assertEqual(profile["passes"], {"callgraph functions expansion": 0.30})
+        self.assertEqual(rest, "tr.cc:1:5: warning: unused variable 'y'\nIn file included from tr.cc:2:\n")
+
+    def testNoReport(self):
+        self.assertEqual(profiling.parseTimeReport("tr.cc:1:5: warning\n"), (None, "tr.cc:1:5: warning\n"))
+
+    def testFilterStderr(self):
+        """The report is taken out of stderr and kept for the task."""
+        class Task:
+            targets = ["tr.o"]
+
+        self.assertEqual(profiling._filterStderr(Task(), TIME_REPORT).splitlines()[0],
+                         "tr.cc:1:5: warning: unused variable 'y'")
+        self.assertAlmostEqual(profiling._reports.pop("tr.o")["frontend"], 0.25)
+        self.assertEqual(profiling._filterStderr(None, TIME_REPORT).count("\n"), 2)
+        self.assertEqual(profiling._reports, {})
+
+
+class TimeTraceTestCase(unittest.TestCase):
+    """Test parsing clang's -ftime-trace."""
+
+    def testParse(self):
+        events = [
+            dict(name="Frontend", dur=2000000),
+            dict(name="Backend", dur=500000),
+            dict(name="Source", dur=300000, args=dict(detail="foo.h")),
+            dict(name="Source", dur=200000, args=dict(detail="foo.h")),
+            dict(name="InstantiateClass", dur=100000, args=dict(detail="std::vector<int>")),
+            dict(name="InstantiateFunction", dur=50000, args=dict(detail="foo<int>")),
+            dict(name="Total Frontend", dur=2000000),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "tr.json")
+            with open(filename, "w") as fd:
+                json.dump(dict(traceEvents=events), fd)
+            profile = profiling.parseTimeTrace(filename)
+        self.assertAlmostEqual(profile["frontend"], 2.0)
+        self.assertAlmostEqual(profile["backend"], 0.5)
+        self.assertEqual(list(profile["headers"]), ["foo.h"])
+        self.assertAlmostEqual(profile["headers"]["foo.h"], 0.5)
+        self.assertEqual(sorted(profile["templates"]), ["foo<int>", "std::vector<int>"])
+
+    def testUnreadable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(profiling.parseTimeTrace(os.path.join(directory, "missing.json")))
+            filename = os.path.join(directory, "tr.json")
+            with open(filename, "w") as fd:
+                fd.write("{}")
+            self.assertIsNone(profiling.parseTimeTrace(filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
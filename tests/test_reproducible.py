@@ -0,0 +1,65 @@
+"""
+Tests for lsst.sconsUtils.reproducible
+"""
+
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+reproducible = importSconsUtils().reproducible
+
+
+def _write(top, path, text):
+    path = os.path.join(top, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fd:
+        fd.write(text)
+
+
+class CompareTreesTestCase(unittest.TestCase):
+    """Test the comparison of two builds."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.first = os.path.join(self.directory.name, "first")
+        self.second = os.path.join(self.directory.name, "second-directory")
+        for top in (self.first, self.second):
+            _write(top, "src/foo.cc", "int foo() { return 1; }\n")
+            _write(top, "lib/libfoo.so", "built")
+            _write(top, ".sconf_temp/build.cfg", "[Build]\ncc = %s\n" % top)
+            _write(top, "config.log", top)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testIdentical(self):
+        self.assertEqual(reproducible.compareTrees(self.first, self.second), [])
+
+    def testDifferences(self):
+        _write(self.second, "lib/libfoo.so", "built elsewhere")
+        _write(self.first, "python/_foo.so", "only in the first")
+        _write(self.second, "python/foo.pyc", "ignored")
+        self.assertEqual(reproducible.compareTrees(self.first, self.second),
+                         ["lib/libfoo.so", "python/_foo.so"])
+
+    def testIgnore(self):
+        """Sources can be left out of the comparison."""
+        _write(self.second, "src/foo.cc", "int foo() { return 2; }\n")
+        self.assertEqual(reproducible.compareTrees(self.first, self.second), ["src/foo.cc"])
+        self.assertEqual(reproducible.compareTrees(self.first, self.second, ["src/foo.cc"]), [])
+
+
+class SourceFilesTestCase(unittest.TestCase):
+    """Test finding the files to copy outside a git repository."""
+
+    def testNotGit(self):
+        with tempfile.TemporaryDirectory() as top:
+            for path in ("SConstruct", "src/foo.cc", "include/foo.h", ".hidden", ".sconf_temp/build.cfg"):
+                _write(top, path, "")
+            self.assertEqual(reproducible.sourceFiles(top), ["SConstruct", "include/foo.h", "src/foo.cc"])
+
+
+if __name__ == "__main__":
+    unittest.main()
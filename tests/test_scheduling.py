@@ -0,0 +1,225 @@
+"""
+Tests for lsst.sconsUtils.scheduling
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import SCons.Taskmaster
+
+from sconsUtilsForTests import importSconsUtils
+
+sconsUtils = importSconsUtils()
+scheduling = sconsUtils.scheduling
+env = sconsUtils.env
+
+
+class TargetRecordsTestCase(unittest.TestCase):
+    """Test the measurements kept between builds."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "config", "targets.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testRoundTrip(self):
+        records = scheduling.TargetRecords(self.filename)
+        self.assertIsNone(records.get("lib/libfoo.so", "rss"))
+        self.assertEqual(records.get("lib/libfoo.so", "rss", 0), 0)
+        self.assertFalse(records.has("duration"))
+        records.set("lib/libfoo.so", "rss", 300)
+        records.set("lib/libfoo.so", "duration", 1.5)
+        records.set("src/foo.os", "duration", 0.25)
+        self.assertTrue(records.has("duration"))
+        records.save()
+
+        loaded = scheduling.TargetRecords(self.filename)
+        self.assertFalse(loaded.modified)
+        self.assertEqual(loaded.get("lib/libfoo.so", "rss"), 300)
+        self.assertEqual(loaded.get("lib/libfoo.so", "duration"), 1.5)
+        self.assertEqual(loaded.get("src/foo.os", "duration"), 0.25)
+        self.assertIsNone(loaded.get("src/foo.os", "rss"))
+
+    def testUnmodified(self):
+        """Records that weren't changed aren't written."""
+        scheduling.TargetRecords(self.filename).save()
+        self.assertFalse(os.path.exists(self.filename))
+
+    def testCorrupt(self):
+        os.makedirs(os.path.dirname(self.filename))
+        with open(self.filename, "w") as fd:
+            fd.write("{not json")
+        records = scheduling.TargetRecords(self.filename)
+        self.assertFalse(records.has("duration"))
+
+
+class MemoryPoolTestCase(unittest.TestCase):
+    """Test the accounting of the memory used by running tasks."""
+
+    def testAccounting(self):
+        pool = scheduling.MemoryPool(1000)
+        with pool.reserve(300):
+            self.assertEqual(pool.used, 300)
+            with pool.reserve(700):
+                self.assertEqual(pool.used, 1000)
+            self.assertEqual(pool.used, 300)
+        self.assertEqual(pool.used, 0)
+
+    def testReleasedOnError(self):
+        pool = scheduling.MemoryPool(1000)
+        with self.assertRaises(RuntimeError):
+            with pool.reserve(300):
+                raise RuntimeError("task failed")
+        self.assertEqual(pool.used, 0)
+
+    def testOversized(self):
+        """A task bigger than the budget runs once it has the pool to
+        itself."""
+        pool = scheduling.MemoryPool(1000)
+        with pool.reserve(5000):
+            self.assertEqual(pool.used, 1000)
+        self.assertEqual(pool.used, 0)
+
+    def testWaits(self):
+        pool = scheduling.MemoryPool(1000)
+        events = []
+
+        def task(name, amount, seconds):
+            with pool.reserve(amount):
+                events.append(("start", name))
+                time.sleep(seconds)
+                events.append(("end", name))
+
+        with pool.reserve(600):
+            thread = threading.Thread(target=task, args=("second", 600, 0.0))
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive(), "The task should wait for memory")
+            self.assertEqual(events, [])
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(events, [("start", "second"), ("end", "second")])
+        self.assertEqual(pool.used, 0)
+
+
+def _noop(target, source, env):
+    return 0
+
+
+class OrderTestCase(unittest.TestCase):
+    """Test that the longest chains of work are started first.
+
+    The graph is ``top`` <- (``fast``, ``slow`` <- ``slowChild``), where
+    ``slowChild`` takes longest; SCons on its own visits ``fast`` first.
+    """
+
+    durations = {"top": 1.0, "fast": 1.0, "slow": 2.0, "slowChild": 5.0}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.records = scheduling.records
+        scheduling._pathLengths.clear()
+
+    def tearDown(self):
+        scheduling.records = self.records
+        scheduling._pathLengths.clear()
+        self.directory.cleanup()
+
+    def makeGraph(self, prefix):
+        """Return the nodes of the graph, with names starting with
+        ``prefix`` (nodes can only be built once)."""
+        def node(name, sources):
+            return env.Command(prefix + name, sources, env.Action(_noop, None))[0]
+        slowChild = node("slowChild", [])
+        slow = node("slow", [slowChild])
+        fast = node("fast", [])
+        return dict(top=node("top", [fast, slow]), fast=fast, slow=slow, slowChild=slowChild)
+
+    def recordDurations(self, prefix):
+        scheduling.records = scheduling.TargetRecords(os.path.join(self.directory.name, "targets.json"))
+        for name, seconds in self.durations.items():
+            scheduling.records.set(prefix + name, "duration", seconds)
+
+    def buildOrder(self, taskmaster, top):
+        """Return the targets in the order the taskmaster builds them."""
+        tm = taskmaster([top], SCons.Taskmaster.OutOfDateTask)
+        order = []
+        while True:
+            task = tm.next_task()
+            if task is None:
+                return order
+            task.prepare()
+            order.extend(str(target) for target in task.targets)
+            task.executed()
+            task.postprocess()
+
+    def testPathLength(self):
+        nodes = self.makeGraph("length-")
+        durations = {"length-" + name: seconds for name, seconds in self.durations.items()}
+        self.assertEqual(scheduling.pathLength(nodes["top"], durations), 8.0)
+        self.assertEqual(scheduling.pathLength(nodes["fast"], durations), 1.0)
+        self.assertEqual(scheduling.criticalPath([nodes["top"]], durations),
+                         [(nodes["top"], 1.0), (nodes["slow"], 2.0), (nodes["slowChild"], 5.0)])
+
+    def testTaskmaster(self):
+        self.assertEqual(self.buildOrder(SCons.Taskmaster.Taskmaster, self.makeGraph("scons-")["top"]),
+                         ["scons-fast", "scons-slowChild", "scons-slow", "scons-top"])
+        self.recordDurations("ordered-")
+        self.assertEqual(self.buildOrder(scheduling._Taskmaster, self.makeGraph("ordered-")["top"]),
+                         ["ordered-slowChild", "ordered-slow", "ordered-fast", "ordered-top"])
+
+    def testOrderApplied(self):
+        """The order SCons asks for (e.g. --random) decides ties."""
+        nodes = self.makeGraph("ties-")
+        self.recordDurations("none-")
+        tm = scheduling._Taskmaster([], SCons.Taskmaster.OutOfDateTask, order=lambda deps: deps[::-1])
+        self.assertEqual(tm.order([nodes["fast"], nodes["slowChild"]]), [nodes["slowChild"], nodes["fast"]])
+        self.recordDurations("ties-")
+        scheduling._pathLengths.clear()
+        self.assertEqual(tm.order([nodes["fast"], nodes["slowChild"]]), [nodes["fast"], nodes["slowChild"]])
+
+
+@unittest.skipUnless(hasattr(os, "wait4"), "Commands are only spawned by scheduling on POSIX")
+class FilterStderrTestCase(unittest.TestCase):
+    """Test that the standard error of commands can be rewritten."""
+
+    def tearDown(self):
+        scheduling.filterStderr(None)
+
+    def spawn(self, command):
+        """Run a command as SCons would, returning its exit status and
+        what it wrote to standard error."""
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            status = scheduling._spawn("sh", None, "sh", [command], dict(os.environ))
+        return status, stderr.getvalue()
+
+    def testFilter(self):
+        calls = []
+
+        def shout(task, text):
+            calls.append((task, text))
+            return text.upper()
+
+        scheduling.filterStderr(shout)
+        status, stderr = self.spawn("echo 'warning: unused' >&2; exit 3")
+        self.assertEqual(status, 3)
+        self.assertEqual(stderr, "WARNING: UNUSED\n")
+        self.assertEqual(calls, [(None, "warning: unused\n")])
+
+    def testRemove(self):
+        scheduling.filterStderr(lambda task, text: "")
+        status, stderr = self.spawn("echo 'note: noise' >&2")
+        self.assertEqual(status, 0)
+        self.assertEqual(stderr, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Tests for lsst.sconsUtils.scripts
+"""
+
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+sconsUtils = importSconsUtils()
+scripts = sconsUtils.scripts
+env = sconsUtils.env
+
+
+class InstalledDirsTestCase(unittest.TestCase):
+    """Test the choice of the subdirectories installed by default."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for path in ("build", "pgo", "python", "ups", ".git"):
+            os.mkdir(os.path.join(self.directory.name, path))
+        with open(os.path.join(self.directory.name, "SConstruct"), "w"):
+            pass
+        self.saved = {name: env[name] for name in ("buildType", "pgo")}
+
+    def tearDown(self):
+        env.Replace(**self.saved)
+        self.directory.cleanup()
+
+    def testPackageDirectories(self):
+        """A package's own ``build`` and ``pgo`` directories are
+        installed."""
+        env.Replace(buildType="", pgo="off")
+        self.assertEqual(scripts._installedDirs(self.directory.name), ["build", "pgo", "python", "ups"])
+
+    def testBuildType(self):
+        env.Replace(buildType="debug", pgo="off")
+        self.assertEqual(scripts._installedDirs(self.directory.name), ["pgo", "python", "ups"])
+
+    def testProfiles(self):
+        env.Replace(buildType="", pgo="use")
+        self.assertEqual(scripts._installedDirs(self.directory.name), ["build", "python", "ups"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests for lsst.sconsUtils.signatures
+"""
+
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+signatures = importSconsUtils().signatures
+
+
+class SqliteDbmTestCase(unittest.TestCase):
+    """Test the SQLite store of signatures."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, ".sconsign")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testMapping(self):
+        db = signatures.open(self.filename, "c")
+        self.assertTrue(os.path.exists(self.filename + ".sqlite"))
+        db["src"] = b"one"
+        db["src"] = b"two"
+        db["lib"] = b"three"
+        self.assertEqual(db["src"], b"two")
+        self.assertEqual(sorted(db), ["lib", "src"])
+        self.assertEqual(len(db), 2)
+        del db["lib"]
+        self.assertNotIn("lib", db)
+        with self.assertRaises(KeyError):
+            del db["lib"]
+        with self.assertRaises(KeyError):
+            db["lib"]
+        db.close()
+
+    def testSync(self):
+        """Changes are only seen by other readers once synced."""
+        db = signatures.SqliteDbm(self.filename)
+        db["src"] = b"one"
+        db.sync()
+        db["lib"] = b"two"
+        reader = signatures.SqliteDbm(self.filename, "r")
+        self.assertEqual(dict(reader), {"src": b"one"})
+        with self.assertRaises(OSError):
+            reader["src"] = b"changed"
+        reader.close()
+        db.close()
+        self.assertEqual(dict(signatures.SqliteDbm(self.filename, "r")), {"src": b"one", "lib": b"two"})
+
+    def testNew(self):
+        db = signatures.SqliteDbm(self.filename)
+        db["src"] = b"one"
+        db.close()
+        self.assertEqual(len(signatures.SqliteDbm(self.filename, "n")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
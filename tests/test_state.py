@@ -0,0 +1,34 @@
+"""
+Tests for lsst.sconsUtils.state
+"""
+
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+sconsUtils = importSconsUtils()
+state = sconsUtils.state
+env = sconsUtils.env
+
+
+class PartialLinkTestCase(unittest.TestCase):
+    """Test the flags of relocatable links (partialLink=True)."""
+
+    def testFlags(self):
+        self.assertEqual(state._partialLinkFlags(["$LINKFLAGS", "-shared", "-fuse-ld=gold", "-flto",
+                                                  "$(", "-flto=8", "$)"]),
+                         ["$LINKFLAGS", "-fuse-ld=gold", "-flto", "$(", "-flto=8", "$)"])
+        self.assertEqual(state._partialLinkFlags(["$LINKFLAGS", "-dynamiclib", "-install_name",
+                                                  "${TARGET.file}", "-Wl,-headerpad_max_install_names"]),
+                         ["$LINKFLAGS", "-Wl,-headerpad_max_install_names"])
+
+    def testCommand(self):
+        linkEnv = env.Clone(LINKFLAGS=["-fuse-ld=gold"], SHLINKFLAGS=["$LINKFLAGS", "-shared", "-Wl,-O1"])
+        command = linkEnv.subst("$PARTIALLINKCOM", target=linkEnv.File("partial.os"),
+                                source=[linkEnv.File("a.os"), linkEnv.File("b.os")])
+        self.assertEqual(command.split()[1:],
+                         ["-r", "-nostdlib", "-fuse-ld=gold", "-Wl,-O1", "-o", "partial.os", "a.os", "b.os"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+"""
+Tests for lsst.sconsUtils.watch
+"""
+
+import os
+import tempfile
+import unittest
+
+from sconsUtilsForTests import importSconsUtils
+
+watch = importSconsUtils().watch
+
+
+class WatcherTestCase(unittest.TestCase):
+    """Test noticing the files changed during a build."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.directory.name, "src"))
+        self.source = self.write("src/foo.cc", "int foo();\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, path, text):
+        path = os.path.join(self.directory.name, path)
+        with open(path, "w") as fd:
+            fd.write(text)
+        return path
+
+    def testUpdate(self):
+        watcher = watch.Watcher(self.directory.name, ["src"])
+        self.assertEqual(watcher.update(), [])
+        built = self.write("src/foo.os", "object")
+        self.write("src/foo.cc", "int foo(int);\n")  # edited during the build
+        self.assertEqual(watcher.update({built}), [self.source])
+        self.assertEqual(watcher.update(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()